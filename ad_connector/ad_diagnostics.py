@@ -0,0 +1,220 @@
+# ad_connector/ad_diagnostics.py
+"""
+Diagnóstico de la conexión con AD paso a paso, para "Probar conexión".
+
+Cada paso se mide por separado para saber dónde está el problema (red, TLS,
+credenciales, base de búsqueda o grupo) sin descargar el directorio:
+
+1. tcp     - conexión TCP a AD_SERVER:AD_PORT
+2. tls     - handshake TLS (solo con AD_USE_SSL)
+3. bind    - autenticación con AD_USER
+4. rootdse - lectura del RootDSE del controlador
+5. search  - búsqueda limitada a SEARCH_SAMPLE entradas en AD_SEARCH_BASE
+6. group   - miembros de AD_GROUP (solo el atributo 'member' del grupo)
+7. count   - opcional: conteo aproximado de usuarios con búsqueda paginada sin
+             atributos, acotado a COUNT_MAX_PAGES páginas
+
+Si un paso falla, los siguientes que dependen de él se marcan como omitidos.
+"""
+import logging
+import socket
+import ssl
+import time
+
+from ldap3 import BASE, SUBTREE, Connection, Server
+from ldap3.core.exceptions import LDAPException
+
+from web_interface import metrics
+from .ad_operations import get_ad_config, get_ad_group_config
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT = 5            # segundos por operación de red
+SEARCH_SAMPLE = 5      # entradas pedidas en la búsqueda de prueba
+COUNT_PAGE_SIZE = 1000
+COUNT_MAX_PAGES = 100  # ← a partir de aquí el conteo se da como "más de N"
+USER_FILTER = '(&(objectCategory=person)(objectClass=user))'
+
+STEP_LABELS = {
+    'tcp': 'Conexión TCP',
+    'tls': 'Handshake TLS',
+    'bind': 'Autenticación (bind)',
+    'rootdse': 'Lectura de RootDSE',
+    'search': 'Búsqueda en la base',
+    'group': 'Miembros del grupo',
+    'count': 'Conteo de usuarios',
+}
+
+
+class _Steps:
+    def __init__(self):
+        self.steps = []
+
+    def run(self, name, func):
+        """Ejecuta un paso; devuelve su resultado o None si falló."""
+        started = time.perf_counter()
+        try:
+            value, detail = func()
+            ok, error = True, None
+        except Exception as e:
+            value, detail, ok, error = None, None, False, f"{type(e).__name__}: {e}"
+        self.steps.append({
+            'name': name,
+            'label': STEP_LABELS[name],
+            'status': 'ok' if ok else 'error',
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            'detail': detail if ok else error,
+        })
+        return value if ok else None
+
+    def skip(self, name, reason):
+        self.steps.append({
+            'name': name,
+            'label': STEP_LABELS[name],
+            'status': 'skipped',
+            'duration_ms': None,
+            'detail': reason,
+        })
+
+
+def _tcp(config):
+    if not config['host']:
+        raise ValueError("AD_SERVER no está configurado")
+    with socket.create_connection((config['host'], config['port']), timeout=TIMEOUT) as sock:
+        peer = sock.getpeername()
+    return True, f"{peer[0]}:{peer[1]}"
+
+
+def _tls(config):
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    # ← Igual que get_ad_config: no se valida el certificado del controlador
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    with socket.create_connection((config['host'], config['port']), timeout=TIMEOUT) as sock:
+        with context.wrap_socket(sock, server_hostname=config['host']) as tls_sock:
+            cipher = tls_sock.cipher()
+            return True, f"{tls_sock.version()} ({cipher[0] if cipher else '?'})"
+
+
+def _bind(config):
+    server = Server(
+        config['host'], port=config['port'], use_ssl=config['use_ssl'],
+        tls=config['tls_config'], connect_timeout=TIMEOUT,
+    )
+    conn = Connection(server, user=config['user'], password=config['password'], receive_timeout=TIMEOUT)
+    bound = False
+    try:
+        if not conn.bind():
+            raise LDAPException(conn.result.get('description') or 'bind rechazado')
+        bound = True
+    finally:
+        if not bound:
+            # ← también si bind() lanza (timeout, TLS, socket cerrado); sin tapar el error original
+            try:
+                conn.unbind()
+            except LDAPException:
+                pass
+    return conn, f"como {config['user']}"
+
+
+def _rootdse(conn):
+    conn.search('', '(objectClass=*)', search_scope=BASE,
+                attributes=['defaultNamingContext', 'dnsHostName', 'domainControllerFunctionality'])
+    if not conn.entries:
+        raise LDAPException('RootDSE vacío')
+    entry = conn.entries[0]
+    host = entry.dnsHostName.value if 'dnsHostName' in entry else '?'
+    naming = entry.defaultNamingContext.value if 'defaultNamingContext' in entry else '?'
+    return True, f"{host} · {naming}"
+
+
+def _search(conn, search_base):
+    conn.search(search_base, USER_FILTER, search_scope=SUBTREE,
+                attributes=['sAMAccountName'], size_limit=SEARCH_SAMPLE, time_limit=TIMEOUT)
+    # ← sizeLimitExceeded (4) es lo esperado cuando hay más de SEARCH_SAMPLE usuarios
+    if conn.result['result'] not in (0, 4):
+        raise LDAPException(conn.result.get('description'))
+    sample = [entry.sAMAccountName.value for entry in conn.entries]
+    return len(sample), f"{len(sample)} de muestra: {', '.join(filter(None, sample))}"
+
+
+def _group(conn, group_dn):
+    conn.search(group_dn, '(objectClass=group)', search_scope=BASE, attributes=['member'], time_limit=TIMEOUT)
+    if not conn.entries:
+        raise LDAPException(f"No se encontró el grupo {group_dn}")
+    entry = conn.entries[0]
+    members = entry.member.values if 'member' in entry else []
+    return len(members), f"{len(members)} miembros"
+
+
+def _count(conn, search_base):
+    total, cookie, pages = 0, None, 0
+    while pages < COUNT_MAX_PAGES:
+        # ← '1.1': ningún atributo, solo los DN
+        conn.search(search_base, USER_FILTER, search_scope=SUBTREE, attributes=['1.1'],
+                    paged_size=COUNT_PAGE_SIZE, paged_cookie=cookie, time_limit=TIMEOUT * 6)
+        total += len(conn.response or [])
+        pages += 1
+        cookie = conn.result.get('controls', {}).get('1.2.840.113556.1.4.319', {}).get('value', {}).get('cookie')
+        if not cookie:
+            return {'count': total, 'exact': True}, f"{total} usuarios"
+    return {'count': total, 'exact': False}, f"más de {total} usuarios"
+
+
+@metrics.timed('tbot_ad_operation_seconds', operation='diagnostics')
+def run_diagnostics(count_users: bool = False) -> dict:
+    """
+    Ejecuta los pasos del diagnóstico. Devuelve
+    {'success', 'total_ms', 'steps': [...], 'user_count': {'count', 'exact'} | None}.
+    """
+    config = get_ad_config()
+    group_dn = get_ad_group_config()
+    steps = _Steps()
+    started = time.perf_counter()
+    user_count = None
+
+    steps.run('tcp', lambda: _tcp(config))
+    tcp_ok = steps.steps[-1]['status'] == 'ok'
+    if not tcp_ok:
+        steps.skip('tls', 'sin conexión TCP')
+    elif config['use_ssl']:
+        steps.run('tls', lambda: _tls(config))
+    else:
+        steps.skip('tls', 'AD_USE_SSL desactivado')
+
+    transport_ok = tcp_ok and steps.steps[-1]['status'] != 'error'
+    conn = steps.run('bind', lambda: _bind(config)) if transport_ok else None
+    if not transport_ok:
+        steps.skip('bind', 'sin conexión TCP' if not tcp_ok else 'falló el handshake TLS')
+
+    try:
+        if conn is None:
+            for name in ('rootdse', 'search', 'group') + (('count',) if count_users else ()):
+                steps.skip(name, 'sin bind')
+        else:
+            steps.run('rootdse', lambda: _rootdse(conn))
+            if config['search_base']:
+                steps.run('search', lambda: _search(conn, config['search_base']))
+            else:
+                steps.skip('search', 'AD_SEARCH_BASE no está configurado')
+            if group_dn:
+                steps.run('group', lambda: _group(conn, group_dn))
+            else:
+                steps.skip('group', 'AD_GROUP no está configurado')
+            if count_users:
+                if config['search_base']:
+                    user_count = steps.run('count', lambda: _count(conn, config['search_base']))
+                else:
+                    steps.skip('count', 'AD_SEARCH_BASE no está configurado')
+    finally:
+        if conn is not None:
+            conn.unbind()
+
+    result = {
+        'success': all(step['status'] != 'error' for step in steps.steps),
+        'total_ms': round((time.perf_counter() - started) * 1000, 1),
+        'steps': steps.steps,
+        'user_count': user_count,
+    }
+    logger.info(f"Diagnóstico AD: {'OK' if result['success'] else 'con errores'} en {result['total_ms']} ms")
+    return result
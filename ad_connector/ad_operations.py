@@ -1,14 +1,13 @@
-import os
 import ssl
 import logging
 import time
 from ldap3 import Server, Connection, Tls, SUBTREE, MODIFY_REPLACE
 from ldap3.core.exceptions import LDAPException, LDAPBindError
 from datetime import datetime, timedelta, timezone
-from dotenv import load_dotenv
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+from web_interface import metrics, tracing
+from web_interface.env_config import env_config
+
 logger = logging.getLogger(__name__)
 
 # Importaciones con manejo de errores para módulos opcionales
@@ -27,19 +26,24 @@ def get_bool(key, default):
             return default
 
 
-def get_ad_config():
-    """Devuelve la configuración básica de AD desde variables de entorno."""
+def _build_ad_config():
     return {
-        'host': os.getenv('AD_SERVER'),
-        'port': int(os.getenv('AD_PORT', 636)),
-        'use_ssl': os.getenv('AD_USE_SSL', 'true').lower() == 'true',
-        'user': os.getenv('AD_USER'),
-        'password': os.getenv('AD_PASSWORD'),
-        'search_base': os.getenv('AD_SEARCH_BASE'),
+        'host': env_config.get('AD_SERVER'),
+        'port': env_config.get_int('AD_PORT', 636),
+        'use_ssl': env_config.get_bool('AD_USE_SSL', True),
+        'user': env_config.get('AD_USER'),
+        'password': env_config.get('AD_PASSWORD'),
+        'search_base': env_config.get('AD_SEARCH_BASE'),
         'tls_config': Tls(validate=ssl.CERT_NONE, version=ssl.PROTOCOL_TLSv1_2)
     }
 
 
+def get_ad_config():
+    """Configuración básica de AD; se construye (con su Tls) solo cuando cambia .env."""
+    return dict(env_config.cached('ad_config', _build_ad_config))
+
+
+@metrics.timed('tbot_ad_operation_seconds', operation='cambiar_password_usuario')
 def cambiar_password_usuario(email: str, new_password: str) -> dict:
     """
     Cambia la contraseña para el usuario identificado por su email.
@@ -59,11 +63,12 @@ def cambiar_password_usuario(email: str, new_password: str) -> dict:
             # Opción alternativa: usar StartTLS si no se usa SSL directamente.
             server = Server(config['host'], port=config['port'], use_ssl=False)
 
-        conn = Connection(server,
-                          user=config['user'],
-                          password=config['password'],
-                          auto_bind=True,
-                          receive_timeout=30)
+        with tracing.span('ad:bind'):
+            conn = Connection(server,
+                              user=config['user'],
+                              password=config['password'],
+                              auto_bind=True,
+                              receive_timeout=30)
 
         if not conn.bound:
             logger.error(f"No se pudo conectar al AD. Razón: {conn.result}")
@@ -79,12 +84,13 @@ def cambiar_password_usuario(email: str, new_password: str) -> dict:
 
         # Buscar el usuario por el campo mail.
         search_filter = f"(&(objectClass=user)(mail={email}))"
-        conn.search(
-            search_base=config['search_base'],
-            search_filter=search_filter,
-            search_scope=SUBTREE,
-            attributes=['distinguishedName']
-        )
+        with tracing.span('ad:search_user'):
+            conn.search(
+                search_base=config['search_base'],
+                search_filter=search_filter,
+                search_scope=SUBTREE,
+                attributes=['distinguishedName']
+            )
         if not conn.entries:
             logger.error("No se encontró el usuario en AD con el email proporcionado.")
             conn.unbind()
@@ -96,7 +102,8 @@ def cambiar_password_usuario(email: str, new_password: str) -> dict:
         password_value = ('"' + new_password + '"').encode('utf-16-le')
         modify_password = {'unicodePwd': [(MODIFY_REPLACE, [password_value])]}
 
-        conn.modify(user_dn, modify_password)
+        with tracing.span('ad:modify_unicodePwd'):
+            conn.modify(user_dn, modify_password)
         if conn.result.get('result') == 0:
             logger.info("Contraseña cambiada exitosamente en el servidor AD.")
             result = {"success": True, "message": "La contraseña fue cambiada exitosamente."}
@@ -119,6 +126,7 @@ def cambiar_password_usuario(email: str, new_password: str) -> dict:
         return {"success": False, "message": f"Error inesperado: {e}"}
 
 
+@metrics.timed('tbot_ad_operation_seconds', operation='fetch_ad_users')
 def fetch_ad_users(retries=3):
     """Obtiene todos los usuarios del AD."""
 
@@ -159,6 +167,7 @@ def fetch_ad_users(retries=3):
             time.sleep(2)
     return users
 
+@metrics.timed('tbot_ad_operation_seconds', operation='check_group_membership')
 def check_group_membership(email_or_username: str) -> bool:
     """Verifica si un usuario pertenece al grupo de administradores."""
     try:
@@ -171,7 +180,7 @@ def check_group_membership(email_or_username: str) -> bool:
         else:
             username = email_or_username
             
-        group_dn = os.getenv('AD_GROUP')
+        group_dn = get_ad_group_config()
         if not group_dn:
             return False
             
@@ -194,6 +203,7 @@ def check_group_membership(email_or_username: str) -> bool:
         return False
 
 
+@metrics.timed('tbot_ad_operation_seconds', operation='is_user_active')
 def is_user_active(email: str) -> bool:
     """
     Verifica si un usuario está activo en Active Directory.
@@ -228,6 +238,7 @@ def is_user_active(email: str) -> bool:
         return False
 
 
+@metrics.timed('tbot_ad_operation_seconds', operation='get_password_expiry')
 def get_password_expiry(email: str) -> dict:
     """Calcula la expiración usando pwdLastSet y la política definida en .env"""
     logger.debug(f"Iniciando consulta para email: {email}")
@@ -243,7 +254,7 @@ def get_password_expiry(email: str) -> dict:
 
     try:
         # Obtener la política desde .env
-        policy_days = int(os.getenv('AD_PASSWORD_POLICY_DAYS', 180))
+        policy_days = env_config.get_int('AD_PASSWORD_POLICY_DAYS', 180)
         logger.debug(f"Política de contraseña: {policy_days} días")
 
         if policy_days <= 0:
@@ -319,6 +330,7 @@ def get_password_expiry(email: str) -> dict:
 
 # === NUEVAS FUNCIONES DEL FICHERO NEW ===
 
+@metrics.timed('tbot_ad_operation_seconds', operation='authenticate_user')
 def authenticate_user(username: str, password: str) -> bool:
     """Autentica al usuario contra el AD."""
     try:
@@ -330,7 +342,7 @@ def authenticate_user(username: str, password: str) -> bool:
             password=config['password'],
             auto_bind=True
         )
-        success = conn.rebind(user=f"{username}@{os.getenv('AD_DOMAIN')}", password=password)
+        success = conn.rebind(user=f"{username}@{env_config.get('AD_DOMAIN')}", password=password)
         conn.unbind()
         log_event(level='INFO' if success else 'WARNING',
                   message=f"{'Éxito' if success else 'Fallo'} al autenticar a {username} en AD",
@@ -343,7 +355,7 @@ def authenticate_user(username: str, password: str) -> bool:
 
 def get_ad_group_config():
     """Devuelve el DN del grupo de administradores desde .env"""
-    return os.getenv("AD_GROUP")
+    return env_config.get("AD_GROUP")
 
 
 def is_ad_admin_group_enabled():
@@ -352,6 +364,7 @@ def is_ad_admin_group_enabled():
     return AppSetting.get_bool('AD_ADMIN_GROUP_AUTH', False)
 
 
+@metrics.timed('tbot_ad_operation_seconds', operation='fetch_ad_users_for_import')
 def fetch_ad_users_for_import():
     """Obtiene todos los usuarios del AD, con sAMAccountName como username."""
     users = fetch_ad_users()
@@ -374,11 +387,16 @@ def fetch_ad_users_for_import():
     return result
 
 
-def get_users_in_ad_group():
-    """Obtiene directamente los usuarios del grupo AD usando el atributo 'member'."""
+@metrics.timed('tbot_ad_operation_seconds', operation='get_users_in_ad_group')
+def get_users_in_ad_group(group_dn: str = None, raise_errors: bool = False):
+    """
+    Obtiene directamente los usuarios del grupo AD usando el atributo 'member'.
+    Con raise_errors=True un fallo se propaga en lugar de devolver [], para que
+    quien cachea el resultado (web_interface.ad_roster) no lo confunda con un grupo vacío.
+    """
     try:
         config = get_ad_config()
-        group_dn = os.getenv('AD_GROUP')
+        group_dn = group_dn or get_ad_group_config()
         if not group_dn:
             raise ValueError("AD_GROUP no está configurado en .env")
 
@@ -420,9 +438,12 @@ def get_users_in_ad_group():
 
     except Exception as e:
         logger.error(f"Error obteniendo usuarios del grupo AD: {str(e)}")
+        if raise_errors:
+            raise
         return []
 
 
+@metrics.timed('tbot_ad_operation_seconds', operation='is_user_active_in_ad')
 def is_user_active_in_ad(username: str) -> bool:
     """Verifica si un usuario está activo en AD."""
     try:
@@ -448,8 +469,7 @@ def is_user_active_in_ad(username: str) -> bool:
 
 
 if __name__ == "__main__":
-    # Para pruebas directas
-    load_dotenv()
+    # Para pruebas directas (env_config ya leyó .env)
     try:
         users = fetch_ad_users()
         print(f"\nUsuarios obtenidos ({len(users)}):")
@@ -1,7 +1,9 @@
 from django.db import DatabaseError, transaction
-from telegram_bot.models import Usuario, Session
+from telegram_bot.models import Usuario, Session, PasswordExpiryNotification
 from asgiref.sync import sync_to_async
+from django.utils import timezone
 from web_interface.utils import log_event
+from web_interface import metrics
 import logging
 
 
@@ -20,13 +22,9 @@ def save_user_activity(user_id, action: str):
             source='db_handler'
         )
 
-# Configurar logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
+@metrics.timed('tbot_db_operation_seconds', operation='refresh_users')
 @transaction.atomic
 def refresh_users(users_data):
     """
@@ -49,6 +47,7 @@ def refresh_users(users_data):
     return len(users)
 
 @sync_to_async
+@metrics.timed('tbot_db_operation_seconds', operation='get_user_by_phone')
 def get_user_by_phone(phone_number):
     """Busca un usuario por número de teléfono y devuelve un diccionario con 'name' y 'mail'."""
     try:
@@ -60,6 +59,7 @@ def get_user_by_phone(phone_number):
         return None
 
 @sync_to_async
+@metrics.timed('tbot_db_operation_seconds', operation='session_delete')
 def delete_session(session_id: str) -> int:
     """
     Elimina la sesión del usuario identificada por session_id de la tabla Session.
@@ -72,3 +72,75 @@ def delete_session(session_id: str) -> int:
         logger.error(f"Error eliminando sesión: {str(e)}")
         return 0
 
+@sync_to_async
+@metrics.timed('tbot_db_operation_seconds', operation='session_get')
+def get_session(session_id: str):
+    """Devuelve la sesión identificada por session_id, o None si no existe."""
+    return Session.objects.filter(session_id=session_id).first()
+
+
+@sync_to_async
+@metrics.timed('tbot_db_operation_seconds', operation='session_touch')
+def touch_session(session, expires_at) -> None:
+    """Prolonga la sesión hasta `expires_at` (last_updated guarda la hora de expiración)."""
+    session.last_updated = expires_at
+    session.save(update_fields=['last_updated'])
+
+
+@sync_to_async
+@metrics.timed('tbot_db_operation_seconds', operation='session_open')
+def open_session(session_id: str, email: str, name: str, expires_at):
+    """Crea o reemplaza la sesión del usuario tras autenticarse con su contacto."""
+    session, _ = Session.objects.update_or_create(
+        session_id=session_id,
+        defaults={
+            'email': email,
+            'session_data': name,
+            'created_at': timezone.now(),
+            'last_updated': expires_at
+        }
+    )
+    return session
+
+
+def count_active_sessions() -> int:
+    """Sesiones del bot que aún no han expirado."""
+    return Session.objects.filter(last_updated__gt=timezone.now()).count()
+
+
+metrics.gauge('tbot_active_sessions', count_active_sessions)
+
+
+def get_expiry_notification_ledger():
+    """
+    Devuelve el conjunto de avisos ya enviados como tuplas (email, pwd_last_set, threshold).
+    Se carga en una sola consulta para que el comando de expiración no consulte por usuario.
+    """
+    return set(
+        PasswordExpiryNotification.objects.values_list('email', 'pwd_last_set', 'threshold')
+    )
+
+
+def record_expiry_notification(email: str, pwd_last_set, threshold: int, days_remaining: int) -> bool:
+    """Registra un aviso enviado. Devuelve False si ya existía (ejecución concurrente)."""
+    try:
+        _, created = PasswordExpiryNotification.objects.get_or_create(
+            email=email,
+            pwd_last_set=pwd_last_set,
+            threshold=threshold,
+            defaults={'days_remaining': days_remaining}
+        )
+        return created
+    except DatabaseError as e:
+        logger.error(f"Error registrando aviso de expiración para {email}: {str(e)}")
+        return False
+
+
+def purge_expiry_notifications(older_than) -> int:
+    """
+    Elimina avisos enviados antes de `older_than`.
+    Pasado un periodo completo de la política la contraseña ya cambió o expiró,
+    por lo que esas entradas ya no pueden evitar ningún envío.
+    """
+    deleted_count, _ = PasswordExpiryNotification.objects.filter(sent_at__lt=older_than).delete()
+    return deleted_count
@@ -3,9 +3,10 @@
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from decouple import config
 import logging
 from web_interface.utils import log_event
+from web_interface import metrics
+from web_interface.env_config import env_config
 
 
 def send_password_reset_email(email: str, token: str):
@@ -29,11 +30,11 @@ def send_password_reset_email(email: str, token: str):
 def enviar_correo(destinatarios, asunto, cuerpo_html):
     try:
         # Configuración del servidor SMTP
-        smtp_host = config('EMAIL_HOST')
-        smtp_port = config('EMAIL_PORT', cast=int)
-        smtp_user = config('EMAIL_HOST_USER')
-        smtp_pass = config('EMAIL_HOST_PASSWORD')
-        email_sender = config('EMAIL_SENDER')
+        smtp_host = env_config.require('EMAIL_HOST')
+        smtp_port = int(env_config.require('EMAIL_PORT'))
+        smtp_user = env_config.require('EMAIL_HOST_USER')
+        smtp_pass = env_config.require('EMAIL_HOST_PASSWORD')
+        email_sender = env_config.require('EMAIL_SENDER')
 
         # Crear el mensaje
         msg = MIMEMultipart()
@@ -45,10 +46,11 @@ def enviar_correo(destinatarios, asunto, cuerpo_html):
         msg.attach(MIMEText(cuerpo_html, 'html'))
 
         # Enviar el correo
-        with smtplib.SMTP(host=smtp_host, port=smtp_port) as server:
-            server.starttls()
-            server.login(smtp_user, smtp_pass)
-            server.sendmail(email_sender, destinatarios, msg.as_string())
+        with metrics.timer('tbot_smtp_send_seconds', sender='email_service'):
+            with smtplib.SMTP(host=smtp_host, port=smtp_port) as server:
+                server.starttls()
+                server.login(smtp_user, smtp_pass)
+                server.sendmail(email_sender, destinatarios, msg.as_string())
 
         logger.info(f"Correo enviado a: {', '.join(destinatarios)}")
     except Exception as e:
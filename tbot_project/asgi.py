@@ -3,6 +3,11 @@
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Servidor recomendado (las vistas de estado, la prueba de AD y la de Telegram son
+async y no ocupan un hilo mientras esperan):
+
+    uvicorn tbot_project.asgi:application --host 127.0.0.1 --port 8000 --workers 2
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
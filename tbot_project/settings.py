@@ -13,10 +13,10 @@
 from pathlib import Path
 
 import os
-import environ
-from dotenv import load_dotenv
 
-load_dotenv()
+# ← .env se lee una sola vez por proceso: env_config lo carga y copia sus claves a
+#   os.environ, de donde lo toma este fichero (y lo recarga si la web lo cambia)
+from web_interface.env_config import env_config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -33,9 +33,6 @@
 
 ALLOWED_HOSTS = []
 
-env = environ.Env()
-environ.Env.read_env()
-
 # Application definition
 
 INSTALLED_APPS = [
@@ -82,6 +79,8 @@
 ]
 
 WSGI_APPLICATION = 'tbot_project.wsgi.application'
+# ← En producción la web se sirve por ASGI (vistas async de estado, diagnóstico y Telegram)
+ASGI_APPLICATION = 'tbot_project.asgi.application'
 
 
 # Database
@@ -102,11 +101,11 @@
 }
 
 AD_CONFIG = {
-    'DOMAIN': env('AD_DOMAIN'),
-    'SERVER': env('AD_SERVER'),
-    'USER': env('AD_USER'),
-    'PASSWORD': env('AD_PASSWORD'),
-    'SEARCH_BASE': env('AD_SEARCH_BASE'),
+    'DOMAIN': env_config.get('AD_DOMAIN'),
+    'SERVER': env_config.get('AD_SERVER'),
+    'USER': env_config.get('AD_USER'),
+    'PASSWORD': env_config.get('AD_PASSWORD'),
+    'SEARCH_BASE': env_config.get('AD_SEARCH_BASE'),
 }
 
 
@@ -174,42 +173,30 @@
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/login/'
-# Configuración de logging
-import logging
-
-# Configuración de logging
-import logging
-
-# Al final del archivo
+# Configuración de logging: los loggers solo encolan y un hilo escribe en
+# logs/app.log (con rotación) y en consola. Ver web_interface/logging_setup.py
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
-    'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {message}',
-            'style': '{',
-        },
-    },
     'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
-            'formatter': 'verbose',
+        'queue': {
+            '()': 'web_interface.logging_setup.queue_handler',
         },
     },
     'root': {
-        'handlers': ['console'],
-        'level': 'INFO',
+        'handlers': ['queue'],
+        'level': os.getenv('LOG_LEVEL', 'INFO').upper(),
     },
     'loggers': {
         'web_interface': {
-            'handlers': ['console'],
             'level': 'DEBUG',
-            'propagate': False,
         },
         'ad_connector': {
-            'handlers': ['console'],
             'level': 'DEBUG',
-            'propagate': False,
+        },
+        # ← httpx registra cada petición de polling del bot
+        'httpx': {
+            'level': 'WARNING',
         },
     },
-}
\ No newline at end of file
+}
@@ -0,0 +1,163 @@
+# telegram_bot/bot_status.py
+"""
+Estado del bot compartido entre procesos (servidor web y `manage.py run_bot`).
+
+- Se guarda en telegram_bot/services_status.json. Cada escritura se hace bajo un
+  bloqueo (flock sobre services_status.json.lock), a un fichero temporal y con
+  os.replace, así que nadie lee un JSON a medias ni se pisan dos escritores.
+- Las lecturas se sirven de memoria mientras no cambie el mtime del fichero.
+- El bot en marcha escribe un latido (`heartbeat`) cada HEARTBEAT_INTERVAL
+  segundos. `get_status` solo lo da por corriendo si el latido es reciente, de
+  modo que un proceso que murió sin actualizar el estado no aparece como activo.
+"""
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from web_interface.env_config import env_config
+
+try:
+    import fcntl
+except ImportError:  # ← Windows: solo el bloqueo entre hilos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+STATUS_FILE = Path(__file__).resolve().parent / 'services_status.json'
+LOCK_FILE = STATUS_FILE.with_name(STATUS_FILE.name + '.lock')
+
+HEARTBEAT_INTERVAL = 10   # segundos entre latidos del bot
+HEARTBEAT_TIMEOUT = 45    # sin latido durante este tiempo el bot se da por detenido
+
+DEFAULT_STATUS = {
+    "telegram_running": False,
+    "telegram_start_time": None,
+    "telegram_auto_start": False,
+    "heartbeat": None,
+    "pid": None,
+    "config_version": None,  # ← versión de .env que está usando el bot
+}
+
+_lock = threading.Lock()
+_cache = {'key': None, 'data': None}
+
+
+def _file_key():
+    try:
+        stat = STATUS_FILE.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def read_status() -> dict:
+    """Contenido del fichero tal cual (sin comprobar el latido), cacheado por mtime."""
+    key = _file_key()
+    if key is not None and key == _cache['key']:
+        return dict(_cache['data'])
+    data = dict(DEFAULT_STATUS)
+    if key is not None:
+        try:
+            with open(STATUS_FILE, 'r', encoding='utf-8') as f:
+                data.update(json.load(f))
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Error al leer {STATUS_FILE}: {e}")
+            return data
+    _cache.update(key=key, data=data)
+    return dict(data)
+
+
+def is_alive(status: dict, now: float = None) -> bool:
+    """El bot corre si así consta y su último latido (o el arranque, si aún no hay) es reciente."""
+    if not status.get('telegram_running'):
+        return False
+    last_seen = status.get('heartbeat') or status.get('telegram_start_time')
+    if not last_seen:
+        return False
+    return (now or time.time()) - last_seen <= HEARTBEAT_TIMEOUT
+
+
+def get_status() -> dict:
+    status = read_status()
+    status['telegram_running'] = is_alive(status)
+    if not status['telegram_running']:
+        status['telegram_start_time'] = None
+    return status
+
+
+@contextmanager
+def _locked():
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        STATUS_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(LOCK_FILE, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _write(data: dict) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=STATUS_FILE.parent, prefix='.services_status.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+        os.chmod(tmp_path, 0o664)
+        os.replace(tmp_path, STATUS_FILE)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def update_status(**fields) -> bool:
+    """
+    Actualiza los campos indicados (telegram_running, telegram_start_time,
+    telegram_auto_start, heartbeat, pid). Los valores None no modifican el campo,
+    salvo telegram_start_time al detener el bot.
+    """
+    try:
+        with _locked():
+            data = read_status()
+            for key, value in fields.items():
+                if value is not None:
+                    data[key] = value
+            if fields.get('telegram_running') is False:
+                data.update(telegram_start_time=None, heartbeat=None, pid=None, config_version=None)
+            _write(data)
+            _cache.update(key=_file_key(), data=data)
+        return True
+    except Exception as e:
+        logger.error(f"Error al actualizar estado: {e}")
+        return False
+
+
+def mark_started() -> bool:
+    now = time.time()
+    return update_status(telegram_running=True, telegram_start_time=now, heartbeat=now, pid=os.getpid(),
+                         config_version=env_config.version)
+
+
+def mark_stopped() -> bool:
+    return update_status(telegram_running=False)
+
+
+def beat() -> bool:
+    # ← env_config.version comprueba .env: los cambios de la web se cargan aquí aunque no haya tráfico
+    return update_status(heartbeat=time.time(), pid=os.getpid(), config_version=env_config.version)
+
+
+async def heartbeat_loop(interval: float = HEARTBEAT_INTERVAL):
+    """Tarea del bucle del bot: escribe el latido mientras la aplicación está viva."""
+    while True:
+        await asyncio.to_thread(beat)
+        await asyncio.sleep(interval)
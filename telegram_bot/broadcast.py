@@ -0,0 +1,284 @@
+# telegram_bot/broadcast.py
+"""
+Difusión de mensajes a usuarios vinculados con el bot (p. ej. avisos de expiración).
+
+- Respeta el límite global de Telegram (~30 msg/s) y el límite por chat (~1 msg/s)
+  mediante token buckets.
+- Ante `RetryAfter` pausa todos los envíos el tiempo indicado por Telegram.
+- El estado de cada destinatario se guarda en `BroadcastDelivery`, por lo que una
+  nueva ejecución solo reintenta lo que quedó pendiente.
+
+Para probar contra una Bot API local falsa basta con definir TELEGRAM_API_BASE_URL
+(p. ej. http://127.0.0.1:8081/bot) o pasar `base_url` a `run_broadcast`.
+"""
+import asyncio
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+from telegram.request import HTTPXRequest
+
+from telegram_bot.message_catalog import catalog
+from telegram_bot.models import BroadcastDelivery, Session
+from web_interface.utils import log_event
+from web_interface import metrics
+from web_interface.env_config import env_config
+
+logger = logging.getLogger(__name__)
+
+# ← Límites de Telegram
+GLOBAL_RATE = 30       # mensajes por segundo en total
+PER_CHAT_RATE = 1      # mensajes por segundo a un mismo chat
+
+MAX_ATTEMPTS = 3       # intentos por ejecución ante errores de red
+MAX_FLOOD_WAITS = 5    # esperas por RetryAfter antes de dejar el mensaje pendiente
+DEFAULT_CONCURRENCY = 8
+LINK_MAX_AGE_DAYS = 90   # ← días desde que caducó la sesión en que el chat sigue contando como vinculado
+
+EXPIRY_REMINDER_DEFAULT = (
+    "⏳ Tu contraseña ({email}) expirará en {days} día(s).\n"
+    "Puedes cambiarla desde este bot con /start."
+)
+
+
+def count_pending_deliveries() -> int:
+    return BroadcastDelivery.objects.filter(status=BroadcastDelivery.STATUS_PENDING).count()
+
+
+metrics.gauge('tbot_broadcast_pending', count_pending_deliveries)
+
+
+class TokenBucket:
+    """Token bucket asíncrono: `rate` tokens por segundo con ráfagas de hasta `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Bloquea el bucket durante `seconds` y lo vacía (usado con RetryAfter)."""
+        now = time.monotonic()
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0
+        self.updated = self.paused_until
+
+
+class RateLimiter:
+    """Combina el límite global con un bucket por chat."""
+
+    def __init__(self, global_rate: float = GLOBAL_RATE, per_chat_rate: float = PER_CHAT_RATE):
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_rate = per_chat_rate
+        self._chat_buckets = {}
+
+    async def acquire(self, chat_id: int):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, capacity=1)
+        await bucket.acquire()
+        await self.global_bucket.acquire()
+
+    def penalize(self, seconds: float):
+        self.global_bucket.pause(seconds)
+
+
+class Broadcaster:
+    """Envía una lista de `BroadcastDelivery` con varios workers y persiste el resultado."""
+
+    def __init__(self, bot: Bot, limiter: RateLimiter = None, concurrency: int = DEFAULT_CONCURRENCY):
+        self.bot = bot
+        self.limiter = limiter or RateLimiter()
+        self.concurrency = concurrency
+        self.stats = {'sent': 0, 'failed': 0, 'deferred': 0, 'flood_waits': 0}
+
+    async def _save(self, delivery: BroadcastDelivery):
+        await sync_to_async(BroadcastDelivery.objects.filter(pk=delivery.pk).update)(
+            status=delivery.status,
+            attempts=delivery.attempts,
+            last_error=delivery.last_error,
+            sent_at=delivery.sent_at,
+        )
+
+    async def send(self, delivery: BroadcastDelivery):
+        tries = 0
+        flood_waits = 0
+        while tries < MAX_ATTEMPTS:
+            await self.limiter.acquire(delivery.chat_id)
+            try:
+                await self.bot.send_message(chat_id=delivery.chat_id, text=delivery.text)
+                delivery.attempts += 1
+                delivery.status = BroadcastDelivery.STATUS_SENT
+                delivery.sent_at = timezone.now()
+                delivery.last_error = ''
+                self.stats['sent'] += 1
+                break
+            except RetryAfter as e:
+                # ← Control de flood: pausar todos los envíos, sin consumir intentos
+                self.stats['flood_waits'] += 1
+                flood_waits += 1
+                delivery.last_error = str(e)
+                self.limiter.penalize(float(e.retry_after))
+                if flood_waits >= MAX_FLOOD_WAITS:
+                    break
+            except (Forbidden, BadRequest) as e:
+                # ← Usuario bloqueó el bot o chat inválido: no tiene sentido reintentar
+                delivery.attempts += 1
+                delivery.status = BroadcastDelivery.STATUS_FAILED
+                delivery.last_error = str(e)
+                self.stats['failed'] += 1
+                break
+            except NetworkError as e:
+                tries += 1
+                delivery.attempts += 1
+                delivery.last_error = str(e)
+                await asyncio.sleep(2 ** tries)
+
+        if delivery.status == BroadcastDelivery.STATUS_PENDING:
+            self.stats['deferred'] += 1
+        await self._save(delivery)
+
+    async def run(self, deliveries) -> dict:
+        queue = asyncio.Queue()
+        for delivery in deliveries:
+            queue.put_nowait(delivery)
+
+        async def worker():
+            while True:
+                try:
+                    delivery = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    await self.send(delivery)
+                except Exception as e:
+                    logger.exception(f"Error inesperado enviando a {delivery.chat_id}: {e}")
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(max(1, self.concurrency))))
+        elapsed = time.monotonic() - started
+
+        stats = dict(self.stats)
+        stats['total'] = len(deliveries)
+        stats['elapsed'] = round(elapsed, 2)
+        stats['rate'] = round(stats['sent'] / elapsed, 2) if elapsed > 0 else 0.0
+        return stats
+
+
+def build_bot(token: str = None, base_url: str = None, pool_size: int = DEFAULT_CONCURRENCY) -> Bot:
+    """Crea un Bot con un pool de conexiones acorde a la concurrencia de la difusión."""
+    token = token or env_config.get('TELEGRAM_BOT_TOKEN')
+    if not token:
+        raise ValueError("Falta el token del bot en .env")
+    base_url = base_url or env_config.get('TELEGRAM_API_BASE_URL', 'https://api.telegram.org/bot')
+    request = HTTPXRequest(connection_pool_size=pool_size, connect_timeout=10, read_timeout=20)
+    return Bot(token, base_url=base_url, request=request)
+
+
+def get_linked_chats(emails) -> dict:
+    """
+    Devuelve {email: [chat_id, ...]} de los usuarios con una sesión/contacto vinculado al bot.
+    Una sesión caducada sigue valiendo (el chat ya se verificó con el contacto y un aviso
+    no requiere sesión abierta) mientras no hayan pasado BROADCAST_LINK_MAX_AGE_DAYS
+    desde su caducidad; las cerradas con "Terminar" ya no existen.
+    """
+    max_age = env_config.get_int('BROADCAST_LINK_MAX_AGE_DAYS', LINK_MAX_AGE_DAYS)
+    chats = {}
+    rows = Session.objects.filter(email__in=list(emails))
+    if max_age > 0:
+        # ← last_updated guarda la hora de caducidad de la sesión
+        rows = rows.filter(last_updated__gt=timezone.now() - timezone.timedelta(days=max_age))
+    rows = rows.values_list('email', 'session_id')
+    for email, session_id in rows:
+        try:
+            chats.setdefault(email, []).append(int(session_id))
+        except (TypeError, ValueError):
+            continue
+    return chats
+
+
+def queue_broadcast(campaign: str, recipients) -> int:
+    """
+    Registra entregas pendientes. `recipients` es un iterable de (chat_id, email, text).
+    Las entregas ya existentes para (campaign, chat_id) se ignoran.
+    """
+    deliveries = [
+        BroadcastDelivery(campaign=campaign, chat_id=chat_id, email=email, text=text)
+        for chat_id, email, text in recipients
+    ]
+    BroadcastDelivery.objects.bulk_create(deliveries, ignore_conflicts=True, batch_size=500)
+    return len(deliveries)
+
+
+def queue_expiry_reminders(reminders) -> int:
+    """
+    Encola avisos de expiración por Telegram para los usuarios vinculados.
+    `reminders` es un iterable de dicts con email, days_remaining, threshold y pwd_last_set.
+    """
+    reminders = list(reminders)
+    if not reminders:
+        return 0
+    chats = get_linked_chats(r['email'] for r in reminders)
+
+    queued = 0
+    for reminder in reminders:
+        email = reminder['email']
+        if email not in chats:
+            continue
+        campaign = f"expiry:{email}:{int(reminder['pwd_last_set'].timestamp())}:{reminder['threshold']}"
+        text = catalog.format('expiry_reminder', EXPIRY_REMINDER_DEFAULT,
+                              email=email, days=reminder['days_remaining'])
+        queued += queue_broadcast(campaign, [(chat_id, email, text) for chat_id in chats[email]])
+    return queued
+
+
+def get_pending_deliveries(campaign_prefix: str = None):
+    deliveries = BroadcastDelivery.objects.filter(status=BroadcastDelivery.STATUS_PENDING)
+    if campaign_prefix:
+        deliveries = deliveries.filter(campaign__startswith=campaign_prefix)
+    return list(deliveries.order_by('id'))
+
+
+def run_broadcast(campaign_prefix: str = None, token: str = None, base_url: str = None,
+                  concurrency: int = DEFAULT_CONCURRENCY) -> dict:
+    """Envía todas las entregas pendientes y devuelve las estadísticas de rendimiento."""
+    deliveries = get_pending_deliveries(campaign_prefix)
+    if not deliveries:
+        return {'sent': 0, 'failed': 0, 'deferred': 0, 'flood_waits': 0,
+                'total': 0, 'elapsed': 0.0, 'rate': 0.0}
+
+    async def _run():
+        async with build_bot(token, base_url, pool_size=concurrency) as bot:
+            return await Broadcaster(bot, concurrency=concurrency).run(deliveries)
+
+    stats = asyncio.run(_run())
+    log_event(
+        'INFO',
+        f"Difusión completada: {stats['sent']}/{stats['total']} enviados, {stats['failed']} fallidos, "
+        f"{stats['deferred']} pendientes, {stats['rate']} msg/s en {stats['elapsed']}s",
+        'broadcast'
+    )
+    return stats
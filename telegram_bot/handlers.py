@@ -1,12 +1,10 @@
 from datetime import datetime, timedelta
-from decouple import config
 import re
 import logging
-import os
-import json
 import asyncio
+import functools
 import threading
-from pathlib import Path
+import time
 from asgiref.sync import sync_to_async
 from django.utils import timezone
 from telegram import (
@@ -27,9 +25,16 @@
     ConversationHandler
 )
 from telegram_bot.models import Session
+from telegram_bot import bot_status
 
 # Importar funciones de la base de datos y AD
-from db_handler.db_handler import get_user_by_phone, delete_session
+from db_handler.db_handler import (
+    get_user_by_phone,
+    delete_session,
+    get_session,
+    touch_session,
+    open_session
+)
 from ad_connector.ad_operations import (
     check_group_membership,
     get_password_expiry,
@@ -43,24 +48,12 @@
 )
 
 from web_interface.utils import log_event
+from web_interface import metrics, tracing
+from web_interface.env_config import env_config
 
-# Ruta al archivo de mensajes
-MESSAGES_FILE = Path(__file__).parent / "messages.json"
-
-# Cargar mensajes
-def load_messages():
-    if MESSAGES_FILE.exists():
-        with open(MESSAGES_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
+# Catálogo de mensajes compartido: se recarga solo cuando cambia messages.json
+from telegram_bot.message_catalog import catalog as messages
 
-messages = load_messages()
-
-# Configurar logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 # Estados para los ConversationHandlers
@@ -71,8 +64,9 @@ def load_messages():
 GET_USER_PASSWORD_CONFIRMATION = 12
 GET_EMAIL = 1
 
-# Duración de la sesión en minutos
-SESSION_DURATION = int(os.getenv("SESSION_DURATION", 30))
+def session_duration() -> timedelta:
+    """SESSION_DURATION (minutos) leído en cada uso: los cambios desde la web aplican sin reiniciar."""
+    return timedelta(minutes=env_config.get_int("SESSION_DURATION", 30))
 
 def get_greeting():
     hour = datetime.now().hour
@@ -91,7 +85,14 @@ def escape_markdown_v2(text: str) -> str:
 async def verify_session(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     try:
         user = update.effective_user
-        session = await sync_to_async(Session.objects.get)(session_id=str(user.id))
+        session = await get_session(str(user.id))
+        if session is None:
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text=messages.get("session_inactive","❌ No tienes una sesión activa. Por favor, inicia sesión [/start - 🚀 Iniciar Bot]"),
+                parse_mode="Markdown"
+            )
+            return False
         now = timezone.now()
         if now > session.last_updated:
             await context.bot.send_message(
@@ -101,16 +102,8 @@ async def verify_session(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             )
             return False
         else:
-            session.last_updated = timezone.now() + timedelta(minutes=SESSION_DURATION)
-            await sync_to_async(session.save)()
+            await touch_session(session, timezone.now() + session_duration())
             return True
-    except Session.DoesNotExist:
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text=messages.get("session_inactive","❌ No tienes una sesión activa. Por favor, inicia sesión [/start - 🚀 Iniciar Bot]"),
-            parse_mode="Markdown"
-        )
-        return False
     except Exception as e:
         await sync_to_async(log_event)('ERROR', f"Error verificando la sesión: {str(e)}", 'telegram_bot')
         return False
@@ -169,14 +162,11 @@ async def handle_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         is_member = await sync_to_async(check_group_membership)(usuario['mail'])
 
-        await sync_to_async(Session.objects.update_or_create)(
-            session_id=str(user_id),
-            defaults={
-                'email': usuario['mail'],
-                'session_data': usuario['name'],
-                'created_at': timezone.now(),
-                'last_updated': timezone.now() + timedelta(minutes=SESSION_DURATION)
-            }
+        await open_session(
+            str(user_id),
+            usuario['mail'],
+            usuario['name'],
+            timezone.now() + session_duration()
         )
 
         keyboard = [
@@ -191,8 +181,12 @@ async def handle_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
         keyboard.append([InlineKeyboardButton("❌ Terminar bot 🤖", callback_data="terminar_bot")])
         reply_markup = InlineKeyboardMarkup(keyboard)
 
-        message_text = messages.get("start_success","👤 : {name}\n📧 : {email}\n\n✅ Autenticación exitosa.")
-        message_text = message_text.format(name=usuario['name'], email=usuario['mail'])    
+        message_text = messages.format(
+            "start_success",
+            "👤 : {name}\n📧 : {email}\n\n✅ Autenticación exitosa.",
+            name=usuario['name'],
+            email=usuario['mail']
+        )
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text=message_text,
@@ -262,18 +256,19 @@ async def process_password_confirmation(update: Update, context: ContextTypes.DE
             return ConversationHandler.END
         result = await sync_to_async(cambiar_password_usuario)(email, new_password)
         if result["success"]:
+            await sync_to_async(log_event)('INFO', f"Contraseña cambiada para {email} (propia)", 'telegram_bot')
             await context.bot.send_message(
                 chat_id=chat_id,
                 text=messages.get("password_changed_success", "✅ La contraseña fue cambiada exitosamente.")
             )
             notificar_cambio_contrasena_usuario(email, new_password)
-            admin_emails_str = config('ADMIN_EMAILS', default='')
-            admin_emails = [e.strip() for e in admin_emails_str.split(",") if e.strip()]
+            admin_emails = env_config.get_list('ADMIN_EMAILS')
             if admin_emails:
                 notificar_cambio_contrasena_admin(admin_emails, email)
             context.user_data.clear()
             return ConversationHandler.END
         else:
+            await sync_to_async(log_event)('WARNING', f"Fallo al cambiar la contraseña de {email}: {result['message']}", 'telegram_bot')
             await context.bot.send_message(
                 chat_id=chat_id,
                 text=f"⚠️ Error al cambiar contraseña: {result['message']}"
@@ -356,15 +351,16 @@ async def process_user_password_confirmation(update: Update, context: ContextTyp
             return ConversationHandler.END
         result = await sync_to_async(cambiar_password_usuario)(target_email, new_password)
         if result["success"]:
+            await sync_to_async(log_event)('INFO', f"Contraseña cambiada para {target_email} (por administrador)", 'telegram_bot')
             await context.bot.send_message(chat_id=chat_id,
                                            text=messages.get("admin_password_changed","✅ La contraseña fue cambiada exitosamente para el usuario."))
             notificar_cambio_contrasena_usuario(target_email, new_password)
-            admin_emails_str = config('ADMIN_EMAILS', default='')
-            admin_emails = [e.strip() for e in admin_emails_str.split(",") if e.strip()]
+            admin_emails = env_config.get_list('ADMIN_EMAILS')
             await sync_to_async(log_event)('INFO', f"Emails de administradores leídos: {admin_emails}", 'telegram_bot')
             if admin_emails:
                 notificar_cambio_contrasena_admin(admin_emails, target_email)
         else:
+            await sync_to_async(log_event)('WARNING', f"Fallo al cambiar la contraseña de {target_email}: {result['message']}", 'telegram_bot')
             await context.bot.send_message(chat_id=chat_id, text=messages.get(f"general_error",f"⚠️ Error: {result['message']}"))
     except Exception as e:
         await sync_to_async(log_event)('EXCEPTION', f"Error en process_user_password_confirmation: {str(e)}", 'telegram_bot')
@@ -469,17 +465,18 @@ async def check_expiry(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    session_exists = await sync_to_async(Session.objects.filter(session_id=str(user.id)).exists)()
-    if session_exists:
-        await sync_to_async(Session.objects.filter(session_id=str(user.id)).delete)()
+    if await delete_session(str(user.id)):
         await sync_to_async(log_event)('INFO', f"Sesión previa eliminada para el usuario {user.id}", 'telegram_bot')
     greeting = get_greeting()
     contexts = {
         'g_greeting': greeting,
         'user_first_name': user.first_name
     }
-    message_template = messages.get("start_session", "{g_greeting} {user_first_name}! 👋\n\nPara continuar, 🙏 comparte tu número de contacto:")
-    message_text = message_template.format_map(contexts)
+    message_text = messages.format(
+        "start_session",
+        "{g_greeting} {user_first_name}! 👋\n\nPara continuar, 🙏 comparte tu número de contacto:",
+        **contexts
+    )
     await context.bot.send_message(
         chat_id=update.effective_chat.id,
         text=message_text,
@@ -503,6 +500,41 @@ async def handle_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif action == "exit_bot":
         await terminate_bot(update, context)
 
+def traced_handler(callback):
+    """Una traza por actualización (con los spans de AD/DB/SMTP) y la latencia del handler."""
+    name = callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        user = getattr(update, 'effective_user', None)
+        start = time.perf_counter()
+        outcome = 'ok'
+        try:
+            with tracing.trace(
+                f"telegram:{name}",
+                update_id=getattr(update, 'update_id', None),
+                user_id=user.id if user else None
+            ):
+                return await callback(update, context)
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            metrics.record('tbot_telegram_handler_seconds', time.perf_counter() - start, outcome, handler=name)
+
+    return wrapper
+
+def instrument_handlers(handlers) -> None:
+    """Envuelve cada callback (también los de los ConversationHandler) con `traced_handler`."""
+    for handler in handlers:
+        if isinstance(handler, ConversationHandler):
+            nested = list(handler.entry_points) + list(handler.fallbacks)
+            for state_handlers in handler.states.values():
+                nested.extend(state_handlers)
+            instrument_handlers(nested)
+        else:
+            handler.callback = traced_handler(handler.callback)
+
 async def run_bot(token: str, stop_event: threading.Event = None):
     """Inicia la aplicación del bot de Telegram."""
     application = None
@@ -548,6 +580,12 @@ async def run_bot(token: str, stop_event: threading.Event = None):
         application.add_handler(CallbackQueryHandler(check_expiry, pattern='^check_expiry$'))
         application.add_handler(CallbackQueryHandler(terminate_bot, pattern='^terminar_bot$'))
 
+        # ← Trazas y métricas de latencia por handler
+        for group_handlers in application.handlers.values():
+            instrument_handlers(group_handlers)
+
+        env_config.on_change(on_config_change)
+
         # ← Función asíncrona que ejecuta el bot
         async def run():
             # ← Inicializar y empezar el bot
@@ -557,12 +595,17 @@ async def run():
             # ← Iniciar el polling
             await application.updater.start_polling()
 
+            # ← Latido en services_status.json mientras el bucle esté vivo
+            heartbeat = asyncio.create_task(bot_status.heartbeat_loop())
+
             # ← Esperar a que se detenga
             if stop_event:
                 while not stop_event.is_set():
                     await asyncio.sleep(1)
                 await sync_to_async(log_event)('INFO', 'Señal de detención recibida. Deteniendo el bot...', 'telegram_bot')
 
+            heartbeat.cancel()
+
             # ← Detener el updater (esto detendrá run_polling)
             await application.updater.stop()
 
@@ -580,11 +623,16 @@ async def run():
     finally:
         # ← Actualizar estado
         try:
-            from web_interface.views import update_status
-            update_status(telegram_running=False, telegram_start_time=None)
+            await asyncio.to_thread(bot_status.mark_stopped)
         except Exception as e:
             await sync_to_async(log_event)('ERROR', f'Error al actualizar estado: {str(e)}', 'telegram_bot')
 
+def on_config_change(keys):
+    """Aviso en los logs cuando el bot recoge cambios de .env hechos desde la web."""
+    log_event('INFO', f"Configuración recargada en el bot (versión {env_config.version}): {', '.join(keys)}", 'telegram_bot')
+    if 'TELEGRAM_BOT_TOKEN' in keys:
+        log_event('WARNING', 'El token del bot cambió: reinicie el bot para usarlo.', 'telegram_bot')
+
 # ← Función síncrona para iniciar el bot en un hilo
 def run_bot_sync(token: str, stop_event: threading.Event = None):
     """Función síncrona que ejecuta run_bot en un loop asyncio."""
@@ -1,58 +1,138 @@
-from django.core.management.base import BaseCommand
-import os
-import ssl
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone as dj_timezone
 import logging
-from ldap3 import Server, Connection, Tls, SUBTREE
+from ldap3 import Server, Connection
 from ldap3.core.exceptions import LDAPException, LDAPBindError
 from datetime import datetime, timedelta
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import smtplib
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+from db_handler.db_handler import (
+    get_expiry_notification_ledger,
+    record_expiry_notification,
+    purge_expiry_notifications,
+)
+from ad_connector.ad_operations import get_ad_config
+from telegram_bot.broadcast import queue_expiry_reminders, run_broadcast
+from web_interface import metrics
+from web_interface.env_config import env_config
+
 logger = logging.getLogger(__name__)
 
+SMTP_TIMEOUT = 30  # segundos por operación con el servidor de correo
+
+
+def get_notify_thresholds(value=None):
+    """
+    Devuelve los umbrales de aviso (días antes de expirar) ordenados de menor a mayor.
+    Se leen de PASSWORD_EXPIRY_THRESHOLDS (p. ej. "30,14,7,3,1").
+    """
+    raw = value or env_config.get('PASSWORD_EXPIRY_THRESHOLDS', '30,14,7,3,1')
+    thresholds = sorted({int(t) for t in raw.split(',') if t.strip()})
+    if not thresholds or thresholds[0] <= 0:
+        raise ValueError("PASSWORD_EXPIRY_THRESHOLDS debe contener días mayores a 0")
+    return thresholds
 
-def get_ad_config():
-    return {
-        'host': os.getenv('AD_SERVER'),
-        'port': int(os.getenv('AD_PORT')),
-        'use_ssl': os.getenv('AD_USE_SSL', 'false').lower() == 'true',
-        'user': os.getenv('AD_USER'),
-        'password': os.getenv('AD_PASSWORD'),
-        'search_base': os.getenv('AD_SEARCH_BASE'),
-        'tls_config': Tls(validate=ssl.CERT_NONE, version=ssl.PROTOCOL_TLSv1_2)
-    }
+
+def get_crossed_threshold(days_remaining, thresholds):
+    """Devuelve el menor umbral alcanzado por days_remaining, o None si no alcanza ninguno."""
+    for threshold in thresholds:
+        if days_remaining <= threshold:
+            return threshold
+    return None
 
 
 class Command(BaseCommand):
-    help = 'Notifica a usuarios sobre la expiración de sus contraseñas'
+    help = 'Notifica a usuarios sobre la expiración de sus contraseñas (un aviso por umbral)'
+
+    # ← Usuarios notificados en la última ejecución (lo lee el planificador)
+    rows_processed = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--thresholds',
+            help='Umbrales de aviso separados por coma (por defecto PASSWORD_EXPIRY_THRESHOLDS o 30,14,7,3,1)'
+        )
+        parser.add_argument(
+            '--no-telegram',
+            action='store_true',
+            help='No enviar el recordatorio por el bot a los usuarios vinculados'
+        )
+        parser.add_argument(
+            '--telegram-base-url',
+            help='URL base de la Bot API (por defecto TELEGRAM_API_BASE_URL o la API oficial)'
+        )
+
+    def _smtp_session(self):
+        """Sesión SMTP abierta al primer envío y reutilizada en toda la ejecución."""
+        if self._smtp is None:
+            server = smtplib.SMTP(env_config.require('EMAIL_HOST'), env_config.get_int('EMAIL_PORT', 25),
+                                  timeout=SMTP_TIMEOUT)
+            if env_config.get_bool('EMAIL_USE_TLS'):
+                server.starttls()
+            user, password = env_config.get('EMAIL_HOST_USER'), env_config.get('EMAIL_HOST_PASSWORD')
+            if user and password:
+                server.login(user, password)
+            self._smtp = server
+        return self._smtp
+
+    def _close_smtp(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
 
     def send_mail(self, to, subject, message):
         msg = MIMEMultipart()
-        msg['From'] = os.getenv('EMAIL_SENDER')
+        msg['From'] = env_config.get('EMAIL_SENDER')
         msg['To'] = to
         msg['Subject'] = subject
         msg.attach(MIMEText(message, 'html', 'utf-8'))
 
+        for _ in range(2):
+            try:
+                with metrics.timer('tbot_smtp_send_seconds', sender='password_expiration'):
+                    self._smtp_session().send_message(msg)
+                return True
+            except smtplib.SMTPServerDisconnected as e:
+                # ← El servidor cerró la sesión (inactividad o límite de mensajes): se reabre una vez
+                self._smtp = None
+                error = e
+            except Exception as e:
+                if isinstance(e, (TimeoutError, ConnectionError)):
+                    self._close_smtp()  # ← sesión en estado desconocido: la próxima se abre de nuevo
+                error = e
+                break
+        logger.error(f"Error enviando email a {to}: {str(error)}")
+        return False
+
+    def send_telegram_reminders(self, reminders, base_url=None):
+        """Encola y envía por el bot los avisos a usuarios con sesión/contacto vinculado."""
         try:
-            with smtplib.SMTP(os.getenv('EMAIL_HOST'), int(os.getenv('EMAIL_PORT'))) as server:
-                if os.getenv('EMAIL_USE_TLS', 'False').lower() == 'true':
-                    server.starttls()
-                if os.getenv('EMAIL_HOST_USER') and os.getenv('EMAIL_HOST_PASSWORD'):
-                    server.login(os.getenv('EMAIL_HOST_USER'), os.getenv('EMAIL_HOST_PASSWORD'))
-                server.send_message(msg)
-            return True
+            queued = queue_expiry_reminders(reminders)
+            stats = run_broadcast(campaign_prefix='expiry:', base_url=base_url)
+            self.stdout.write(
+                f"Telegram: {queued} avisos encolados, {stats['sent']}/{stats['total']} enviados, "
+                f"{stats['failed']} fallidos, {stats['deferred']} pendientes ({stats['rate']} msg/s)"
+            )
         except Exception as e:
-            logger.error(f"Error enviando email a {to}: {str(e)}")
-            return False
+            logger.error(f"Error enviando avisos por Telegram: {str(e)}")
+            self.stdout.write(self.style.WARNING(f'No se pudieron enviar avisos por Telegram: {str(e)}'))
 
     def handle(self, *args, **options):
+        self._smtp = None
         try:
             config = get_ad_config()
-            days_to_notify = 30  # días antes para empezar a notificar
-            policy_days = int(os.getenv('AD_PASSWORD_POLICY_DAYS', '90'))
+            thresholds = get_notify_thresholds(options.get('thresholds'))
+            policy_days = env_config.get_int('AD_PASSWORD_POLICY_DAYS', 90)
+            admin_emails = env_config.get_list('ADMIN_EMAILS')
+
+            # ← Avisos ya enviados: (email, pwdLastSet, umbral)
+            purge_expiry_notifications(dj_timezone.now() - timedelta(days=policy_days))
+            ledger = get_expiry_notification_ledger()
 
             body_template = """
             Estimado usuario:
@@ -71,7 +151,7 @@ def handle(self, *args, **options):
 
             Atentamente,
             Departamento de Informática y comunicaciones.
-            """ % ("%s", os.getenv('PASSWORD_CHANGE_URL'), os.getenv('TELEGRAM_BOT_URL'))
+            """ % ("%s", env_config.get('PASSWORD_CHANGE_URL'), env_config.get('TELEGRAM_BOT_URL'))
 
             footer = """
             <br><br>
@@ -81,10 +161,10 @@ def handle(self, *args, **options):
             Email: %s<br>
             Telf: %s
             """ % (
-                os.getenv('INSTITUTION_NAME'),
-                os.getenv('INSTITUTION_ADDRESS'),
-                os.getenv('ADMIN_EMAILS').split(',')[0],
-                os.getenv('INSTITUTION_PHONE')
+                env_config.get('INSTITUTION_NAME'),
+                env_config.get('INSTITUTION_ADDRESS'),
+                admin_emails[0] if admin_emails else '',
+                env_config.get('INSTITUTION_PHONE')
             )
 
             # Configurar servidor LDAP
@@ -104,14 +184,17 @@ def handle(self, *args, **options):
 
                 search_filter = '(&(objectClass=user)(objectCategory=person)(mail=*))'
 
-                conn.search(
-                    search_base=config['search_base'],
-                    search_filter=search_filter,
-                    attributes=['mail', 'pwdLastSet', 'userAccountControl']
-                )
+                with metrics.timer('tbot_ad_operation_seconds', operation='password_expiration_search'):
+                    conn.search(
+                        search_base=config['search_base'],
+                        search_filter=search_filter,
+                        attributes=['mail', 'pwdLastSet', 'userAccountControl']
+                    )
 
                 notified_users = []
+                reminders = []
                 count = 0
+                skipped = 0
 
                 for entry in conn.entries:
                     try:
@@ -123,25 +206,43 @@ def handle(self, *args, **options):
                         if isinstance(last_set_date, str):
                             last_set_date = datetime.fromisoformat(last_set_date.replace('Z', '+00:00'))
 
+                        # Normalizar a segundos para que la clave del registro sea estable
+                        last_set_date = last_set_date.replace(microsecond=0)
+
                         # Calcular fecha de expiración
                         expiry_date = last_set_date + timedelta(days=policy_days)
                         days_remaining = (expiry_date - datetime.now(expiry_date.tzinfo)).days
 
                         # Verificar cuenta activa y necesidad de notificación
-                        if (int(entry.userAccountControl.value) == 512 and
-                                0 < days_remaining <= days_to_notify):
+                        if int(entry.userAccountControl.value) != 512 or days_remaining <= 0:
+                            continue
 
-                            email = str(entry.mail.value)
-                            message = body_template % days_remaining + footer
+                        threshold = get_crossed_threshold(days_remaining, thresholds)
+                        if threshold is None:
+                            continue
 
-                            if self.send_mail(
-                                    email,
-                                    "Atención Usuario: Notificación de expiración de su contraseña",
-                                    message
-                            ):
-                                notified_users.append(f"{email} - {days_remaining} días restantes")
-                                count += 1
-                                logger.info(f"Notificación enviada a {email} (expira en {days_remaining} días)")
+                        email = str(entry.mail.value)
+                        if (email, last_set_date, threshold) in ledger:
+                            skipped += 1
+                            continue
+
+                        message = body_template % days_remaining + footer
+
+                        if self.send_mail(
+                                email,
+                                "Atención Usuario: Notificación de expiración de su contraseña",
+                                message
+                        ):
+                            record_expiry_notification(email, last_set_date, threshold, days_remaining)
+                            reminders.append({
+                                'email': email,
+                                'pwd_last_set': last_set_date,
+                                'threshold': threshold,
+                                'days_remaining': days_remaining,
+                            })
+                            notified_users.append(f"{email} - {days_remaining} días restantes")
+                            count += 1
+                            logger.info(f"Notificación enviada a {email} (expira en {days_remaining} días, umbral {threshold})")
 
                     except Exception as e:
                         logger.error(f"Error procesando usuario: {str(e)}")
@@ -153,20 +254,30 @@ def handle(self, *args, **options):
                     summary = "Listado de usuarios notificados ({}):\n\n{}".format(
                         count, '\n'.join(notified_users)
                     )
-                    for admin_email in os.getenv('ADMIN_EMAILS').split(','):
+                    for admin_email in admin_emails:
                         self.send_mail(
-                            admin_email.strip(),
+                            admin_email,
                             f"Usuarios con contraseña próxima a expirar: {count}",
                             summary
                         )
 
+                self.rows_processed = count
+
+                if not options.get('no_telegram'):
+                    self.send_telegram_reminders(reminders, options.get('telegram_base_url'))
+
                 self.stdout.write(
-                    self.style.SUCCESS(f'Notificación completada. {count} usuarios notificados.')
+                    self.style.SUCCESS(
+                        f'Notificación completada. {count} usuarios notificados, '
+                        f'{skipped} omitidos por aviso ya enviado.'
+                    )
                 )
 
         except (LDAPBindError, LDAPException) as e:
             logger.error(f"Error LDAP: {str(e)}")
-            self.stdout.write(self.style.ERROR(f'Error en la conexión LDAP: {str(e)}'))
+            raise CommandError(f'Error en la conexión LDAP: {str(e)}') from e
         except Exception as e:
             logger.error(f"Error inesperado: {str(e)}")
-            self.stdout.write(self.style.ERROR(f'Error inesperado: {str(e)}'))
\ No newline at end of file
+            raise CommandError(f'Error inesperado: {str(e)}') from e
+        finally:
+            self._close_smtp()
\ No newline at end of file
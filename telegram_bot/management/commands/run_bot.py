@@ -1,33 +1,30 @@
 from django.core.management.base import BaseCommand
-from django.conf import settings
-import os
 import signal
-import sys
 import threading
-import time
-from pathlib import Path
-import json
 import logging
 
 # ← Importar run_bot_sync desde handlers.py
 from telegram_bot.handlers import run_bot_sync
-# ← Importar update_status desde views.py
-from web_interface.views import update_status
+# ← Estado compartido con la web (escritura atómica + latido)
+from telegram_bot.bot_status import mark_started, mark_stopped
 from web_interface.utils import log_event
+from web_interface import metrics
+from web_interface.env_config import env_config
 
 logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
     help = 'Inicia el bot de Telegram y maneja sesiones'
+    # ← Sin system checks: cargan el URLconf y con él web_interface.views y todas sus dependencias
+    requires_system_checks = []
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.stop_event = None
-        self.status_file = Path(settings.BASE_DIR) / 'telegram_bot' / 'services_status.json'
 
     def handle(self, *args, **options):
         # ← Obtener el token del bot
-        token = os.getenv('TELEGRAM_BOT_TOKEN')
+        token = env_config.get('TELEGRAM_BOT_TOKEN')
         if not token:
             self.stderr.write(self.style.ERROR('Falta el token del bot en .env'))
             log_event('ERROR', "Falta el token del bot en .env", 'telegram_bot')
@@ -36,42 +33,22 @@ def handle(self, *args, **options):
         # ← Crear evento para detener el bot
         self.stop_event = threading.Event()
 
-        # ← Asegurar que el archivo de estado exista
-        if not self.status_file.exists():
-            try:
-                self.status_file.parent.mkdir(parents=True, exist_ok=True)
-                with open(self.status_file, 'w', encoding='utf-8') as f:
-                    json.dump({
-                        "telegram_running": False,
-                        "telegram_start_time": None,
-                        "telegram_auto_start": False
-                    }, f, ensure_ascii=False, indent=4)
-            except Exception as e:
-                self.stderr.write(self.style.ERROR(f'Error al crear services_status.json: {e}'))
-                log_event('ERROR', f'Error al crear services_status.json: {e}', 'telegram_bot')
-
-        # ← Leer estado actual para mantener auto_start
-        try:
-            with open(self.status_file, 'r', encoding='utf-8') as f:
-                status = json.load(f)
-        except Exception as e:
-            self.stderr.write(self.style.ERROR(f'Error al leer services_status.json: {e}'))
-            log_event('ERROR', f'Error al leer services_status.json: {e}', 'telegram_bot')
-            status = {"telegram_auto_start": False}
-
-        # ← Actualizar estado a "corriendo"
-        try:
-            current_time = time.time()
-            update_status(
-                telegram_running=True,
-                telegram_start_time=current_time,
-                telegram_auto_start=status.get("telegram_auto_start", False)
-            )
+        # ← Actualizar estado a "corriendo" (se conserva auto_start)
+        if mark_started():
             self.stdout.write(self.style.SUCCESS('Estado del bot actualizado a "corriendo"'))
             log_event('INFO', 'Bot de Telegram iniciado via run_bot.', 'telegram_bot')
-        except Exception as e:
-            self.stderr.write(self.style.WARNING(f'No se pudo actualizar el estado al iniciar: {e}'))
-            log_event('WARNING', f'No se pudo actualizar el estado al iniciar: {e}', 'telegram_bot')
+        else:
+            self.stderr.write(self.style.WARNING('No se pudo actualizar el estado al iniciar'))
+            log_event('WARNING', 'No se pudo actualizar el estado al iniciar.', 'telegram_bot')
+
+        # ← Métricas de este proceso en http://127.0.0.1:<METRICS_BOT_PORT>/metrics (0 = desactivado)
+        metrics_port = env_config.get_int('METRICS_BOT_PORT', 9109)
+        if metrics_port:
+            try:
+                metrics.serve(metrics_port)
+                self.stdout.write(f'Métricas del bot en http://127.0.0.1:{metrics_port}/metrics')
+            except OSError as e:
+                log_event('WARNING', f'No se pudo abrir el puerto de métricas {metrics_port}: {e}', 'telegram_bot')
 
         # ← Manejar señales de interrupción (Ctrl+C)
         def signal_handler(signum, frame):
@@ -90,14 +67,9 @@ def signal_handler(signum, frame):
             self.stderr.write(self.style.ERROR(f'Error al ejecutar run_bot: {e}'))
         finally:
             # ← Asegurar que el estado se actualice al salir
-            try:
-                update_status(
-                    telegram_running=False,
-                    telegram_start_time=None,
-                    telegram_auto_start=status.get("telegram_auto_start", False)
-                )
+            if mark_stopped():
                 self.stdout.write(self.style.SUCCESS('Estado del bot actualizado a "detenido"'))
                 log_event('INFO', 'Bot de Telegram detenido via run_bot.', 'telegram_bot')
-            except Exception as e:
-                self.stderr.write(self.style.WARNING(f'No se pudo actualizar el estado al detener: {e}'))
-                log_event('WARNING', f'No se pudo actualizar el estado al detener: {e}', 'telegram_bot')
\ No newline at end of file
+            else:
+                self.stderr.write(self.style.WARNING('No se pudo actualizar el estado al detener'))
+                log_event('WARNING', 'No se pudo actualizar el estado al detener.', 'telegram_bot')
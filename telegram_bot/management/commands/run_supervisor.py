@@ -0,0 +1,58 @@
+# telegram_bot/management/commands/run_supervisor.py
+from django.core.management.base import BaseCommand, CommandError
+from telegram_bot import supervisor as bot_supervisor
+from web_interface.utils import log_event
+from web_interface.env_config import env_config
+from web_interface.scheduler import scheduler
+import signal
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Supervisa el proceso del bot de Telegram y atiende las órdenes de la web por un socket local'
+    requires_system_checks = []  # ← como run_bot: arranque sin cargar el URLconf
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start',
+            action='store_true',
+            help='Lanza el bot al arrancar (lo usa el servicio systemd de inicio automático)'
+        )
+
+    def handle(self, *args, **options):
+        supervisor = bot_supervisor.Supervisor()
+        try:
+            server = bot_supervisor.serve(supervisor)
+        except OSError as e:
+            raise CommandError(f'No se pudo abrir el socket de control: {e}')
+
+        def signal_handler(signum, frame):
+            self.stdout.write(self.style.WARNING('Señal recibida. Deteniendo el supervisor y el bot...'))
+            supervisor.request_stop()
+
+        signal.signal(signal.SIGINT, signal_handler)
+        signal.signal(signal.SIGTERM, signal_handler)
+
+        address = bot_supervisor.CONTROL_SOCKET if bot_supervisor.USE_UNIX_SOCKET else f'127.0.0.1:{bot_supervisor.CONTROL_PORT}'
+        log_event('INFO', f'Supervisor del bot iniciado (control en {address}).', 'telegram_bot')
+        self.stdout.write(self.style.SUCCESS(f'Supervisor del bot escuchando en {address}'))
+
+        # ← Tareas programadas en el supervisor: no se paran al detener o reiniciar el bot
+        if env_config.get_bool('SCHEDULER_IN_SUPERVISOR', True):
+            scheduler.start()
+            self.stdout.write('Planificador de tareas iniciado')
+
+        if options['start']:
+            reply = supervisor.handle('start')
+            style = self.style.SUCCESS if reply['ok'] else self.style.ERROR
+            self.stdout.write(style(reply['message']))
+
+        try:
+            supervisor.watch()
+        finally:
+            bot_supervisor.close(server)
+            supervisor.shutdown()
+            scheduler.stop()
+            log_event('INFO', 'Supervisor del bot detenido.', 'telegram_bot')
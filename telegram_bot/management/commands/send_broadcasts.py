@@ -0,0 +1,44 @@
+# telegram_bot/management/commands/send_broadcasts.py
+from django.core.management.base import BaseCommand
+from telegram_bot.broadcast import run_broadcast, DEFAULT_CONCURRENCY
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Envía por el bot de Telegram las difusiones pendientes y muestra el rendimiento'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--campaign',
+            help='Prefijo de campaña a enviar (p. ej. "expiry:"). Por defecto, todas.'
+        )
+        parser.add_argument(
+            '--base-url',
+            help='URL base de la Bot API (p. ej. una API falsa local para pruebas)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=DEFAULT_CONCURRENCY,
+            help='Número de envíos simultáneos'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            stats = run_broadcast(
+                campaign_prefix=options['campaign'],
+                base_url=options['base_url'],
+                concurrency=options['concurrency'],
+            )
+        except Exception as e:
+            logger.exception("Error en send_broadcasts")
+            self.stdout.write(self.style.ERROR(f"Error: {str(e)}"))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Difusión completada: {stats['sent']}/{stats['total']} enviados, "
+            f"{stats['failed']} fallidos, {stats['deferred']} pendientes, "
+            f"{stats['flood_waits']} esperas por flood, {stats['rate']} msg/s en {stats['elapsed']}s"
+        ))
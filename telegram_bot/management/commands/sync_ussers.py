@@ -1,5 +1,5 @@
 # telegram_bot/management/commands/sync_ussers.py
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from ad_connector.ad_operations import fetch_ad_users
 from db_handler.db_handler import refresh_users
 import logging
@@ -10,6 +10,9 @@
 class Command(BaseCommand):
     help = 'Sincronización completa de usuarios desde AD'
 
+    # ← Registros sincronizados en la última ejecución (lo lee el planificador)
+    rows_processed = None
+
     def add_arguments(self, parser):
         parser.add_argument(
             '--debug',
@@ -20,7 +23,7 @@ def add_arguments(self, parser):
     def handle(self, *args, **options):
         # Configurar nivel de logging
         if options['debug']:
-            logging.basicConfig(level=logging.DEBUG)
+            logging.getLogger().setLevel(logging.DEBUG)
 
         self.stdout.write("== Iniciando sincronización ==")
 
@@ -35,6 +38,7 @@ def handle(self, *args, **options):
             if not ad_users:
                 self.stdout.write(self.style.WARNING("\nResultado de búsqueda: 0 usuarios encontrados"))
                 self._suggest_solutions()
+                self.rows_processed = 0
                 return
 
             # Paso 3: Mostrar detalles de usuarios encontrados
@@ -47,6 +51,7 @@ def handle(self, *args, **options):
             # Paso 4: Sincronizar con base de datos
             self.stdout.write("\nIniciando sincronización con la base de datos...")
             count = refresh_users(ad_users)
+            self.rows_processed = count
 
             # Paso 5: Resultado final
             self.stdout.write(
@@ -55,8 +60,7 @@ def handle(self, *args, **options):
 
         except Exception as e:
             logger.exception("Error crítico:")
-            self.stdout.write(self.style.ERROR(f"\nError: {str(e)}"))
-            self.stdout.write("Revise los logs para más detalles")
+            raise CommandError(f"{str(e)}. Revise los logs para más detalles") from e
 
     def _display_config(self):
         """Muestra la configuración cargada desde .env"""
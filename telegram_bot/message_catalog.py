@@ -0,0 +1,263 @@
+# telegram_bot/message_catalog.py
+"""
+Catálogo compartido de mensajes del bot (messages.json) y sus etiquetas (message_labels.json).
+
+Los ficheros se parsean una sola vez y solo se vuelven a leer cuando cambia su mtime,
+de modo que los cambios guardados desde la interfaz web llegan al bot sin reiniciarlo.
+Las plantillas `{name}`/`{email}` se validan y precompilan al cargar.
+"""
+import json
+import logging
+import os
+import string
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MESSAGES_FILE = Path(__file__).parent / "messages.json"
+LABELS_FILE = Path(__file__).parent / "message_labels.json"
+
+# ← Cada cuánto (segundos) se comprueba el mtime de los ficheros como máximo
+CHECK_INTERVAL = 1.0
+
+_formatter = string.Formatter()
+
+
+class MessageTemplate:
+    """
+    Plantilla precompilada. Solo admite marcadores simples (`{name}`), sin acceso a
+    atributos ni índices; los marcadores sin valor se dejan tal cual al renderizar.
+    """
+    __slots__ = ('text', 'parts', 'fields', 'error')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.parts = []
+        self.fields = set()
+        self.error = None
+        try:
+            for literal, field, spec, conversion in _formatter.parse(text):
+                if field is None:
+                    self.parts.append((literal, None, None, None, None))
+                    continue
+                if not field.isidentifier():
+                    raise ValueError(f"marcador no permitido: {{{field}}}")
+                if spec and '{' in spec:
+                    raise ValueError(f"formato anidado no permitido en {{{field}}}")
+                raw = '{' + field + (f'!{conversion}' if conversion else '') + (f':{spec}' if spec else '') + '}'
+                self.parts.append((literal, field, spec, conversion, raw))
+                self.fields.add(field)
+        except ValueError as e:
+            self.error = str(e)
+            self.parts = []
+            self.fields = set()
+
+    def render(self, **values) -> str:
+        if self.error:
+            return self.text
+        out = []
+        for literal, field, spec, conversion, raw in self.parts:
+            out.append(literal)
+            if field is None:
+                continue
+            if field not in values:
+                out.append(raw)
+                continue
+            value = values[field]
+            if conversion == 'r':
+                value = repr(value)
+            elif conversion == 'a':
+                value = ascii(value)
+            elif conversion == 's':
+                value = str(value)
+            try:
+                out.append(format(value, spec or ''))
+            except (ValueError, TypeError):
+                out.append(str(value))
+        return ''.join(out)
+
+
+class MessageCatalog:
+    """Caché de mensajes y etiquetas con recarga por mtime. Seguro entre hilos."""
+
+    def __init__(self, messages_file: Path = MESSAGES_FILE, labels_file: Path = LABELS_FILE,
+                 check_interval: float = CHECK_INTERVAL):
+        self.messages_file = Path(messages_file)
+        self.labels_file = Path(labels_file)
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._signature = None
+        self._checked_at = 0.0
+        self._messages = OrderedDict()
+        self._labels = {}
+        self._templates = {}
+        self._default_templates = {}
+        self._sections = []
+        self.errors = {}
+
+    # --- Carga ---
+
+    @staticmethod
+    def _file_signature(path: Path):
+        try:
+            st = path.stat()
+            return st.st_mtime_ns, st.st_size
+        except FileNotFoundError:
+            return None
+
+    def _current_signature(self):
+        return self._file_signature(self.messages_file), self._file_signature(self.labels_file)
+
+    @staticmethod
+    def _read_json(path: Path, default):
+        if not path.exists():
+            return default
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f, object_pairs_hook=OrderedDict)
+
+    def _load(self, signature):
+        try:
+            messages = self._read_json(self.messages_file, OrderedDict())
+            labels = self._read_json(self.labels_file, {})
+        except (OSError, json.JSONDecodeError) as e:
+            # ← Mantener la versión anterior si el fichero está a medio escribir o es inválido
+            logger.error(f"Error al leer el catálogo de mensajes: {e}")
+            return
+
+        templates = {}
+        errors = {}
+        for key, value in messages.items():
+            if key.startswith('_comment_') or not isinstance(value, str):
+                continue
+            template = MessageTemplate(value)
+            if template.error:
+                errors[key] = template.error
+            templates[key] = template
+
+        self._messages = messages
+        self._labels = labels
+        self._templates = templates
+        self._sections = self._build_sections(messages, labels)
+        self.errors = errors
+        self._signature = signature
+        if errors:
+            logger.warning(f"Plantillas de mensajes inválidas: {errors}")
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._signature is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            signature = self._current_signature()
+            if signature != self._signature:
+                self._load(signature)
+
+    def reload(self):
+        """Fuerza la relectura de los ficheros."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            self._load(self._current_signature())
+
+    # --- Consulta ---
+
+    def get(self, key: str, default=None):
+        """Texto crudo del mensaje (compatible con el antiguo dict `messages`)."""
+        self._ensure_fresh()
+        return self._messages.get(key, default)
+
+    def format(self, key: str, default: str = '', **values) -> str:
+        """Renderiza la plantilla precompilada `key` (o `default` si no existe)."""
+        self._ensure_fresh()
+        template = self._templates.get(key)
+        if template is None:
+            template = self._default_templates.get(default)
+            if template is None:
+                template = self._default_templates[default] = MessageTemplate(default)
+        return template.render(**values)
+
+    @property
+    def labels(self) -> dict:
+        self._ensure_fresh()
+        return self._labels
+
+    def sections(self) -> list:
+        """Mensajes agrupados por las secciones `_comment_*` para la página de configuración."""
+        self._ensure_fresh()
+        return self._sections
+
+    @staticmethod
+    def _build_sections(messages, labels) -> list:
+        sections = []
+        current = {"title": "Mensajes Generales", "fields": []}
+        for key, value in messages.items():
+            if key.startswith('_comment_'):
+                if current["fields"]:
+                    sections.append(current)
+                current = {"title": value, "fields": []}
+            else:
+                current["fields"].append({
+                    "key": key,
+                    "value": value,
+                    "label": labels.get(key, key)
+                })
+        if current["fields"] or not sections:
+            sections.append(current)
+        return sections
+
+    # --- Escritura ---
+
+    def validate(self, updated: dict) -> dict:
+        """Devuelve {clave: error} de las plantillas modificadas que no son válidas."""
+        self._ensure_fresh()
+        errors = {}
+        for key, value in updated.items():
+            if self._messages.get(key) == value:
+                continue
+            error = MessageTemplate(value).error
+            if error:
+                errors[key] = error
+        return errors
+
+    def save(self, updated: dict) -> dict:
+        """
+        Guarda los mensajes modificados preservando el orden original del fichero.
+        La escritura es atómica (fichero temporal + rename). Devuelve los errores de
+        validación; si hay alguno no se escribe nada.
+        """
+        errors = self.validate(updated)
+        if errors:
+            return errors
+
+        with self._lock:
+            ordered = OrderedDict()
+            for key, value in self._messages.items():
+                if key.startswith('_comment_'):
+                    ordered[key] = value
+                else:
+                    ordered[key] = updated.get(key, value)
+
+            fd, tmp_path = tempfile.mkstemp(dir=self.messages_file.parent, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(ordered, f, ensure_ascii=False, indent=4)
+                # ← Conservar los permisos del original (el bot puede correr con otro usuario)
+                if self.messages_file.exists():
+                    os.chmod(tmp_path, self.messages_file.stat().st_mode & 0o777)
+                else:
+                    os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, self.messages_file)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self.reload()
+        return {}
+
+
+# ← Instancia compartida por el bot y la interfaz web
+catalog = MessageCatalog()
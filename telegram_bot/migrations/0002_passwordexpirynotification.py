@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram_bot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PasswordExpiryNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.CharField(max_length=254)),
+                ('pwd_last_set', models.DateTimeField()),
+                ('threshold', models.PositiveIntegerField()),
+                ('days_remaining', models.IntegerField()),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'telegram_bot_expiry_notifications',
+                'unique_together': {('email', 'pwd_last_set', 'threshold')},
+            },
+        ),
+    ]
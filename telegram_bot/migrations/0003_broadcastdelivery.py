@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram_bot', '0002_passwordexpirynotification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BroadcastDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('campaign', models.CharField(max_length=255)),
+                ('chat_id', models.BigIntegerField()),
+                ('email', models.CharField(blank=True, max_length=254)),
+                ('text', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('sent', 'Enviado'), ('failed', 'Fallido')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'telegram_bot_broadcast_deliveries',
+                'indexes': [models.Index(fields=['status'], name='telegram_bo_status_b84a24_idx')],
+                'unique_together': {('campaign', 'chat_id')},
+            },
+        ),
+    ]
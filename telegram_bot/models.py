@@ -40,4 +40,56 @@ class TelegramUser(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.first_name} (@{self.username or self.telegram_id})"
\ No newline at end of file
+        return f"{self.first_name} (@{self.username or self.telegram_id})"
+
+class PasswordExpiryNotification(models.Model):
+    """
+    Registro de avisos de expiración enviados.
+    Cada usuario recibe como máximo un aviso por umbral y por valor de pwdLastSet;
+    al cambiar la contraseña cambia pwdLastSet y el ciclo de avisos se reinicia solo.
+    """
+    email = models.CharField(max_length=254)
+    pwd_last_set = models.DateTimeField()
+    threshold = models.PositiveIntegerField()
+    days_remaining = models.IntegerField()
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'telegram_bot_expiry_notifications'
+        unique_together = ('email', 'pwd_last_set', 'threshold')
+
+    def __str__(self):
+        return f"{self.email} - {self.threshold} días"
+
+
+class BroadcastDelivery(models.Model):
+    """
+    Estado de envío de un mensaje difundido por el bot a un chat.
+    Las reejecuciones solo reintentan las entregas que no están en estado 'sent'.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pendiente'),
+        (STATUS_SENT, 'Enviado'),
+        (STATUS_FAILED, 'Fallido'),
+    ]
+
+    campaign = models.CharField(max_length=255)
+    chat_id = models.BigIntegerField()
+    email = models.CharField(max_length=254, blank=True)
+    text = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'telegram_bot_broadcast_deliveries'
+        unique_together = ('campaign', 'chat_id')
+        indexes = [models.Index(fields=['status'])]
+
+    def __str__(self):
+        return f"{self.campaign} -> {self.chat_id} ({self.status})"
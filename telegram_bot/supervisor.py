@@ -0,0 +1,399 @@
+# telegram_bot/supervisor.py
+"""
+Supervisor del bot de Telegram (`manage.py run_supervisor`).
+
+El bot corre en su propio proceso (`manage.py run_bot`), hijo de este
+supervisor, y no en un hilo del servidor web: no compite por el GIL con las
+peticiones de administración, sobrevive a los reinicios de la web y, aunque
+haya varios workers, solo hay un bot.
+
+La web habla con el supervisor por un socket local (BOT_CONTROL_SOCKET; en
+sistemas sin sockets Unix, 127.0.0.1:BOT_CONTROL_PORT) con un protocolo de una
+línea JSON por petición y otra por respuesta:
+
+    → {"action": "start" | "stop" | "restart" | "status"}
+    ← {"ok": true, "message": "...", "state": {...}}
+
+`state` es la salud del bot: pid, tiempo en marcha, reinicios, último código de
+salida, edad del latido (bot_status) y las métricas sin etiquetas que expone el
+propio bot en METRICS_BOT_PORT.
+
+Si el proceso del bot muere sin que se haya pedido, se relanza con espera
+exponencial (BACKOFF_INITIAL → BACKOFF_MAX). Si sigue vivo pero deja de
+escribir el latido durante HEARTBEAT_TIMEOUT, se da por colgado y se reinicia.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+from web_interface.env_config import env_config
+
+from .bot_status import HEARTBEAT_TIMEOUT, mark_stopped, read_status
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+CONTROL_SOCKET = env_config.get('BOT_CONTROL_SOCKET') or str(Path(__file__).resolve().parent / 'bot_control.sock')
+CONTROL_PORT = env_config.get_int('BOT_CONTROL_PORT', 9110)  # ← solo si no hay sockets Unix
+USE_UNIX_SOCKET = hasattr(socket, 'AF_UNIX')
+
+ACTIONS = ('start', 'stop', 'restart', 'status')
+CLIENT_TIMEOUT = 5         # segundos para órdenes rápidas (status)
+STOP_TIMEOUT = 15          # segundos que se espera al bot tras SIGTERM antes de matarlo
+STARTUP_GRACE = 60         # segundos sin latido permitidos tras lanzar el bot
+BACKOFF_INITIAL = 1
+BACKOFF_MAX = 60
+STABLE_AFTER = 60          # un bot que duró esto reinicia la espera exponencial
+METRICS_CACHE_SECONDS = 5
+WATCH_INTERVAL = 1
+
+
+class SupervisorUnavailable(Exception):
+    """No hay ningún supervisor escuchando en el socket de control."""
+
+
+# --- Cliente (servidor web) ---
+
+def _encode(payload: dict) -> bytes:
+    return (json.dumps(payload, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def _decode(line: bytes) -> dict:
+    if not line:
+        raise SupervisorUnavailable("El supervisor del bot cerró la conexión sin responder")
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        raise SupervisorUnavailable(f"Respuesta no válida del supervisor ({e})") from e
+
+
+def _timeout_for(action: str) -> float:
+    # ← stop/restart esperan a que el bot cierre de forma ordenada
+    return CLIENT_TIMEOUT + (STOP_TIMEOUT if action in ('stop', 'restart') else 0)
+
+
+def send_command(action: str, timeout: float = None) -> dict:
+    """Envía una orden al supervisor y devuelve su respuesta."""
+    timeout = timeout or _timeout_for(action)
+    try:
+        if USE_UNIX_SOCKET:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(timeout)
+            sock.connect(CONTROL_SOCKET)
+        else:
+            sock = socket.create_connection(('127.0.0.1', CONTROL_PORT), timeout=timeout)
+    except OSError as e:
+        raise SupervisorUnavailable(f"El supervisor del bot no responde ({e})") from e
+    try:
+        with sock, sock.makefile('rwb') as stream:
+            stream.write(_encode({'action': action}))
+            stream.flush()
+            line = stream.readline()
+    except OSError as e:  # ← incluye socket.timeout
+        raise SupervisorUnavailable(f"El supervisor del bot no respondió a tiempo ({e})") from e
+    return _decode(line)
+
+
+async def asend_command(action: str, timeout: float = None) -> dict:
+    """Versión async de send_command para las vistas servidas por ASGI."""
+    timeout = timeout or _timeout_for(action)
+    try:
+        if USE_UNIX_SOCKET:
+            connect = asyncio.open_unix_connection(CONTROL_SOCKET)
+        else:
+            connect = asyncio.open_connection('127.0.0.1', CONTROL_PORT)
+        reader, writer = await asyncio.wait_for(connect, timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        raise SupervisorUnavailable(f"El supervisor del bot no responde ({str(e) or 'tiempo agotado'})") from e
+    try:
+        writer.write(_encode({'action': action}))
+        await writer.drain()
+        line = await asyncio.wait_for(reader.readline(), timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        raise SupervisorUnavailable(f"El supervisor del bot no respondió a tiempo ({str(e) or 'tiempo agotado'})") from e
+    finally:
+        writer.close()
+    return _decode(line)
+
+
+# --- Supervisor (proceso run_supervisor) ---
+
+def _scrape_metrics(port: int) -> dict:
+    """Muestras sin etiquetas del /metrics del bot → {nombre: valor}."""
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=1) as response:
+        text = response.read().decode('utf-8')
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#') or '{' in line:
+            continue
+        name, _, value = line.partition(' ')
+        try:
+            samples[name] = float(value)
+        except ValueError:
+            continue
+    return samples
+
+
+class Supervisor:
+    def __init__(self):
+        self.command = [sys.executable, str(BASE_DIR / 'manage.py'), 'run_bot']
+        self.wanted = False        # ← lo que pidió el administrador: bot en marcha o no
+        self.process = None
+        self.started_at = None
+        self.restarts = 0
+        self.last_exit_code = None
+        self.last_exit_at = None
+        self._backoff = BACKOFF_INITIAL
+        self._relaunch_at = None
+        self._metrics = {'at': 0, 'data': None}
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+
+    # --- Órdenes ---
+
+    def handle(self, action: str) -> dict:
+        if action not in ACTIONS:
+            return self._reply(False, f"Acción desconocida: {action}")
+        if action == 'status':
+            # ← sin el cerrojo: un stop/restart lo retiene mientras espera al bot (hasta STOP_TIMEOUT)
+            return self._do_status()
+        with self._lock:
+            return getattr(self, f'_do_{action}')()
+
+    def _reply(self, ok: bool, message: str) -> dict:
+        return {'ok': ok, 'message': message, 'state': self.state()}
+
+    def _do_start(self):
+        if self._alive():
+            return self._reply(False, 'El bot ya está en ejecución.')
+        if not env_config.get('TELEGRAM_BOT_TOKEN'):
+            return self._reply(False, 'Falta el token del bot en .env')
+        self.wanted = True
+        self._backoff = BACKOFF_INITIAL
+        self._spawn()
+        return self._reply(True, 'Bot de Telegram iniciado.')
+
+    def _do_stop(self):
+        if not self._alive():
+            pending = self.wanted  # ← caído y a la espera de relanzarse
+            self.wanted = False
+            self._relaunch_at = None
+            if pending:
+                return self._reply(True, 'Relanzamiento del bot cancelado.')
+            return self._reply(False, 'El bot ya está detenido.')
+        self.wanted = False
+        self._terminate()
+        return self._reply(True, 'Bot de Telegram detenido.')
+
+    def _do_restart(self):
+        if not env_config.get('TELEGRAM_BOT_TOKEN'):
+            return self._reply(False, 'Falta el token del bot en .env')
+        self._terminate()
+        self.wanted = True
+        self._backoff = BACKOFF_INITIAL
+        self._spawn()
+        return self._reply(True, 'Bot de Telegram reiniciado.')
+
+    def _do_status(self):
+        return self._reply(True, 'En ejecución.' if self._alive() else 'Detenido.')
+
+    # --- Proceso hijo ---
+
+    def _alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def _spawn(self):
+        if self.process is not None and self.process.poll() is not None:
+            self._record_exit(self.process)  # ← murió antes de que watch() lo viera
+        self.process = subprocess.Popen(self.command, cwd=BASE_DIR)
+        self.started_at = time.time()
+        self._relaunch_at = None
+        logger.info(f"Bot de Telegram lanzado (pid {self.process.pid})")
+
+    def _terminate(self, timeout=STOP_TIMEOUT):
+        """SIGTERM (run_bot cierra de forma ordenada) y, si no basta, SIGKILL."""
+        process = self.process
+        if process is None or process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"El bot (pid {process.pid}) no terminó en {timeout} s; se mata")
+            process.kill()
+            process.wait()
+        self._record_exit(process)
+
+    def _record_exit(self, process):
+        self.last_exit_code = process.returncode
+        self.last_exit_at = time.time()
+        self.process = None
+        self.started_at = None
+        # ← run_bot lo hace al salir, pero no si murió por SIGKILL o por un fallo del intérprete
+        if read_status().get('pid') == process.pid:
+            mark_stopped()
+
+    # --- Vigilancia ---
+
+    def watch(self):
+        """Bucle del supervisor: relanza el bot si muere o se cuelga hasta que se llama a shutdown()."""
+        while not self._stop.wait(WATCH_INTERVAL):
+            try:
+                with self._lock:
+                    self._check()
+            except Exception:
+                logger.exception("Error en la vigilancia del bot")
+
+    def _check(self):
+        from web_interface.utils import log_event
+
+        now = time.time()
+        if self.process is not None and self.process.poll() is not None:
+            ran_for = now - self.started_at
+            pid = self.process.pid
+            self._record_exit(self.process)
+            if self.wanted:
+                if ran_for >= STABLE_AFTER:
+                    self._backoff = BACKOFF_INITIAL
+                self._relaunch_at = now + self._backoff
+                log_event('WARNING', f'El bot de Telegram (pid {pid}) terminó con código {self.last_exit_code}; '
+                                     f'se relanza en {self._backoff} s.', 'telegram_bot')
+                self._backoff = min(self._backoff * 2, BACKOFF_MAX)
+
+        if self._alive() and now - self.started_at > STARTUP_GRACE:
+            age = self._heartbeat_age(now)
+            if age is None or age > HEARTBEAT_TIMEOUT:
+                log_event('ERROR', f'El bot de Telegram (pid {self.process.pid}) no escribe el latido '
+                                   f'desde hace {age or now - self.started_at:.0f} s; se reinicia.', 'telegram_bot')
+                self._terminate()
+                self._relaunch_at = now
+
+        if self.wanted and self.process is None and self._relaunch_at is not None and now >= self._relaunch_at:
+            self.restarts += 1
+            self._spawn()
+
+    def _heartbeat_age(self, now, process=None):
+        process = process or self.process
+        status = read_status()
+        if process is None or status.get('pid') != process.pid or not status.get('heartbeat'):
+            return None
+        return now - status['heartbeat']
+
+    # --- Salud ---
+
+    def _bot_metrics(self):
+        port = env_config.get_int('METRICS_BOT_PORT', 9109)
+        if not port or not self._alive():
+            return None
+        now = time.monotonic()
+        if now - self._metrics['at'] >= METRICS_CACHE_SECONDS:
+            try:
+                data = _scrape_metrics(port)
+            except (OSError, ValueError):
+                data = None
+            self._metrics.update(at=now, data=data)
+        return self._metrics['data']
+
+    def state(self) -> dict:
+        # ← se llama también sin el cerrojo (status): se trabaja sobre una copia de process/started_at
+        now = time.time()
+        process, started_at, relaunch_at = self.process, self.started_at, self._relaunch_at
+        alive = process is not None and started_at is not None and process.poll() is None
+        age = self._heartbeat_age(now, process) if alive else None
+        return {
+            'running': alive,
+            'wanted': self.wanted,
+            'pid': process.pid if alive else None,
+            'started_at': started_at if alive else None,
+            'uptime_seconds': round(now - started_at, 1) if alive else None,
+            'heartbeat_age_seconds': round(age, 1) if age is not None else None,
+            'healthy': alive and age is not None and age <= HEARTBEAT_TIMEOUT,
+            'restarts': self.restarts,
+            'last_exit_code': self.last_exit_code,
+            'last_exit_at': self.last_exit_at,
+            'relaunch_in_seconds': round(max(relaunch_at - now, 0), 1) if relaunch_at else None,
+            'supervisor_pid': os.getpid(),
+            'metrics': self._bot_metrics(),
+        }
+
+    def request_stop(self):
+        """Hace que watch() termine (seguro desde un manejador de señales)."""
+        self._stop.set()
+
+    def shutdown(self):
+        """Detiene el bot de forma ordenada al cerrar el supervisor."""
+        self._stop.set()
+        with self._lock:
+            self.wanted = False
+            self._terminate()
+
+
+# --- Socket de control ---
+
+class _ControlHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline(64 * 1024)
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+            reply = self.server.supervisor.handle(str(request.get('action')))
+        except (ValueError, AttributeError) as e:
+            reply = {'ok': False, 'message': f'Petición no válida: {e}', 'state': None}
+        except Exception as e:
+            logger.exception("Error al atender una orden del supervisor")
+            reply = {'ok': False, 'message': str(e), 'state': None}
+        try:
+            self.wfile.write(_encode(reply))
+        except OSError:
+            pass  # ← el cliente se cansó de esperar (stop/restart lentos) y cerró
+
+
+if USE_UNIX_SOCKET:
+    class _ControlServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+else:
+    class _ControlServer(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+
+def _socket_in_use() -> bool:
+    try:
+        send_command('status', timeout=1)
+        return True
+    except SupervisorUnavailable:
+        return False
+
+
+def serve(supervisor: Supervisor) -> _ControlServer:
+    """Abre el socket de control; falla si ya hay otro supervisor escuchando."""
+    if _socket_in_use():
+        raise OSError(f"Ya hay un supervisor escuchando en {CONTROL_SOCKET if USE_UNIX_SOCKET else CONTROL_PORT}")
+    if USE_UNIX_SOCKET:
+        if os.path.exists(CONTROL_SOCKET):
+            os.remove(CONTROL_SOCKET)  # ← socket huérfano de un supervisor anterior
+        server = _ControlServer(CONTROL_SOCKET, _ControlHandler)
+        os.chmod(CONTROL_SOCKET, 0o660)  # ← solo el usuario del servicio y su grupo (www-data)
+    else:
+        server = _ControlServer(('127.0.0.1', CONTROL_PORT), _ControlHandler)
+    server.supervisor = supervisor
+    threading.Thread(target=server.serve_forever, name='bot-control', daemon=True).start()
+    return server
+
+
+def close(server: _ControlServer):
+    server.shutdown()
+    server.server_close()
+    if USE_UNIX_SOCKET and os.path.exists(CONTROL_SOCKET):
+        os.remove(CONTROL_SOCKET)
+
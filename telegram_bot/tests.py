@@ -1,3 +1,171 @@
-from django.test import TestCase
+# telegram_bot/tests.py
+"""
+Pruebas de la difusión (telegram_bot.broadcast) contra una Bot API falsa local.
 
-# Create your tests here.
+FakeBotAPI es un servidor HTTP en 127.0.0.1 que responde a getMe y sendMessage
+como la API de Telegram, anota la hora de cada envío y puede contestar 429 con
+`retry_after` a los primeros envíos.
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from datetime import timedelta
+
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from telegram_bot.broadcast import (
+    Broadcaster, RateLimiter, build_bot, get_linked_chats, queue_broadcast, run_broadcast,
+)
+from telegram_bot.models import BroadcastDelivery, Session
+
+TOKEN = '123456:TEST'
+
+
+class FakeBotAPI:
+    """Bot API mínima: getMe, sendMessage y 429 para los `flood` primeros envíos."""
+
+    def __init__(self, flood=0, retry_after=1):
+        self.flood = flood
+        self.retry_after = retry_after
+        self.sent = []      # ← (monotonic, chat_id) de cada envío aceptado
+        self.rejected = 0
+        self._lock = threading.Lock()
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode('utf-8')
+                if 'json' in (self.headers.get('Content-Type') or ''):
+                    params = json.loads(body or '{}')
+                else:
+                    params = {key: values[0] for key, values in parse_qs(body).items()}
+                status, payload = api.respond(self.path.rsplit('/', 1)[-1], params)
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}/bot'
+
+    def respond(self, method, params):
+        if method == 'getMe':
+            return 200, {'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'TBot', 'username': 'tbot'}}
+        if method != 'sendMessage':
+            return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found'}
+        chat_id = int(params['chat_id'])
+        with self._lock:
+            if self.rejected < self.flood:
+                self.rejected += 1
+                return 429, {
+                    'ok': False, 'error_code': 429,
+                    'description': f'Too Many Requests: retry after {self.retry_after}',
+                    'parameters': {'retry_after': self.retry_after},
+                }
+            self.sent.append((time.monotonic(), chat_id))
+            message_id = len(self.sent)
+        return 200, {'ok': True, 'result': {
+            'message_id': message_id, 'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'}, 'text': params.get('text', ''),
+        }}
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _queue(campaign, chat_ids):
+    return queue_broadcast(campaign, [(chat_id, f'user{chat_id}@example.com', 'Hola') for chat_id in chat_ids])
+
+
+class BroadcastTests(TransactionTestCase):
+    def _send(self, api, limiter):
+        deliveries = list(BroadcastDelivery.objects.order_by('id'))
+
+        async def run():
+            async with build_bot(TOKEN, api.base_url) as bot:
+                return await Broadcaster(bot, limiter=limiter).run(deliveries)
+
+        return asyncio.run(run())
+
+    def test_global_bucket_paces_sends(self):
+        _queue('pacing', range(1, 16))
+        with FakeBotAPI() as api:
+            stats = self._send(api, RateLimiter(global_rate=10))
+
+        self.assertEqual(stats['sent'], 15)
+        times = sorted(t for t, _ in api.sent)
+        # ← ráfaga de 10 (capacidad) y el resto a 10 msg/s: al menos 0,5 s en total
+        self.assertGreaterEqual(times[-1] - times[0], 0.45)
+        # ← agotada la ráfaga, los envíos van espaciados ~0,1 s
+        self.assertGreaterEqual(times[14] - times[10], 0.3)
+
+    def test_per_chat_bucket_paces_same_chat(self):
+        queue_broadcast('chat-a', [(42, '', 'uno')])
+        queue_broadcast('chat-b', [(42, '', 'dos')])
+        queue_broadcast('chat-c', [(42, '', 'tres')])
+        with FakeBotAPI() as api:
+            stats = self._send(api, RateLimiter(global_rate=30, per_chat_rate=2))
+
+        self.assertEqual(stats['sent'], 3)
+        times = [t for t, _ in api.sent]
+        self.assertGreaterEqual(times[1] - times[0], 0.45)
+        self.assertGreaterEqual(times[2] - times[1], 0.45)
+
+    def test_retry_after_429_pauses_and_delivers(self):
+        _queue('flood', [1, 2, 3])
+        with FakeBotAPI(flood=1, retry_after=1) as api:
+            started = time.monotonic()
+            stats = run_broadcast(token=TOKEN, base_url=api.base_url, concurrency=1)
+            elapsed = time.monotonic() - started
+
+        self.assertEqual(stats['sent'], 3)
+        self.assertEqual(stats['flood_waits'], 1)
+        self.assertEqual(api.rejected, 1)
+        self.assertGreaterEqual(elapsed, 1.0)
+        self.assertEqual(sorted(chat for _, chat in api.sent), [1, 2, 3])
+        self.assertFalse(BroadcastDelivery.objects.exclude(status=BroadcastDelivery.STATUS_SENT).exists())
+
+    def test_rerun_does_not_resend(self):
+        _queue('dedup', [1, 2])
+        with FakeBotAPI() as api:
+            first = run_broadcast(token=TOKEN, base_url=api.base_url)
+            # ← volver a encolar la misma campaña no duplica entregas
+            _queue('dedup', [1, 2, 3])
+            second = run_broadcast(token=TOKEN, base_url=api.base_url)
+
+        self.assertEqual(first['sent'], 2)
+        self.assertEqual(second['sent'], 1)
+        self.assertEqual(BroadcastDelivery.objects.filter(campaign='dedup').count(), 3)
+        self.assertEqual(sorted(chat for _, chat in api.sent), [1, 2, 3])
+
+
+class LinkedChatsTests(TestCase):
+    def _session(self, chat_id, email, expired_days_ago):
+        Session.objects.create(session_id=str(chat_id), session_data='', email=email, last_updated=timezone.now())
+        # ← save() fija la caducidad a +30 min: se ajusta después
+        Session.objects.filter(session_id=str(chat_id)).update(
+            last_updated=timezone.now() - timedelta(days=expired_days_ago))
+
+    def test_recent_links_only(self):
+        self._session(1, 'activa@example.com', -1)
+        self._session(2, 'caducada@example.com', 10)
+        self._session(3, 'antigua@example.com', 400)
+        self._session('no-numerico', 'activa@example.com', -1)
+
+        emails = ['activa@example.com', 'caducada@example.com', 'antigua@example.com', 'otra@example.com']
+        self.assertEqual(get_linked_chats(emails), {'activa@example.com': [1], 'caducada@example.com': [2]})
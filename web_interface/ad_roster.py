@@ -0,0 +1,145 @@
+# web_interface/ad_roster.py
+"""
+Caché de los miembros del grupo AD de administradores (`ADRoster`).
+
+La página de usuarios solo necesita la lista para etiquetar cada usuario como
+"AD" o "Local" y para el modal de importación, así que no debe esperar al
+controlador de dominio en cada carga:
+
+- Se sirve siempre la última lista guardada en la DB.
+- Si tiene más de AD_ROSTER_TTL segundos se lanza un refresco en segundo plano
+  (stale-while-revalidate). Solo un proceso lo hace a la vez: lo reclama con un
+  UPDATE condicional sobre `refreshing_since`.
+- Solo se consulta AD en primer plano cuando no hay ninguna lista para el grupo
+  o cuando el administrador fuerza el refresco.
+- Un fallo de AD no borra la lista anterior; se guarda en `last_error`.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from ad_connector.ad_operations import get_ad_group_config, get_users_in_ad_group
+from .env_config import env_config
+from .models import ADRoster
+
+logger = logging.getLogger(__name__)
+
+REFRESH_TIMEOUT = 120  # ← un refresco reclamado hace más tiempo se da por abandonado
+
+
+class RosterError(Exception):
+    pass
+
+
+def roster_ttl() -> int:
+    """AD_ROSTER_TTL en segundos (se relee de .env sin reiniciar)."""
+    return env_config.get_int('AD_ROSTER_TTL', 300)
+
+
+def _claim(roster: ADRoster) -> bool:
+    """Marca el refresco como en curso; False si otro proceso ya lo tiene."""
+    now = timezone.now()
+    claimed = ADRoster.objects.filter(pk=roster.pk).filter(
+        Q(refreshing_since__isnull=True) | Q(refreshing_since__lt=now - timedelta(seconds=REFRESH_TIMEOUT))
+    ).update(refreshing_since=now)
+    return claimed == 1
+
+
+def _fetch(roster: ADRoster) -> ADRoster:
+    """Consulta AD y guarda el resultado (o el error) en la fila."""
+    started = time.perf_counter()
+    try:
+        raw_users = get_users_in_ad_group(roster.group_dn, raise_errors=True)
+    except Exception as e:
+        roster.last_error = str(e)[:500]
+        roster.refreshing_since = None
+        roster.save(update_fields=['last_error', 'refreshing_since'])
+        raise RosterError(roster.last_error) from e
+
+    roster.members = [
+        {
+            'username': user.get('username') or '',
+            'first_name': user.get('first_name') or '',
+            'last_name': user.get('last_name') or '',
+            'email': user.get('email') or '',
+        }
+        for user in raw_users if user.get('username')
+    ]
+    roster.refreshed_at = timezone.now()
+    roster.duration_ms = round((time.perf_counter() - started) * 1000, 2)
+    roster.last_error = ''
+    roster.refreshing_since = None
+    roster.save()
+    logger.info(f"Grupo AD {roster.group_dn}: {len(roster.members)} miembros ({roster.duration_ms:.0f} ms)")
+    return roster
+
+
+def _background_refresh(pk: int) -> None:
+    close_old_connections()
+    try:
+        _fetch(ADRoster.objects.get(pk=pk))
+    except Exception as e:
+        logger.warning(f"No se pudo refrescar el grupo AD en segundo plano: {e}")
+    finally:
+        close_old_connections()
+
+
+def refresh(group_dn: str = None) -> ADRoster:
+    """Refresco forzado en primer plano; lanza RosterError si AD falla."""
+    group_dn = group_dn or get_ad_group_config()
+    if not group_dn:
+        raise RosterError("AD_GROUP no está configurado en .env")
+    roster, _ = ADRoster.objects.get_or_create(group_dn=group_dn)
+    roster.refreshing_since = timezone.now()
+    roster.save(update_fields=['refreshing_since'])
+    return _fetch(roster)
+
+
+def refresh_async(group_dn: str = None) -> bool:
+    """Lanza un refresco en segundo plano si nadie lo está haciendo ya."""
+    group_dn = group_dn or get_ad_group_config()
+    if not group_dn:
+        return False
+    roster, _ = ADRoster.objects.get_or_create(group_dn=group_dn)
+    if not _claim(roster):
+        return False
+    threading.Thread(target=_background_refresh, args=(roster.pk,), name='ad-roster', daemon=True).start()
+    return True
+
+
+def get_roster(group_dn: str = None) -> dict:
+    """
+    Miembros del grupo y metadatos del último refresco:
+    {'group_dn', 'members', 'refreshed_at', 'stale', 'refreshing', 'error'}.
+    """
+    group_dn = group_dn or get_ad_group_config()
+    if not group_dn:
+        return {'group_dn': None, 'members': [], 'refreshed_at': None,
+                'stale': False, 'refreshing': False, 'error': "AD_GROUP no está configurado"}
+
+    roster, _ = ADRoster.objects.get_or_create(group_dn=group_dn)
+    ttl = timedelta(seconds=roster_ttl())
+    refreshing = False
+    if roster.refreshed_at is None:
+        # ← Sin ninguna lista previa: no hay nada que servir, se espera a AD
+        try:
+            roster = refresh(group_dn)
+        except RosterError:
+            roster.refresh_from_db()
+    elif timezone.now() - roster.refreshed_at > ttl:
+        refreshing = refresh_async(group_dn) or roster.refreshing_since is not None
+
+    return {
+        'group_dn': group_dn,
+        'members': roster.members,
+        'refreshed_at': roster.refreshed_at,
+        'stale': roster.refreshed_at is None
+                 or timezone.now() - roster.refreshed_at > ttl,
+        'refreshing': refreshing,
+        'error': roster.last_error or None,
+    }
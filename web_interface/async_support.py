@@ -0,0 +1,74 @@
+# web_interface/async_support.py
+"""
+Apoyo para las vistas async (servidas por tbot_project/asgi.py).
+
+- http_client(): un httpx.AsyncClient compartido por todo el proceso, con pool
+  de conexiones y timeouts estrictos. Se crea por bucle de eventos: bajo ASGI
+  hay uno solo; si la vista corre bajo WSGI (cada petición async usa un bucle
+  nuevo) se recrea en lugar de reutilizar un cliente ligado a un bucle cerrado.
+- run_blocking(): ejecuta trabajo bloqueante (ldap3, sockets) en un pool de
+  hilos acotado a BLOCKING_WORKERS. Si ya hay BLOCKING_MAX_PENDING tareas en
+  curso o en cola lanza Busy en vez de acumular peticiones: unas pocas pruebas
+  de AD lentas no pueden dejar sin hilos al resto de la administración.
+"""
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from .env_config import env_config
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT = httpx.Timeout(5.0, connect=3.0)  # ← segundos: total por fase / conexión
+HTTP_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30)
+
+BLOCKING_WORKERS = env_config.get_int('WEB_BLOCKING_WORKERS', 4)
+BLOCKING_MAX_PENDING = BLOCKING_WORKERS * 2
+
+
+class Busy(Exception):
+    """No hay hueco en el pool de trabajo bloqueante."""
+
+
+_client = None
+_client_loop = None
+_client_lock = threading.Lock()
+
+
+def http_client() -> httpx.AsyncClient:
+    """Cliente HTTP compartido del bucle de eventos actual."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        if _client is None or _client_loop is not loop or _client.is_closed:
+            _client = httpx.AsyncClient(timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS)
+            _client_loop = loop
+        return _client
+
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix='web-blocking')
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def _release(_future):
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Ejecuta `func(*args, **kwargs)` en el pool acotado y devuelve su resultado."""
+    global _pending
+    with _pending_lock:
+        if _pending >= BLOCKING_MAX_PENDING:
+            raise Busy(f"Hay {_pending} operaciones en curso; inténtelo de nuevo en unos segundos")
+        _pending += 1
+    future = _executor.submit(functools.partial(func, *args, **kwargs))
+    # ← El hueco se libera cuando termina el hilo, aunque el cliente haya cancelado la petición
+    future.add_done_callback(_release)
+    return await asyncio.wrap_future(future)
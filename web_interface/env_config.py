@@ -0,0 +1,163 @@
+# web_interface/env_config.py
+"""
+Configuración de `.env` compartida por la web, el bot y los comandos.
+
+- El fichero se lee una vez y se sirve desde memoria. Como mucho una vez por
+  CHECK_INTERVAL se compara su mtime/tamaño; si cambió (la web guardó, o se
+  editó a mano) se vuelve a leer. Así el bot, que es otro proceso, ve los
+  cambios de la web en un segundo sin reiniciar.
+- Las claves presentes en `.env` mandan sobre las variables de entorno (la web
+  las edita ahí); el resto se toma de `os.environ`. Al recargar, los valores
+  nuevos se copian también a `os.environ` para el código que aún usa os.getenv.
+- `set()` escribe con set_key, sube CONFIG_VERSION (el número que ven ambos
+  procesos) y recarga en el acto.
+- `cached(name, builder)` guarda objetos derivados (p. ej. el Tls de AD) hasta
+  la próxima recarga.
+"""
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from dotenv import dotenv_values, set_key
+
+logger = logging.getLogger(__name__)
+
+ENV_PATH = Path(__file__).resolve().parent.parent / '.env'
+CHECK_INTERVAL = 1.0  # segundos entre comprobaciones del fichero
+VERSION_KEY = 'CONFIG_VERSION'
+
+TRUE_VALUES = ('true', '1', 'yes', 'on')
+
+
+class EnvConfig:
+    def __init__(self, path=ENV_PATH):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._values = {}
+        self._file_key = None
+        self._checked_at = 0.0
+        self._generation = 0
+        self._derived = {}
+        self._listeners = []
+        self._reload()
+
+    # --- Carga ---
+
+    def _stat_key(self):
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _reload(self):
+        key = self._stat_key()
+        values = {k: v for k, v in dotenv_values(self.path).items() if v is not None} if key else {}
+        changed = sorted(k for k in set(values) | set(self._values) if values.get(k) != self._values.get(k))
+        for name in changed:
+            if name in values:
+                os.environ[name] = values[name]
+        self._values = values
+        self._file_key = key
+        self._generation += 1
+        self._derived.clear()
+        return changed
+
+    def refresh(self, force=False):
+        """Recarga si el fichero cambió (o siempre con force). Devuelve las claves modificadas."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < CHECK_INTERVAL:
+            return []
+        with self._lock:
+            self._checked_at = now
+            if not force and self._stat_key() == self._file_key:
+                return []
+            changed = self._reload()
+        if changed:
+            logger.info(f"Configuración recargada (versión {self.version}): {', '.join(changed)}")
+            for listener in list(self._listeners):
+                try:
+                    listener(changed)
+                except Exception:
+                    logger.exception("Error en un suscriptor de cambios de configuración")
+        return changed
+
+    # --- Lectura ---
+
+    @property
+    def version(self) -> int:
+        self.refresh()
+        try:
+            return int(self._values.get(VERSION_KEY, 0))
+        except ValueError:
+            return 0
+
+    def get(self, key, default=None):
+        self.refresh()
+        value = self._values.get(key)
+        if value is None:
+            value = os.environ.get(key)
+        return default if value is None else value
+
+    def require(self, key) -> str:
+        value = self.get(key)
+        if value in (None, ''):
+            raise ValueError(f"{key} no está configurado en .env")
+        return value
+
+    def get_int(self, key, default=0) -> int:
+        value = self.get(key)
+        try:
+            return int(value) if value not in (None, '') else default
+        except ValueError:
+            logger.warning(f"{key}={value!r} no es un entero; se usa {default}")
+            return default
+
+    def get_bool(self, key, default=False) -> bool:
+        value = self.get(key)
+        if value in (None, ''):
+            return default
+        return value.strip().strip("'\"").lower() in TRUE_VALUES
+
+    def get_list(self, key, default='', sep=',') -> list:
+        return [item.strip() for item in (self.get(key) or default).split(sep) if item.strip()]
+
+    def snapshot(self) -> dict:
+        """Copia de los valores de `.env` (lo que antes devolvía dotenv_values)."""
+        self.refresh()
+        return dict(self._values)
+
+    def cached(self, name, builder):
+        """Objeto derivado de la configuración, reconstruido solo tras una recarga."""
+        self.refresh()
+        generation = self._generation
+        entry = self._derived.get(name)
+        if entry is None or entry[0] != generation:
+            entry = (generation, builder())
+            self._derived[name] = entry
+        return entry[1]
+
+    # --- Escritura ---
+
+    def set(self, **values) -> int:
+        """Guarda los valores en `.env`, sube CONFIG_VERSION y recarga. Devuelve la versión nueva."""
+        with self._lock:
+            self.refresh(force=True)
+            self.path.touch(exist_ok=True)
+            for key, value in values.items():
+                set_key(str(self.path), key, '' if value is None else str(value))
+            new_version = self.version + 1
+            set_key(str(self.path), VERSION_KEY, str(new_version))
+            self.refresh(force=True)
+        return new_version
+
+    def on_change(self, listener):
+        """Registra `listener(claves_cambiadas)`, llamado tras cada recarga con cambios."""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+        return listener
+
+
+env_config = EnvConfig()
@@ -0,0 +1,211 @@
+# web_interface/live_events.py
+"""
+Flujo de eventos en vivo (Server-Sent Events) para el panel web.
+
+Un único hilo productor por proceso web:
+- lee los LogEntry nuevos (id > último visto) una vez por segundo,
+- detecta cambios de estado del bot,
+- reenvía cada muestra nueva del muestreador de métricas (metrics_sampler),
+y deja los eventos en un buffer circular en memoria. Cada pestaña abierta es
+un suscriptor async con su propia asyncio.Queue, que el productor alimenta con
+loop.call_soon_threadsafe: la vista (`astream`) espera con `await` en el bucle
+de eventos y no ocupa un hilo del servidor mientras no hay nada que enviar.
+N pestañas cuestan un solo productor en lugar de N clientes sondeando. El
+productor se detiene solo cuando no hay suscriptores.
+
+El buffer circular permite reanudar tras una reconexión (Last-Event-ID). Si la
+cola de un suscriptor se llena (cliente lento), su flujo termina y el navegador
+reconecta y recupera lo pendiente desde el buffer.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from telegram_bot.bot_status import get_status
+
+from .metrics_sampler import sampler
+from .models import LogEntry
+
+logger = logging.getLogger(__name__)
+
+RING_SIZE = 1000
+TICK = 1.0               # segundos entre lecturas de logs y estado
+HEARTBEAT = 15.0         # comentario SSE para mantener viva la conexión
+IDLE_SHUTDOWN = 30.0     # segundos sin suscriptores antes de parar el productor
+STREAM_MAX_AGE = 300.0   # el navegador reconecta (con Last-Event-ID) tras este tiempo
+LOG_BATCH = 200
+SUBSCRIBER_QUEUE = 500   # eventos pendientes por pestaña antes de forzar la reconexión
+
+TOPICS = ('logs', 'status', 'stats')
+
+
+def bot_status() -> dict:
+    status = get_status()
+    return {
+        'running': status['telegram_running'],
+        'start_time': status['telegram_start_time'],
+        'auto_start': status['telegram_auto_start'],
+    }
+
+
+class _Subscriber:
+    """Pestaña conectada: su bucle de eventos, su cola y sus filtros."""
+
+    def __init__(self, loop, topics, source):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE)
+        self.topics = topics
+        self.source = source
+        self.overflowed = False
+
+    def wants(self, event) -> bool:
+        _, topic, data = event
+        if topic not in self.topics:
+            return False
+        return topic != 'logs' or not self.source or data.get('source') == self.source
+
+    def offer(self, event):
+        # ← Se ejecuta en el bucle del suscriptor (call_soon_threadsafe)
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class EventHub:
+    def __init__(self):
+        self._events = deque(maxlen=RING_SIZE)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._subscribers = set()
+        self._thread = None
+        self._last_log_id = None
+        self.latest = {}  # ← último evento de 'status' y 'stats' para los recién conectados
+
+    # --- Productor ---
+
+    def _publish(self, topic, data):
+        with self._lock:
+            self._seq += 1
+            event = (self._seq, topic, data)
+            self._events.append(event)
+            if topic in ('status', 'stats'):
+                self.latest[topic] = event
+            subscribers = [sub for sub in self._subscribers if sub.wants(event)]
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub.offer, event)
+            except RuntimeError:
+                # ← Bucle cerrado: la conexión ya terminó sin pasar por el finally
+                with self._lock:
+                    self._subscribers.discard(sub)
+
+    def _poll_logs(self):
+        if self._last_log_id is None:
+            self._last_log_id = LogEntry.objects.order_by('-id').values_list('id', flat=True).first() or 0
+            return
+        entries = list(
+            LogEntry.objects.filter(id__gt=self._last_log_id)
+            .order_by('id')
+            .values('id', 'timestamp', 'level', 'message', 'source')[:LOG_BATCH]
+        )
+        for entry in entries:
+            self._last_log_id = entry['id']
+            entry['timestamp'] = timezone.localtime(entry['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
+            self._publish('logs', entry)
+
+    def _poll_status(self):
+        status = bot_status()
+        previous = self.latest.get('status')
+        if previous is None or previous[2] != status:
+            self._publish('status', status)
+
+    def _poll_stats(self):
+        sample = sampler.latest()
+        previous = self.latest.get('stats')
+        if sample is not None and (previous is None or previous[2] is not sample):
+            self._publish('stats', sample)
+
+    def _run(self):
+        idle_since = None
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    idle_since = idle_since or time.monotonic()
+                    if time.monotonic() - idle_since > IDLE_SHUTDOWN:
+                        self._thread = None
+                        self._last_log_id = None
+                        return
+                else:
+                    idle_since = None
+
+            close_old_connections()
+            for step in (self._poll_logs, self._poll_status, self._poll_stats):
+                try:
+                    step()
+                except Exception as e:
+                    logger.warning(f"live_events: error en {step.__name__}: {e}")
+            time.sleep(TICK)
+
+    def _ensure_producer(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='live-events', daemon=True)
+                self._thread.start()
+
+    # --- Suscriptores ---
+
+    def _pending(self, after, topics, source):
+        events = [e for e in self._events if e[0] > after and e[1] in topics]
+        if source:
+            events = [e for e in events if e[1] != 'logs' or e[2].get('source') == source]
+        return events
+
+    async def astream(self, topics=TOPICS, source=None, last_event_id=None):
+        """Generador async de texto SSE para StreamingHttpResponse (servido por ASGI)."""
+        topics = set(topics)
+        sub = _Subscriber(asyncio.get_running_loop(), topics, source)
+        with self._lock:
+            # ← Alta y lectura del buffer bajo el mismo bloqueo: no se pierde ni duplica ningún evento
+            if last_event_id is not None and self._events and last_event_id >= self._events[0][0] - 1:
+                initial = self._pending(last_event_id, topics, source)
+            else:
+                # ← Conexión nueva: solo el último estado/estadística conocidos
+                initial = [self.latest[t] for t in ('status', 'stats') if t in topics and t in self.latest]
+            self._subscribers.add(sub)
+        self._ensure_producer()
+        try:
+            yield "retry: 3000\n\n"
+            for event in initial:
+                yield self._format(event)
+
+            deadline = time.monotonic() + STREAM_MAX_AGE
+            while not sub.overflowed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), min(HEARTBEAT, remaining))
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield self._format(event)
+        finally:
+            with self._lock:
+                self._subscribers.discard(sub)
+
+    @staticmethod
+    def _format(event):
+        seq, topic, data = event
+        return f"id: {seq}\nevent: {topic}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+hub = EventHub()
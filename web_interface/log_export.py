@@ -0,0 +1,119 @@
+# web_interface/log_export.py
+"""
+Exportación en streaming de logs filtrados (CSV o JSONL, opcionalmente gzip).
+
+Las filas se leen por tramos sobre (timestamp, id) con el índice compuesto, en
+lugar de un único `.iterator()`: con mysqlclient el cursor normal trae el
+resultado completo a memoria, mientras que por tramos el consumo es constante
+sea cual sea el número de filas.
+
+La vista se sirve por ASGI, así que el flujo es un generador async: cada tramo
+se consulta con sync_to_async y en memoria solo hay un tramo a la vez (con un
+generador síncrono Django lo reuniría entero con `list()` antes de enviar el
+primer byte).
+"""
+import csv
+import json
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from django.utils import timezone
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson; charset=utf-8', 'jsonl'),
+}
+EXPORT_FIELDS = ('id', 'timestamp', 'level', 'source', 'message')
+
+
+def _ordered(queryset):
+    return queryset.order_by('timestamp', 'id').values(*EXPORT_FIELDS)
+
+
+def fetch_chunk(queryset, last=None, chunk_size: int = EXPORT_CHUNK_SIZE) -> list:
+    """Siguiente tramo de `chunk_size` filas tras `last` = (timestamp, id), en orden cronológico."""
+    chunk = _ordered(queryset)
+    if last is not None:
+        chunk = chunk.filter(Q(timestamp__gt=last[0]) | Q(timestamp=last[0], id__gt=last[1]))
+    return list(chunk[:chunk_size])
+
+
+def _last_key(rows):
+    return (rows[-1]['timestamp'], rows[-1]['id'])
+
+
+async def aiter_chunks(queryset, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """Recorre el queryset por tramos (listas de filas); cada consulta se hace fuera del bucle de eventos."""
+    last = None
+    while True:
+        rows = await sync_to_async(fetch_chunk)(queryset, last, chunk_size)
+        if not rows:
+            return
+        yield rows
+        last = _last_key(rows)
+
+
+class _Echo:
+    """Pseudo-fichero para csv.writer: devuelve la línea en lugar de escribirla."""
+
+    def write(self, value):
+        return value
+
+
+class ExportEncoder:
+    """Convierte tramos de filas en bloques de bytes (CSV o JSONL, con gzip al vuelo si se pide)."""
+
+    def __init__(self, fmt: str = 'csv', compress: bool = False):
+        self.fmt = fmt
+        self._writer = csv.writer(_Echo())
+        # ← wbits=31: cabecera gzip
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def _bytes(self, text: str) -> bytes:
+        data = text.encode('utf-8')
+        return self._compressor.compress(data) if self._compressor else data
+
+    def header(self) -> bytes:
+        if self.fmt != 'csv':
+            return b''
+        return self._bytes('﻿' + self._writer.writerow(EXPORT_FIELDS))  # ← BOM para que Excel detecte UTF-8
+
+    def encode(self, rows) -> bytes:
+        if self.fmt == 'csv':
+            lines = [
+                self._writer.writerow([
+                    row['id'],
+                    timezone.localtime(row['timestamp']).strftime('%Y-%m-%d %H:%M:%S'),
+                    row['level'],
+                    row['source'],
+                    row['message'],
+                ])
+                for row in rows
+            ]
+        else:
+            lines = [
+                json.dumps({**row, 'timestamp': timezone.localtime(row['timestamp']).isoformat()},
+                           ensure_ascii=False) + '\n'
+                for row in rows
+            ]
+        return self._bytes(''.join(lines))
+
+    def finish(self) -> bytes:
+        return self._compressor.flush() if self._compressor else b''
+
+
+async def aexport_stream(queryset, fmt: str = 'csv', compress: bool = False):
+    """Generador async de bytes del fichero exportado, para StreamingHttpResponse bajo ASGI."""
+    encoder = ExportEncoder(fmt, compress)
+    header = encoder.header()
+    if header:
+        yield header
+    async for rows in aiter_chunks(queryset):
+        block = encoder.encode(rows)
+        if block:
+            yield block
+    tail = encoder.finish()
+    if tail:
+        yield tail
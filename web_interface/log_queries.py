@@ -0,0 +1,157 @@
+# web_interface/log_queries.py
+"""
+Consultas sobre `LogEntry` compartidas por la página de logs.
+
+- `filter_logs` aplica los filtros de la petición (nivel, origen, texto, fechas);
+  el texto se busca en el índice de palabras (ver log_search).
+- `keyset_page` pagina por cursor sobre (timestamp, id) usando el índice compuesto,
+  sin OFFSET: el coste de una página no depende de lo profunda que sea.
+- `estimate_count` evita el COUNT(*) completo: estimación de la tabla si no hay
+  filtros, o un conteo limitado y cacheado si los hay.
+"""
+import base64
+import hashlib
+import math
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+
+from .log_retention import day_range
+from .log_search import apply_search
+from .models import LogEntry
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+COUNT_LIMIT = 10000       # ← a partir de aquí el total se muestra como "más de N"
+COUNT_CACHE_TTL = 30      # segundos
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def get_page_size(value) -> int:
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def filter_logs(params, queryset=None):
+    """Aplica los filtros de `params` (request.GET) a `queryset`."""
+    logs = LogEntry.objects.all() if queryset is None else queryset
+
+    level = params.get('level')
+    source = params.get('source')
+    search = params.get('search')
+    from_date = params.get('from_date')
+    to_date = params.get('to_date')
+
+    if level:
+        logs = logs.filter(level=level)
+    if source:
+        logs = logs.filter(source__icontains=source)
+    if search:
+        logs = apply_search(logs, search)
+    # ← Rangos sobre la columna (usan índice y poda de particiones)
+    start, end = day_range(from_date, to_date)
+    if start:
+        logs = logs.filter(timestamp__gte=start)
+    if end:
+        logs = logs.filter(timestamp__lt=end)
+    return logs
+
+
+def has_filters(params) -> bool:
+    return any(params.get(key) for key in ('level', 'source', 'search', 'from_date', 'to_date'))
+
+
+# --- Cursores ---
+
+def encode_cursor(log) -> str:
+    raw = f"{log.timestamp.isoformat()}|{log.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(pk)
+    except Exception:
+        raise InvalidCursor(f"Cursor inválido: {cursor}")
+
+
+def keyset_page(queryset, page_size: int, cursor: str = None, direction: str = 'next'):
+    """
+    Devuelve (logs, has_next, has_previous) ordenados del más reciente al más antiguo.
+    `direction='next'` da la página posterior al cursor (más antigua) y
+    `direction='prev'` la anterior (más reciente).
+    """
+    if not cursor:
+        rows = list(queryset.order_by('-timestamp', '-id')[:page_size + 1])
+        return rows[:page_size], len(rows) > page_size, False
+
+    timestamp, pk = decode_cursor(cursor)
+    if direction == 'prev':
+        rows = list(
+            queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk))
+            .order_by('timestamp', 'id')[:page_size + 1]
+        )
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size]
+        rows.reverse()
+        return rows, True, has_previous
+
+    rows = list(
+        queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+        .order_by('-timestamp', '-id')[:page_size + 1]
+    )
+    return rows[:page_size], len(rows) > page_size, True
+
+
+# --- Conteos ---
+
+def _table_estimate():
+    """Filas aproximadas de la tabla según las estadísticas de MySQL (sin recorrerla)."""
+    if connection.vendor != 'mysql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            [LogEntry._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+def estimate_count(queryset, params) -> tuple:
+    """
+    Devuelve (total, exacto). Sin filtros usa la estimación de la tabla; con filtros
+    cuenta como máximo COUNT_LIMIT filas y cachea el resultado unos segundos.
+    """
+    if not has_filters(params):
+        estimate = _table_estimate()
+        if estimate is not None:
+            return estimate, False
+
+    key_source = '|'.join(f"{k}={params.get(k, '')}" for k in
+                          ('level', 'source', 'search', 'from_date', 'to_date'))
+    key = 'logs_count:' + hashlib.md5(key_source.encode()).hexdigest()
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    # ← SELECT COUNT(*) FROM (SELECT ... LIMIT n): coste acotado
+    count = queryset.order_by()[:COUNT_LIMIT + 1].count()
+    result = (min(count, COUNT_LIMIT), count <= COUNT_LIMIT)
+    cache.set(key, result, COUNT_CACHE_TTL)
+    return result
+
+
+def num_pages(total: int, page_size: int) -> int:
+    return max(1, math.ceil(total / page_size))
@@ -0,0 +1,238 @@
+# web_interface/log_retention.py
+"""
+Particionado mensual de `LogEntry` y archivado de meses antiguos.
+
+- En MySQL la tabla está particionada por RANGE(TO_DAYS(timestamp)) con una
+  partición por mes (pYYYYMM) más `pmax`. `ensure_partitions` crea por adelantado
+  las de los próximos meses y `archive_logs` elimina con DROP PARTITION los meses
+  ya archivados.
+- En otros motores (o si la tabla no está particionada) se borra por rangos.
+
+Los meses se calculan en UTC, que es como se guardan las fechas (USE_TZ=True).
+Cada mes archivado se escribe en logs/archive/logentry-YYYY-MM.jsonl.gz.
+"""
+import gzip
+import json
+import logging
+import os
+import tempfile
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .env_config import env_config
+from .models import LogEntry, LogToken
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = Path(__file__).resolve().parent.parent / "logs" / "archive"
+
+PARTITION_MONTHS_AHEAD = 3
+DELETE_BATCH_SIZE = 5000
+
+
+# --- Fechas ---
+
+def retention_days() -> int:
+    """Días de logs que se conservan en la base de datos (LOG_RETENTION_DAYS; se archivan meses completos)."""
+    return env_config.get_int('LOG_RETENTION_DAYS', 180)
+
+
+def month_start(value: date) -> date:
+    return value.replace(day=1)
+
+
+def add_months(value: date, months: int) -> date:
+    month = value.month - 1 + months
+    return date(value.year + month // 12, month % 12 + 1, 1)
+
+
+def month_bounds(month: date):
+    """Límites [inicio, fin) del mes en UTC como datetimes aware."""
+    start = datetime.combine(month_start(month), time.min, tzinfo=dt_timezone.utc)
+    end = datetime.combine(add_months(month, 1), time.min, tzinfo=dt_timezone.utc)
+    return start, end
+
+
+def day_range(from_date=None, to_date=None):
+    """
+    Convierte fechas 'YYYY-MM-DD' (zona horaria local) en límites [desde, hasta)
+    para filtrar por `timestamp__gte` / `timestamp__lt` sin envolver la columna en
+    una función, de modo que se usen el índice y la poda de particiones.
+    """
+    tz = timezone.get_current_timezone()
+    start = end = None
+    if from_date:
+        day = date.fromisoformat(str(from_date))
+        start = timezone.make_aware(datetime.combine(day, time.min), tz)
+    if to_date:
+        day = date.fromisoformat(str(to_date)) + timedelta(days=1)
+        end = timezone.make_aware(datetime.combine(day, time.min), tz)
+    return start, end
+
+
+def partition_name(month: date) -> str:
+    return f"p{month.year:04d}{month.month:02d}"
+
+
+# --- Particiones (MySQL) ---
+
+def is_partitioned() -> bool:
+    if connection.vendor != 'mysql':
+        return False
+    return bool(get_partitions())
+
+
+def get_partitions() -> list:
+    """Nombres de las particiones de la tabla de logs (vacío si no está particionada)."""
+    if connection.vendor != 'mysql':
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION",
+            [LogEntry._meta.db_table]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def ensure_partitions(months_ahead: int = PARTITION_MONTHS_AHEAD) -> list:
+    """Crea las particiones mensuales que falten hasta `months_ahead` meses vista."""
+    existing = set(get_partitions())
+    if not existing or 'pmax' not in existing:
+        return []
+
+    current = month_start(timezone.now().date())
+    missing = [
+        add_months(current, i) for i in range(months_ahead + 1)
+        if partition_name(add_months(current, i)) not in existing
+    ]
+    # ← Solo se pueden añadir meses posteriores al último existente (se divide pmax)
+    last = max((p for p in existing if p != 'pmax'), default=None)
+    missing = [m for m in missing if last is None or partition_name(m) > last]
+    if not missing:
+        return []
+
+    table = connection.ops.quote_name(LogEntry._meta.db_table)
+    parts = ', '.join(
+        f"PARTITION {partition_name(m)} VALUES LESS THAN (TO_DAYS('{add_months(m, 1).isoformat()}'))"
+        for m in missing
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO "
+            f"({parts}, PARTITION pmax VALUES LESS THAN MAXVALUE)"
+        )
+    created = [partition_name(m) for m in missing]
+    logger.info(f"Particiones de logs creadas: {', '.join(created)}")
+    return created
+
+
+# --- Archivado ---
+
+def _archive_path(month: date) -> Path:
+    path = ARCHIVE_DIR / f"logentry-{month.year:04d}-{month.month:02d}.jsonl.gz"
+    if not path.exists():
+        return path
+    # ← Un archivo previo del mismo mes no se sobrescribe
+    suffix = timezone.now().strftime('%Y%m%d%H%M%S')
+    return ARCHIVE_DIR / f"logentry-{month.year:04d}-{month.month:02d}-{suffix}.jsonl.gz"
+
+
+def export_month(month: date) -> tuple:
+    """Vuelca el mes a un JSONL comprimido. Devuelve (ruta, filas) o (None, 0) si está vacío."""
+    start, end = month_bounds(month)
+    rows = (
+        LogEntry.objects.filter(timestamp__gte=start, timestamp__lt=end)
+        .order_by('timestamp', 'id')
+        .values('id', 'timestamp', 'level', 'source', 'message')
+    )
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=ARCHIVE_DIR, suffix='.tmp')
+    count = 0
+    try:
+        with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as gz:
+            for row in rows.iterator(chunk_size=2000):
+                row['timestamp'] = row['timestamp'].isoformat()
+                gz.write(json.dumps(row, ensure_ascii=False).encode('utf-8') + b'\n')
+                count += 1
+        if not count:
+            os.remove(tmp_path)
+            return None, 0
+        path = _archive_path(month)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+        return path, count
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def purge_month(month: date) -> None:
+    """Elimina de la base de datos los logs del mes (DROP PARTITION si es posible)."""
+    start, end = month_bounds(month)
+    tokens = LogToken.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    while True:
+        ids = list(tokens.values_list('id', flat=True)[:DELETE_BATCH_SIZE])
+        if not ids:
+            break
+        LogToken.objects.filter(id__in=ids).delete()
+
+    name = partition_name(month)
+    if name in get_partitions():
+        table = connection.ops.quote_name(LogEntry._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {table} DROP PARTITION {name}")
+        return
+
+    queryset = LogEntry.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    while True:
+        ids = list(queryset.values_list('id', flat=True)[:DELETE_BATCH_SIZE])
+        if not ids:
+            break
+        with transaction.atomic():
+            LogEntry.objects.filter(id__in=ids).delete()
+
+
+def get_archivable_months(days: int = None) -> list:
+    """Meses completos anteriores al límite de retención que aún tienen logs."""
+    cutoff = timezone.now() - timedelta(days=days or retention_days())
+    # ← Solo meses que terminan antes del límite
+    limit = month_start(cutoff.astimezone(dt_timezone.utc).date())
+    oldest = LogEntry.objects.order_by('timestamp').values_list('timestamp', flat=True).first()
+    if oldest is None:
+        return []
+
+    months = []
+    month = month_start(oldest.astimezone(dt_timezone.utc).date())
+    while month < limit:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def archive_logs(days: int = None, dry_run: bool = False) -> list:
+    """
+    Archiva y elimina los meses anteriores a la retención. Devuelve una lista de
+    dicts {month, rows, path}. Un mes solo se borra si su volcado se escribió bien.
+    """
+    results = []
+    for month in get_archivable_months(days):
+        if dry_run:
+            start, end = month_bounds(month)
+            rows = LogEntry.objects.filter(timestamp__gte=start, timestamp__lt=end).count()
+            results.append({'month': month, 'rows': rows, 'path': None})
+            continue
+        path, rows = export_month(month)
+        purge_month(month)
+        results.append({'month': month, 'rows': rows, 'path': path})
+        logger.info(f"Logs de {month:%Y-%m} archivados ({rows} filas) en {path}")
+
+    if not dry_run:
+        ensure_partitions()
+    return results
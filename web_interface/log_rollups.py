@@ -0,0 +1,182 @@
+# web_interface/log_rollups.py
+"""
+Resúmenes por hora de los logs (`LogRollup`), mantenidos de forma incremental
+por el log sink: cada lote suma sus eventos a la fila de (hora, nivel, origen,
+tipo de evento). Se cuentan todos los eventos de `log_event`, antes de que la
+política de logs decida su destino, así que los que se muestrean, se limitan o
+van solo a fichero también aparecen en los gráficos. Los gráficos del panel y los
+filtros de la página de logs leen de aquí en lugar de recorrer `LogEntry`.
+
+Los resúmenes no se borran al archivar logs antiguos, así que cubren también los
+meses que ya solo están en logs/archive/.
+"""
+import re
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import LogEntry, LogRollup
+
+FACETS_CACHE_TTL = 60  # segundos
+
+# ← Tipos de evento reconocidos a partir del mensaje (el primero que coincide gana)
+EVENT_TYPES = [
+    ('password_changed', re.compile(r'^Contraseña cambiada')),
+    ('password_change_failed', re.compile(r'^Fallo al cambiar la contraseña')),
+    ('login', re.compile(r'inició sesión')),
+    ('login_failed', re.compile(r'login fallido|fallido de login', re.IGNORECASE)),
+    ('ad_auth_ok', re.compile(r'^Éxito al autenticar')),
+    ('ad_auth_failed', re.compile(r'^Fallo al autenticar')),
+    ('unauthorized', re.compile(r'acceso no autorizado', re.IGNORECASE)),
+    ('session_closed', re.compile(r'^Sesión (previa )?eliminada')),
+    ('email_sent', re.compile(r'^Correo .*enviado')),
+    ('email_failed', re.compile(r'^Fallo al enviar correo')),
+    ('bot_started', re.compile(r'^Bot de Telegram iniciado')),
+    ('bot_stopped', re.compile(r'^Bot de Telegram detenido')),
+    ('config_changed', re.compile(r'^(Configuración .*actualizada|Política de logs actualizada)')),
+]
+
+EVENT_TYPE_LABELS = {
+    'password_changed': 'Contraseñas cambiadas',
+    'password_change_failed': 'Cambios de contraseña fallidos',
+    'login': 'Inicios de sesión (web)',
+    'login_failed': 'Logins fallidos (web)',
+    'ad_auth_ok': 'Autenticaciones AD',
+    'ad_auth_failed': 'Autenticaciones AD fallidas',
+    'unauthorized': 'Accesos no autorizados',
+    'session_closed': 'Sesiones cerradas (bot)',
+    'email_sent': 'Correos enviados',
+    'email_failed': 'Correos fallidos',
+    'bot_started': 'Arranques del bot',
+    'bot_stopped': 'Paradas del bot',
+    'config_changed': 'Cambios de configuración',
+    'error': 'Errores',
+    'other': 'Otros',
+}
+
+ERROR_LEVELS = ('ERROR', 'CRITICAL', 'EXCEPTION')
+
+
+def classify(level: str, message: str) -> str:
+    for event_type, pattern in EVENT_TYPES:
+        if pattern.search(message or ''):
+            return event_type
+    return 'error' if level in ERROR_LEVELS else 'other'
+
+
+def hour_bucket(timestamp):
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def aggregate(entries) -> Counter:
+    """Cuenta `entries` (objetos o dicts con timestamp, level, source, message) por clave de resumen."""
+    counts = Counter()
+    for entry in entries:
+        if isinstance(entry, dict):
+            timestamp, level, source, message = entry['timestamp'], entry['level'], entry['source'], entry['message']
+        else:
+            timestamp, level, source, message = entry.timestamp, entry.level, entry.source, entry.message
+        counts[(hour_bucket(timestamp), level, source or '', classify(level, message))] += 1
+    return counts
+
+
+def apply_counts(counts: Counter) -> None:
+    """Suma los conteos a las filas existentes o las crea (dentro de la transacción del llamador)."""
+    for (hour, level, source, event_type), count in counts.items():
+        lookup = {'hour': hour, 'level': level, 'source': source, 'event_type': event_type}
+        if LogRollup.objects.filter(**lookup).update(count=F('count') + count):
+            continue
+        try:
+            with transaction.atomic():
+                LogRollup.objects.create(count=count, **lookup)
+        except IntegrityError:
+            # ← Otro proceso creó la fila entre medias
+            LogRollup.objects.filter(**lookup).update(count=F('count') + count)
+
+
+def rebuild(since=None, batch_size: int = 5000) -> int:
+    """
+    Recalcula los resúmenes a partir de los logs que siguen en la base de datos
+    (desde `since` o desde el log más antiguo). Devuelve el número de logs procesados.
+    Solo ve los eventos guardados: los que la política dejó fuera de la base de
+    datos desaparecen de los resúmenes recalculados.
+    """
+    entries = LogEntry.objects.all()
+    if since is None:
+        since = entries.order_by('timestamp').values_list('timestamp', flat=True).first()
+        if since is None:
+            return 0
+    since = hour_bucket(since)
+    entries = entries.filter(timestamp__gte=since)
+
+    processed = 0
+    with transaction.atomic():
+        LogRollup.objects.filter(hour__gte=since).delete()
+        counts = Counter()
+        rows = entries.values('timestamp', 'level', 'source', 'message')
+        for row in rows.iterator(chunk_size=batch_size):
+            counts.update(aggregate([row]))
+            processed += 1
+        apply_counts(counts)
+    cache.delete('log_facets')
+    return processed
+
+
+# --- Consultas ---
+
+def get_facets() -> dict:
+    """Orígenes y niveles presentes en los logs (para los filtros de la página de logs)."""
+    facets = cache.get('log_facets')
+    if facets is None:
+        facets = {
+            'sources': sorted(s for s in LogRollup.objects.values_list('source', flat=True).distinct() if s),
+            'levels': sorted(LogRollup.objects.values_list('level', flat=True).distinct()),
+        }
+        cache.set('log_facets', facets, FACETS_CACHE_TTL)
+    return facets
+
+
+def activity(days: int = 7) -> dict:
+    """
+    Serie diaria (zona horaria local) de los últimos `days` días por tipo de evento,
+    totales de hoy por tipo y errores por origen en el periodo.
+    """
+    now = timezone.localtime()
+    first_day = (now - timedelta(days=days - 1)).date()
+    start = timezone.make_aware(datetime.combine(first_day, time.min))
+
+    rows = (
+        LogRollup.objects.filter(hour__gte=start)
+        .values('hour', 'event_type', 'source', 'level')
+        .annotate(total=Sum('count'))
+    )
+
+    labels = [(first_day + timedelta(days=i)).isoformat() for i in range(days)]
+    index = {label: i for i, label in enumerate(labels)}
+    series = {}
+    today = {}
+    errors_by_source = Counter()
+    today_label = now.date().isoformat()
+
+    for row in rows:
+        day = timezone.localtime(row['hour']).date().isoformat()
+        if day not in index:
+            continue
+        event_type = row['event_type']
+        series.setdefault(event_type, [0] * days)[index[day]] += row['total']
+        if day == today_label:
+            today[event_type] = today.get(event_type, 0) + row['total']
+        if row['level'] in ERROR_LEVELS:
+            errors_by_source[row['source'] or '-'] += row['total']
+
+    return {
+        'labels': labels,
+        'series': series,
+        'today': today,
+        'errors_by_source': dict(errors_by_source.most_common()),
+        'event_labels': EVENT_TYPE_LABELS,
+    }
@@ -0,0 +1,180 @@
+# web_interface/log_search.py
+"""
+Búsqueda de texto en los logs mediante un índice invertido (`LogToken`).
+
+El log sink indexa cada entrada al guardarla. Sintaxis de `search`:
+
+- `conexion ldap`   → entradas que contienen palabras que empiezan por
+                      "conexion" y por "ldap" (cada término es un prefijo)
+- `"sesion iniciada"` → frase exacta
+- `"ldap"`          → palabra exacta (sin prefijo)
+
+La búsqueda no distingue mayúsculas ni acentos (en las frases depende de la
+intercalación de la base de datos; en MySQL tampoco). No se usa FULLTEXT de MySQL
+porque la tabla de logs está particionada y MySQL no lo admite en ese caso.
+"""
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import LogEntry, LogToken
+
+MIN_TOKEN_LENGTH = 2
+MAX_TOKEN_LENGTH = 64
+MAX_TOKENS_PER_ENTRY = 128
+MAX_QUERY_TERMS = 8
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+_QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def normalize(text: str) -> str:
+    """Minúsculas y sin acentos ('Sesión' → 'sesion')."""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> list:
+    """Palabras normalizadas del texto, en orden y sin las demasiado cortas."""
+    return [
+        word[:MAX_TOKEN_LENGTH] for word in _WORD_RE.findall(normalize(text or ''))
+        if len(word) >= MIN_TOKEN_LENGTH
+    ]
+
+
+def parse_query(search: str) -> list:
+    """
+    Devuelve una lista de términos (tipo, valor):
+    ('prefix', 'conex'), ('word', 'ldap') o ('phrase', ['sesion', 'iniciada']).
+    """
+    terms = []
+    for phrase, bare in _QUERY_RE.findall(search or ''):
+        if phrase:
+            tokens = tokenize(phrase)
+            if len(tokens) > 1:
+                terms.append(('phrase', tokens))
+            elif tokens:
+                terms.append(('word', tokens[0]))
+        else:
+            terms.extend(('prefix', token) for token in tokenize(bare.rstrip('*')))
+    return terms[:MAX_QUERY_TERMS]
+
+
+def build_tokens(entries) -> list:
+    """Filas de `LogToken` para entradas ya guardadas (con pk)."""
+    rows = []
+    for entry in entries:
+        if entry.pk is None:
+            continue
+        unique = list(dict.fromkeys(tokenize(entry.message)))[:MAX_TOKENS_PER_ENTRY]
+        rows.extend(
+            LogToken(token=token, entry_id=entry.pk, timestamp=entry.timestamp)
+            for token in unique
+        )
+    return rows
+
+
+def assign_bulk_pks(entries) -> None:
+    """
+    MySQL no devuelve los ids en `bulk_create`. LAST_INSERT_ID() da el primer id
+    del INSERT, pero con innodb_autoinc_lock_mode=2 (el de MySQL 8) las filas de
+    un INSERT de varias filas no tienen por qué recibir ids consecutivos si otros
+    procesos (bot, web, planificador) insertan a la vez. Por eso se vuelven a
+    leer las filas del lote: id >= ese primer id y mismos (timestamp, level,
+    source, message). Debe llamarse justo después del `bulk_create`, en la misma
+    conexión y transacción.
+    """
+    if not entries or entries[0].pk is not None or connection.vendor != 'mysql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT LAST_INSERT_ID()")
+        first = cursor.fetchone()[0]
+    match_inserted_pks(entries, first)
+
+
+def _entry_key(timestamp, level, source, message):
+    return (timestamp, level, source or '', message)
+
+
+def match_inserted_pks(entries, first_id) -> None:
+    """Asigna a cada entrada el id de su fila (a igualdad de contenido, por orden de id)."""
+    pending = {}
+    for entry in entries:
+        key = _entry_key(entry.timestamp, entry.level, entry.source, entry.message)
+        pending.setdefault(key, []).append(entry)
+    timestamps = [entry.timestamp for entry in entries]
+    rows = (
+        LogEntry.objects
+        .filter(id__gte=first_id, timestamp__gte=min(timestamps), timestamp__lte=max(timestamps))
+        .order_by('id')
+        .values_list('id', 'timestamp', 'level', 'source', 'message')
+    )
+    for pk, *fields in rows.iterator(chunk_size=len(entries)):
+        same = pending.get(_entry_key(*fields))
+        if same:
+            same.pop(0).pk = pk
+    # ← Las entradas sin fila encontrada quedan con pk None y build_tokens las omite
+
+
+def index_entries(entries) -> int:
+    """Indexa las palabras de las entradas. Devuelve el número de tokens creados."""
+    rows = build_tokens(entries)
+    LogToken.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def _term_entry_ids(kind, value):
+    if kind == 'prefix':
+        tokens = LogToken.objects.filter(token__startswith=value)
+    else:
+        tokens = LogToken.objects.filter(token=value)
+    return tokens.values('entry_id')
+
+
+def apply_search(queryset, search: str):
+    """Filtra `queryset` con el índice de palabras según la sintaxis de `search`."""
+    terms = parse_query(search)
+    if not terms:
+        # ← Solo símbolos o términos de una letra: se mantiene la búsqueda literal
+        return queryset.filter(message__icontains=search) if search and search.strip() else queryset
+
+    for kind, value in terms:
+        if kind == 'phrase':
+            for token in dict.fromkeys(value):
+                queryset = queryset.filter(id__in=_term_entry_ids('word', token))
+        else:
+            queryset = queryset.filter(id__in=_term_entry_ids(kind, value))
+
+    # ← Las frases se comprueban sobre el conjunto ya reducido por el índice
+    for phrase, _ in _QUERY_RE.findall(search):
+        if phrase and len(tokenize(phrase)) > 1:
+            queryset = queryset.filter(_phrase_q(phrase))
+    return queryset
+
+
+def _phrase_q(phrase: str) -> Q:
+    """El mensaje contiene la frase (LIKE; en MySQL la intercalación ignora acentos)."""
+    return Q(message__icontains=' '.join(phrase.split()))
+
+
+def reindex(batch_size: int = 2000, since=None) -> int:
+    """Reconstruye el índice de palabras (todas las entradas o desde `since`)."""
+    entries = LogEntry.objects.order_by('id')
+    tokens = LogToken.objects.all()
+    if since is not None:
+        entries = entries.filter(timestamp__gte=since)
+        tokens = tokens.filter(timestamp__gte=since)
+    tokens.delete()
+
+    indexed = 0
+    batch = []
+    for entry in entries.only('id', 'timestamp', 'message').iterator(chunk_size=batch_size):
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            indexed += index_entries(batch)
+            batch = []
+    if batch:
+        indexed += index_entries(batch)
+    return indexed
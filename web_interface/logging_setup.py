@@ -0,0 +1,234 @@
+# web_interface/logging_setup.py
+"""
+Configuración única del logging del proyecto (web, bot y comandos).
+
+Los loggers solo encolan el registro (`QueueHandler`, sin E/S); un hilo
+`QueueListener` por proceso lo escribe en logs/app.log y en consola. El fichero
+rota por tamaño y a medianoche, y los ficheros rotados se comprimen con gzip.
+
+Se activa desde `LOGGING` en settings.py (handler 'queue'). Variables de entorno:
+- LOG_LEVEL: nivel del logger raíz (INFO).
+- LOG_FORMAT: 'text' o 'json' (una línea JSON por registro).
+- LOG_FILE_MAX_MB / LOG_FILE_BACKUPS: tamaño máximo y ficheros rotados a conservar.
+- LOG_CONSOLE: '0' para no escribir en consola.
+- LOG_QUEUE_MAX: registros en cola antes de descartar (nunca se bloquea al llamador).
+
+Este módulo no importa Django: se carga mientras Django configura el logging.
+"""
+import atexit
+import glob
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime, time as dtime, timedelta
+from pathlib import Path
+
+LOG_DIR = Path(__file__).resolve().parent.parent / "logs"
+LOG_FILE = LOG_DIR / "app.log"
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+LOG_FILE_MAX_BYTES = int(os.getenv('LOG_FILE_MAX_MB', 20)) * 1024 * 1024
+LOG_FILE_BACKUPS = int(os.getenv('LOG_FILE_BACKUPS', 14))
+LOG_CONSOLE = os.getenv('LOG_CONSOLE', '1') != '0'
+LOG_QUEUE_MAX = int(os.getenv('LOG_QUEUE_MAX', 10000))
+
+TEXT_FORMAT = '%(asctime)s | %(levelname)-8s | %(source)s | %(name)s | %(message)s'
+
+
+# --- Formato ---
+
+class SourceDefaultFilter(logging.Filter):
+    """Añade `source` ('-') a los registros que no vienen de `log_event`."""
+
+    def filter(self, record):
+        if not hasattr(record, 'source'):
+            record.source = '-'
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro, para enviar a un agregador de logs."""
+
+    def format(self, record):
+        data = {
+            'timestamp': datetime.fromtimestamp(record.created).astimezone().isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'source': getattr(record, 'source', None),
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+def build_formatter() -> logging.Formatter:
+    return JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT)
+
+
+# --- Rotación ---
+
+class CompressedRotatingFileHandler(logging.handlers.BaseRotatingHandler):
+    """
+    Rota cuando el fichero supera `max_bytes` o al pasar la medianoche. El fichero
+    rotado (app.log.AAAAMMDD-HHMMSS) se comprime a .gz y se conservan los últimos
+    `backup_count`. Si otro proceso ya rotó el fichero, solo se reabre.
+    """
+
+    def __init__(self, filename, max_bytes=LOG_FILE_MAX_BYTES, backup_count=LOG_FILE_BACKUPS, encoding='utf-8'):
+        super().__init__(filename, 'a', encoding=encoding, delay=False)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.rollover_at = self._next_midnight()
+
+    @staticmethod
+    def _next_midnight() -> float:
+        tomorrow = datetime.now().date() + timedelta(days=1)
+        return datetime.combine(tomorrow, dtime.min).timestamp()
+
+    def shouldRollover(self, record):
+        if time.time() >= self.rollover_at:
+            return True
+        if self.max_bytes > 0:
+            if self.stream is None:
+                self.stream = self._open()
+            if self.stream.tell() + len(self.format(record)) + 1 >= self.max_bytes:
+                return True
+        return False
+
+    def _rotated_elsewhere(self) -> bool:
+        try:
+            return os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except (OSError, ValueError, AttributeError):
+            return True
+
+    def doRollover(self):
+        rotated_elsewhere = self.stream is not None and self._rotated_elsewhere()
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self.rollover_at = self._next_midnight()
+
+        if not rotated_elsewhere and os.path.exists(self.baseFilename):
+            stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+            target = f"{self.baseFilename}.{stamp}"
+            n = 1
+            while os.path.exists(target) or os.path.exists(target + '.gz'):
+                target = f"{self.baseFilename}.{stamp}-{n}"
+                n += 1
+            os.rename(self.baseFilename, target)
+            self._compress(target)
+            self._purge()
+
+        self.stream = self._open()
+
+    @staticmethod
+    def _compress(path: str) -> None:
+        try:
+            with open(path, 'rb') as src, gzip.open(path + '.gz', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(path)
+        except OSError as e:
+            sys.stderr.write(f"No se pudo comprimir {path}: {e}\n")
+
+    def _purge(self) -> None:
+        if self.backup_count <= 0:
+            return
+        rotated = sorted(glob.glob(f"{glob.escape(self.baseFilename)}.*.gz"), key=os.path.getmtime)
+        for path in rotated[:-self.backup_count]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# --- Cola ---
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Encola sin esperar nunca: si la cola está llena el registro se descarta y se cuenta."""
+
+    def enqueue(self, record):
+        ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _state['dropped'] += 1
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # ← Bloqueante: el hilo sigue vaciando la cola, así que el centinela siempre entra
+        self.queue.put(self._sentinel)
+
+
+_lock = threading.Lock()
+_state = {'pid': None, 'listener': None, 'dropped': 0}
+_handler = None
+
+
+def _build_handlers() -> list:
+    os.makedirs(LOG_DIR, exist_ok=True)
+    formatter = build_formatter()
+    handlers = [CompressedRotatingFileHandler(LOG_FILE)]
+    if LOG_CONSOLE:
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        handler.addFilter(SourceDefaultFilter())
+    return handlers
+
+
+def ensure_listener() -> None:
+    """Arranca el hilo escritor en este proceso (también tras un fork)."""
+    if _state['pid'] == os.getpid():
+        return
+    with _lock:
+        if _state['pid'] == os.getpid():
+            return
+        # ← Tras un fork la cola heredada puede tener registros del padre: se usa una nueva
+        _handler.queue = queue.Queue(LOG_QUEUE_MAX)
+        listener = _Listener(_handler.queue, *_build_handlers(), respect_handler_level=True)
+        listener.start()
+        _state.update(pid=os.getpid(), listener=listener)
+
+
+def stop_listener() -> None:
+    """Vacía la cola y cierra los ficheros (se llama al salir del proceso)."""
+    listener = _state['listener']
+    if listener is None or _state['pid'] != os.getpid():
+        return
+    try:
+        listener.stop()
+    except Exception:
+        pass
+    for handler in listener.handlers:
+        handler.close()
+    _state.update(pid=None, listener=None)
+
+
+def queue_handler() -> logging.Handler:
+    """Factoría para `LOGGING['handlers']`: el mismo handler aunque se configure varias veces."""
+    global _handler
+    with _lock:
+        if _handler is None:
+            _handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_MAX))
+            atexit.register(stop_listener)
+    ensure_listener()
+    return _handler
+
+
+def logging_stats() -> dict:
+    return {
+        'queued': _handler.queue.qsize() if _handler is not None else 0,
+        'dropped': _state['dropped'],
+    }
@@ -0,0 +1,65 @@
+# web_interface/management/commands/archive_logs.py
+from django.core.management.base import BaseCommand, CommandError
+from web_interface.log_retention import archive_logs, ensure_partitions
+from web_interface.utils import log_event
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Archiva en logs/archive/ los meses de logs anteriores a la retención y los elimina de la base de datos'
+
+    # ← Logs archivados en la última ejecución (lo lee el planificador)
+    rows_processed = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            help='Días de logs que se conservan en la base de datos (por defecto LOG_RETENTION_DAYS)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Muestra qué meses se archivarían sin modificar nada'
+        )
+        parser.add_argument(
+            '--partitions-only',
+            action='store_true',
+            help='Solo crea las particiones mensuales de los próximos meses'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            if options['partitions_only']:
+                created = ensure_partitions()
+                self.stdout.write(self.style.SUCCESS(
+                    f"Particiones creadas: {', '.join(created) if created else 'ninguna'}"
+                ))
+                return
+
+            results = archive_logs(options['retention_days'], dry_run=options['dry_run'])
+        except Exception as e:
+            logger.exception("Error en archive_logs")
+            raise CommandError(str(e)) from e
+
+        if not results:
+            self.rows_processed = 0
+            self.stdout.write("No hay meses de logs que archivar.")
+            return
+
+        total = 0
+        for result in results:
+            total += result['rows']
+            destination = result['path'] or '(simulación)'
+            self.stdout.write(f"  {result['month']:%Y-%m}: {result['rows']} filas → {destination}")
+
+        if options['dry_run']:
+            self.rows_processed = 0
+            self.stdout.write(self.style.WARNING(f"Simulación: se archivarían {total} logs"))
+            return
+
+        self.rows_processed = total
+        log_event('INFO', f"Archivados {total} logs de {len(results)} mes(es)", 'log_retention')
+        self.stdout.write(self.style.SUCCESS(f"Archivados {total} logs de {len(results)} mes(es)"))
@@ -0,0 +1,169 @@
+# web_interface/management/commands/import_audit.py
+"""
+Auditoría del tiempo de importación al arrancar un comando (por defecto run_bot).
+
+Lanza un intérprete nuevo con `-X importtime` que hace lo mismo que manage.py
+antes de llamar a handle(): django.setup(), cargar el comando y, si lo pide,
+los system checks. Del informe de importtime se muestran los paquetes que más
+tardan, los imports directos más caros y la cadena que arrastra cada módulo que
+el proceso no debería cargar (HEAVY_MODULES).
+"""
+import json
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# ← Módulos de la web que un proceso sin vistas no debería importar
+HEAVY_MODULES = ('web_interface.views', 'web_interface.urls', 'psutil', 'requests')
+DEFAULT_BUDGET_MS = 1000
+
+_BOOTSTRAP = """
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+from django.core.management import get_commands, load_command_class
+name = sys.argv[1]
+command = load_command_class(get_commands()[name], name)
+loaded = time.perf_counter()
+checks = bool(command.requires_system_checks)
+if checks:
+    command.check()
+finished = time.perf_counter()
+print(json.dumps({
+    'setup_ms': (setup_done - started) * 1000,
+    'load_ms': (loaded - setup_done) * 1000,
+    'checks_ms': (finished - loaded) * 1000,
+    'total_ms': (finished - started) * 1000,
+    'checks': checks,
+}))
+"""
+
+
+def parse_importtime(stderr: str) -> list:
+    """Líneas de `-X importtime` → [{'name', 'depth', 'self_us', 'cumulative_us'}] en su orden."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, raw_name = line[len('import time:'):].split('|', 2)
+        name = raw_name.rstrip()
+        entries.append({
+            'name': name.strip(),
+            'depth': (len(name) - len(name.lstrip()) - 1) // 2,
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us),
+        })
+    return entries
+
+
+def import_chain(entries: list, module: str) -> list:
+    """Cadena de imports (de fuera hacia dentro) que cargó `module` por primera vez."""
+    index = next((i for i, entry in enumerate(entries) if entry['name'] == module), None)
+    if index is None:
+        return []
+    # ← importtime escribe cada módulo al terminar: su padre es la siguiente línea con menor profundidad
+    chain = [entries[index]['name']]
+    depth = entries[index]['depth']
+    for entry in entries[index + 1:]:
+        if entry['depth'] < depth:
+            chain.append(entry['name'])
+            depth = entry['depth']
+    return list(reversed(chain))
+
+
+class Command(BaseCommand):
+    help = 'Mide con -X importtime el arranque de un comando de gestión (por defecto run_bot)'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', nargs='?', default='run_bot', help='Comando a auditar (por defecto run_bot)')
+        parser.add_argument('--top', type=int, default=15, help='Filas de cada tabla (por defecto 15)')
+        parser.add_argument('--why', action='append', default=[], metavar='MODULO',
+                            help='Muestra qué cadena de imports carga este módulo (se puede repetir)')
+        parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                            help=f'Tiempo de arranque aceptable (por defecto {DEFAULT_BUDGET_MS} ms)')
+        parser.add_argument('--strict', action='store_true',
+                            help='Termina con error si se supera el presupuesto o se carga algún módulo pesado')
+        parser.add_argument('--json', action='store_true', help='Salida en JSON')
+
+    def handle(self, *args, **options):
+        try:
+            result = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', _BOOTSTRAP, options['target']],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=120,
+            )
+        except subprocess.TimeoutExpired:
+            raise CommandError('El arranque no terminó en 120 s')
+        if result.returncode != 0:
+            errors = [line for line in result.stderr.splitlines() if not line.startswith('import time:')]
+            raise CommandError('No se pudo arrancar el comando:\n' + '\n'.join(errors[-20:]))
+
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        entries = parse_importtime(result.stderr)
+        report = self._report(entries, timings, options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+        else:
+            self._print(report, options)
+
+        if options['strict'] and (report['over_budget'] or report['heavy_modules']):
+            raise CommandError('El arranque no cumple el presupuesto')
+
+    def _report(self, entries, timings, options):
+        top = options['top']
+        by_package = defaultdict(int)
+        for entry in entries:
+            by_package[entry['name'].split('.')[0]] += entry['self_us']
+
+        direct = [e for e in entries if e['depth'] == 0]
+        loaded = {entry['name'] for entry in entries}
+        return {
+            'target': options['target'],
+            'timings_ms': {key: round(value, 1) for key, value in timings.items() if key.endswith('_ms')},
+            'system_checks': timings['checks'],
+            'modules': len(entries),
+            'budget_ms': options['budget_ms'],
+            'over_budget': timings['total_ms'] > options['budget_ms'],
+            'packages': [
+                {'package': name, 'self_ms': round(us / 1000, 1)}
+                for name, us in sorted(by_package.items(), key=lambda item: -item[1])[:top]
+            ],
+            'direct_imports': [
+                {'module': e['name'], 'cumulative_ms': round(e['cumulative_us'] / 1000, 1)}
+                for e in sorted(direct, key=lambda e: -e['cumulative_us'])[:top]
+            ],
+            'heavy_modules': {name: import_chain(entries, name) for name in HEAVY_MODULES if name in loaded},
+            'why': {name: import_chain(entries, name) for name in options['why']},
+        }
+
+    def _print(self, report, options):
+        timings = report['timings_ms']
+        self.stdout.write(f"Arranque de '{report['target']}': {timings['total_ms']} ms "
+                          f"(django.setup {timings['setup_ms']} ms, carga del comando {timings['load_ms']} ms, "
+                          f"system checks {timings['checks_ms'] if report['system_checks'] else 'no'}) · "
+                          f"{report['modules']} módulos")
+        style = self.style.WARNING if report['over_budget'] else self.style.SUCCESS
+        self.stdout.write(style(f"Presupuesto: {report['budget_ms']:.0f} ms → "
+                                f"{'superado' if report['over_budget'] else 'dentro'}"))
+
+        self.stdout.write("\nPaquetes por tiempo propio:")
+        for row in report['packages']:
+            self.stdout.write(f"  {row['self_ms']:>8.1f} ms  {row['package']}")
+
+        self.stdout.write("\nImports directos por tiempo acumulado:")
+        for row in report['direct_imports']:
+            self.stdout.write(f"  {row['cumulative_ms']:>8.1f} ms  {row['module']}")
+
+        if report['heavy_modules']:
+            self.stdout.write(self.style.WARNING("\nMódulos que este proceso no debería cargar:"))
+            for name, chain in report['heavy_modules'].items():
+                self.stdout.write(f"  {name}: {' → '.join(chain)}")
+
+        for name, chain in report['why'].items():
+            self.stdout.write(f"\n¿Por qué {name}? " + (' → '.join(chain) if chain else 'no se importa'))
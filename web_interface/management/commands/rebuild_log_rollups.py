@@ -0,0 +1,29 @@
+# web_interface/management/commands/rebuild_log_rollups.py
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from web_interface.log_rollups import rebuild
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los resúmenes por hora de los logs a partir de los logs guardados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Recalcular solo los últimos N días (por defecto, desde el log más antiguo)'
+        )
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days']) if options['days'] else None
+        try:
+            processed = rebuild(since=since)
+        except Exception as e:
+            logger.exception("Error en rebuild_log_rollups")
+            self.stdout.write(self.style.ERROR(f"Error: {str(e)}"))
+            return
+        self.stdout.write(self.style.SUCCESS(f"Resúmenes recalculados a partir de {processed} logs"))
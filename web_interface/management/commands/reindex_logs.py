@@ -0,0 +1,35 @@
+# web_interface/management/commands/reindex_logs.py
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from web_interface.log_search import reindex
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de palabras usado por la búsqueda de logs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Reindexar solo los logs de los últimos N días (por defecto, todos)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Entradas procesadas por lote'
+        )
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days']) if options['days'] else None
+        try:
+            tokens = reindex(batch_size=options['batch_size'], since=since)
+        except Exception as e:
+            logger.exception("Error en reindex_logs")
+            self.stdout.write(self.style.ERROR(f"Error: {str(e)}"))
+            return
+        self.stdout.write(self.style.SUCCESS(f"Índice de logs reconstruido: {tokens} palabras indexadas"))
@@ -0,0 +1,39 @@
+# web_interface/management/commands/run_scheduler.py
+from django.core.management.base import BaseCommand
+from web_interface.scheduler import scheduler, TICK_SECONDS
+from web_interface.utils import log_event
+import signal
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta el planificador de tareas en primer plano (sin el bot de Telegram)'
+    requires_system_checks = []  # ← como run_bot: arranque sin cargar el URLconf
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Revisa una sola vez las tareas pendientes y termina cuando acaban'
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            started = scheduler.run_pending()
+            self.stdout.write(f"Tareas lanzadas: {', '.join(started) if started else 'ninguna'}")
+            scheduler.stop(timeout=0, wait_jobs=True)
+            return
+
+        def signal_handler(signum, frame):
+            self.stdout.write(self.style.WARNING('Señal recibida. Deteniendo el planificador...'))
+            scheduler.stop(timeout=0)
+
+        signal.signal(signal.SIGINT, signal_handler)
+        signal.signal(signal.SIGTERM, signal_handler)
+
+        log_event('INFO', f'Planificador de tareas iniciado via run_scheduler ({scheduler.worker}).', 'scheduler')
+        self.stdout.write(self.style.SUCCESS(f'Planificador en marcha (revisión cada {TICK_SECONDS} s)'))
+        scheduler.run_forever()
+        log_event('INFO', 'Planificador de tareas detenido.', 'scheduler')
@@ -0,0 +1,316 @@
+# web_interface/metrics.py
+"""
+Registro de métricas en memoria (contadores, histogramas de latencia y gauges)
+exportado en formato de texto de Prometheus.
+
+Cada proceso tiene su propio registro: el servidor web lo expone en /metrics y
+el proceso `run_bot` en un puerto local (METRICS_BOT_PORT). Sin dependencias:
+no requiere prometheus_client.
+
+Uso:
+    from web_interface import metrics
+
+    @metrics.timed('tbot_ad_operation_seconds', operation='bind')
+    def authenticate_user(...): ...
+
+    with metrics.timer('tbot_smtp_send_seconds'):
+        server.sendmail(...)
+"""
+import asyncio
+import functools
+import logging
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# ← Descripción de las métricas conocidas (línea # HELP)
+HELP = {
+    'tbot_ad_operation_seconds': 'Duración de las operaciones contra Active Directory',
+    'tbot_ad_operation_total': 'Operaciones contra Active Directory por resultado',
+    'tbot_smtp_send_seconds': 'Duración de los envíos SMTP',
+    'tbot_smtp_send_total': 'Envíos SMTP por resultado',
+    'tbot_db_operation_seconds': 'Duración de operaciones de base de datos (refresh_users, almacén de sesiones)',
+    'tbot_db_operation_total': 'Operaciones de base de datos por resultado',
+    'tbot_telegram_handler_seconds': 'Duración de cada handler del bot de Telegram',
+    'tbot_telegram_handler_total': 'Llamadas a handlers del bot de Telegram por resultado',
+    'tbot_active_sessions': 'Sesiones del bot no expiradas',
+    'tbot_broadcast_pending': 'Mensajes de difusión pendientes de envío',
+    'tbot_log_sink_queue_depth': 'Logs en cola hacia la base de datos',
+    'tbot_log_sink_dropped': 'Logs descartados por el buffer de la base de datos',
+    'tbot_logging_queue_depth': 'Registros en cola hacia logs/app.log',
+    'tbot_logging_dropped': 'Registros descartados por cola de logging llena',
+    'tbot_job_seconds': 'Duración de las tareas programadas',
+    'tbot_job_total': 'Ejecuciones de tareas programadas por resultado',
+    'tbot_config_version': 'Versión de .env cargada por el proceso (CONFIG_VERSION)',
+    'tbot_process_start_time_seconds': 'Inicio del proceso (epoch)',
+    'tbot_process_resident_memory_bytes': 'Memoria residente del proceso',
+}
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: tuple) -> str:
+    if not key:
+        return ''
+    escaped = (
+        f'{k}="' + v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for k, v in key
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name):
+        self.name = name
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values = {}  # ← clave de etiquetas -> [conteos por bucket..., suma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+                    break
+            data[-2] += value
+            data[-1] += 1
+
+    def samples(self):
+        result = []
+        with self._lock:
+            items = [(key, list(data)) for key, data in self._values.items()]
+        for key, data in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, data):
+                cumulative += count
+                result.append((f'{self.name}_bucket', key + (('le', _format_value(bound)),), cumulative))
+            result.append((f'{self.name}_sum', key, data[-2]))
+            result.append((f'{self.name}_count', key, data[-1]))
+        return result
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name, function=None):
+        self.name = name
+        self.function = function  # ← si se define, se evalúa en cada lectura
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def samples(self):
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception as e:
+                logger.warning(f"metrics: no se pudo leer {self.name}: {e}")
+                return []
+            if value is None:
+                return []
+            return [(self.name, (), value)]
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = self._metrics[name] = cls(name, **kwargs)
+        if not isinstance(metric, cls):
+            raise ValueError(f"La métrica {name} ya existe como {metric.kind}")
+        return metric
+
+    def counter(self, name) -> Counter:
+        return self._get(Counter, name)
+
+    def histogram(self, name, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, buckets=buckets)
+
+    def gauge(self, name, function=None) -> Gauge:
+        gauge = self._get(Gauge, name)
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def render(self) -> str:
+        """Texto de exposición de Prometheus (versión 0.0.4)."""
+        lines = []
+        for name in sorted(list(self._metrics)):
+            metric = self._metrics[name]
+            samples = metric.samples()
+            if not samples:
+                continue
+            if name in HELP:
+                lines.append(f'# HELP {name} {HELP[name]}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for sample_name, key, value in samples:
+                lines.append(f'{sample_name}{_format_labels(key)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+counter = registry.counter
+histogram = registry.histogram
+gauge = registry.gauge
+render = registry.render
+
+
+# --- Medición ---
+
+class timer:
+    """
+    Context manager que observa la duración en el histograma `name` y cuenta la
+    llamada en el contador `*_total` correspondiente con outcome='ok'|'error'
+    (tbot_smtp_send_seconds -> tbot_smtp_send_total). Dentro de una traza abre
+    además un span (p. ej. 'smtp_send:email_service').
+    """
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        base = self.name.removeprefix('tbot_').removesuffix('_seconds')
+        span_name = ':'.join([base] + [str(v) for v in self.labels.values()])
+        self._span = tracing.span(span_name)
+        self._span.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, time.perf_counter() - self.start, 'error' if exc_type else 'ok', **self.labels)
+        self._span.__exit__(exc_type, exc, tb)
+        return False
+
+
+def _counter_name(histogram_name: str) -> str:
+    # ← tbot_smtp_send_seconds -> tbot_smtp_send_total
+    return histogram_name.removesuffix('_seconds') + '_total'
+
+
+def record(name, seconds: float, outcome: str = 'ok', **labels):
+    histogram(name).observe(seconds, **labels)
+    counter(_counter_name(name)).inc(outcome=outcome, **labels)
+
+
+def timed(name, **labels):
+    """Decorador (funciones normales o async) equivalente a `with timer(name, **labels)`."""
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timer(name, **labels):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+# --- Métricas del proceso ---
+
+_START_TIME = time.time()
+gauge('tbot_process_start_time_seconds').set(_START_TIME)
+
+
+def _resident_memory():
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss
+    except Exception:
+        return None
+
+
+gauge('tbot_process_resident_memory_bytes', _resident_memory)
+
+
+# --- Servidor para procesos sin Django web (run_bot) ---
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        try:
+            from django.db import close_old_connections
+            close_old_connections()  # ← los gauges consultan la DB desde este hilo
+        except ImportError:
+            pass
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # ← Sin una línea de log por cada scrape
+
+
+def serve(port: int, host: str = '127.0.0.1'):
+    """Expone /metrics en un hilo daemon (un único hilo: una sola conexión a la DB)."""
+    server = HTTPServer((host, port), _MetricsRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,161 @@
+# web_interface/metrics_sampler.py
+"""
+Muestreo en segundo plano de métricas del sistema para el panel.
+
+Un hilo toma cada SAMPLE_INTERVAL segundos CPU, RAM, velocidad de red y memoria
+(RSS) del proceso del bot, y guarda las muestras en un buffer circular. `get_stats`
+y el flujo de eventos leen la última muestra sin bloquear.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = 2.0
+HISTORY_SIZE = 900          # ← 30 minutos a 2 s por muestra
+BOT_LOOKUP_INTERVAL = 30.0  # segundos entre búsquedas del proceso del bot
+
+
+def format_speed(bps):
+    if bps < 1024:
+        return f"{bps:.1f} B/s"
+    elif bps < 1024**2:
+        return f"{bps / 1024:.1f} KB/s"
+    else:
+        return f"{bps / (1024**2):.1f} MB/s"
+
+
+def _is_bot_process(proc) -> bool:
+    cmdline = proc.info.get('cmdline') or []
+    return any(arg.endswith('manage.py') for arg in cmdline) and 'run_bot' in cmdline
+
+
+class MetricsSampler:
+    def __init__(self, interval=SAMPLE_INTERVAL, size=HISTORY_SIZE):
+        self.interval = interval
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+        # ← sample() también se llama desde la web (primera petición): _last_net y _bot_proc son de uno a la vez
+        self._sample_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._last_net = None
+        self._bot_proc = None
+        self._bot_lookup_at = 0.0
+
+    # --- Proceso del bot ---
+
+    def _find_bot_process(self):
+        """Proceso `manage.py run_bot` (hijo del supervisor); si no aparece, el pid que anotó en su estado."""
+        now = time.monotonic()
+        if self._bot_proc is not None and self._bot_proc.is_running():
+            return self._bot_proc
+        if now - self._bot_lookup_at < BOT_LOOKUP_INTERVAL:
+            return None
+        self._bot_lookup_at = now
+        self._bot_proc = None
+        for proc in psutil.process_iter(['pid', 'cmdline']):
+            try:
+                if _is_bot_process(proc):
+                    self._bot_proc = proc
+                    break
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        if self._bot_proc is None:
+            from telegram_bot.bot_status import get_status
+            status = get_status()
+            if status['telegram_running'] and status['pid']:
+                try:
+                    self._bot_proc = psutil.Process(status['pid'])
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    pass
+        return self._bot_proc
+
+    def _bot_rss_mb(self):
+        try:
+            proc = self._find_bot_process()
+            return round(proc.memory_info().rss / (1024**2), 1) if proc else None
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            self._bot_proc = None
+            return None
+
+    # --- Muestreo ---
+
+    def sample(self) -> dict:
+        with self._sample_lock:
+            return self._sample()
+
+    def _sample(self) -> dict:
+        now = time.monotonic()
+        net = psutil.net_io_counters()
+        ram = psutil.virtual_memory()
+        # ← cpu_percent(None) compara con la llamada anterior: no bloquea
+        cpu = psutil.cpu_percent(interval=None)
+        upload = download = 0.0
+        if self._last_net is not None:
+            elapsed = max(now - self._last_net[0], 0.001)
+            upload = max(net.bytes_sent - self._last_net[1].bytes_sent, 0) / elapsed
+            download = max(net.bytes_recv - self._last_net[1].bytes_recv, 0) / elapsed
+        self._last_net = (now, net)
+
+        sample = {
+            'timestamp': time.time(),
+            'cpu_percent': round(cpu, 1),
+            'ram_percent': round(ram.percent, 1),
+            'ram_used': round(ram.used / (1024**3), 2),
+            'ram_total': round(ram.total / (1024**3), 2),
+            'download_bps': round(download, 1),
+            'upload_bps': round(upload, 1),
+            'download_speed': format_speed(download),
+            'upload_speed': format_speed(upload),
+            'bot_rss_mb': self._bot_rss_mb(),
+        }
+        with self._lock:
+            self._samples.append(sample)
+        return sample
+
+    def _run(self):
+        with self._sample_lock:
+            psutil.cpu_percent(interval=None)
+            if self._last_net is None:
+                self._last_net = (time.monotonic(), psutil.net_io_counters())
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sample()
+            except Exception as e:
+                logger.warning(f"metrics_sampler: error al tomar la muestra: {e}")
+
+    def ensure_started(self):
+        # ← Arranque perezoso; también tras un fork (workers de gunicorn)
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='metrics-sampler', daemon=True)
+            self._thread.start()
+
+    # --- Consulta ---
+
+    def latest(self):
+        """Última muestra, o None si el hilo aún no ha tomado ninguna."""
+        self.ensure_started()
+        with self._lock:
+            return self._samples[-1] if self._samples else None
+
+    def history(self, seconds: float) -> list:
+        """Muestras de los últimos `seconds` segundos, de la más antigua a la más reciente."""
+        self.ensure_started()
+        since = time.time() - seconds
+        with self._lock:
+            return [s for s in self._samples if s['timestamp'] >= since]
+
+
+sampler = MetricsSampler()
@@ -0,0 +1,65 @@
+# Particionado mensual de web_interface_logentry (solo MySQL).
+#
+# MySQL exige que la clave primaria incluya la columna de particionado, por lo que
+# la PK pasa a ser (id, timestamp); `id` sigue siendo AUTO_INCREMENT y único.
+# En otros motores esta migración no hace nada.
+
+from datetime import date
+
+from django.db import migrations
+
+TABLE = 'web_interface_logentry'
+MONTHS_AHEAD = 3
+
+
+def _add_months(value, months):
+    month = value.month - 1 + months
+    return date(value.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'mysql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN(timestamp) FROM {TABLE}")
+        oldest = cursor.fetchone()[0]
+
+    today = date.today().replace(day=1)
+    month = (oldest.date().replace(day=1) if oldest else today)
+    partitions = []
+    while month <= _add_months(today, MONTHS_AHEAD):
+        following = _add_months(month, 1)
+        partitions.append(
+            f"PARTITION p{month.year:04d}{month.month:02d} "
+            f"VALUES LESS THAN (TO_DAYS('{following.isoformat()}'))"
+        )
+        month = following
+    partitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+
+    schema_editor.execute(f"ALTER TABLE {TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)")
+    schema_editor.execute(
+        f"ALTER TABLE {TABLE} PARTITION BY RANGE (TO_DAYS(timestamp)) ({', '.join(partitions)})"
+    )
+
+
+def unpartition_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'mysql':
+        return
+    schema_editor.execute(f"ALTER TABLE {TABLE} REMOVE PARTITIONING")
+    schema_editor.execute(f"ALTER TABLE {TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (id)")
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('web_interface', '0003_logentry_event_timestamp'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_table, unpartition_table),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_interface', '0004_partition_logentry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['timestamp', 'id'], name='logentry_timestamp_id_idx'),
+        ),
+    ]
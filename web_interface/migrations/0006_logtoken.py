@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_interface', '0005_logentry_timestamp_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('entry_id', models.BigIntegerField()),
+                ('timestamp', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'web_interface_logtoken',
+                'indexes': [models.Index(fields=['token', 'entry_id'], name='logtoken_token_entry_idx'), models.Index(fields=['timestamp'], name='logtoken_timestamp_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_interface', '0006_logtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('level', models.CharField(max_length=10)),
+                ('source', models.CharField(blank=True, max_length=50)),
+                ('event_type', models.CharField(max_length=32)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'web_interface_logrollup',
+                'indexes': [models.Index(fields=['source'], name='logrollup_source_idx')],
+                'unique_together': {('hour', 'level', 'source', 'event_type')},
+            },
+        ),
+    ]
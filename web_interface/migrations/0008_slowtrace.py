@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_interface', '0007_logrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowTrace',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trace_id', models.CharField(max_length=32, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('started_at', models.DateTimeField()),
+                ('duration_ms', models.FloatField()),
+                ('error', models.BooleanField(default=False)),
+                ('user_id', models.CharField(blank=True, max_length=50)),
+                ('spans', models.JSONField()),
+            ],
+            options={
+                'db_table': 'web_interface_slowtrace',
+                'indexes': [models.Index(fields=['started_at'], name='slowtrace_started_at_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_interface', '0008_slowtrace'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ADRoster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group_dn', models.CharField(max_length=512, unique=True)),
+                ('members', models.JSONField(default=list)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+                ('duration_ms', models.FloatField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('refreshing_since', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'web_interface_adroster',
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:49
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_imported_users(apps, schema_editor):
+    """Los importados antes de existir la marca se reconocen por su contraseña no usable."""
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    ImportedADUser = apps.get_model('web_interface', 'ImportedADUser')
+    users = User.objects.filter(password__startswith='!').exclude(username='admin')
+    ImportedADUser.objects.bulk_create([ImportedADUser(user=user) for user in users])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_interface', '0009_adroster'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedADUser',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group_dn', models.CharField(blank=True, max_length=512)),
+                ('imported_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('imported_by', models.CharField(blank=True, max_length=150)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ad_import', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'web_interface_importedaduser',
+            },
+        ),
+        migrations.RunPython(mark_imported_users, migrations.RunPython.noop),
+    ]
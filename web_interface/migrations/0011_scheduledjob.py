@@ -0,0 +1,52 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:59
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_interface', '0010_importedaduser'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('schedule', models.CharField(max_length=100)),
+                ('enabled', models.BooleanField(default=False)),
+                ('jitter_seconds', models.PositiveIntegerField(default=0)),
+                ('timeout_seconds', models.PositiveIntegerField(default=3600)),
+                ('next_run_at', models.DateTimeField(blank=True, null=True)),
+                ('running_since', models.DateTimeField(blank=True, null=True)),
+                ('run_requested', models.BooleanField(default=False)),
+            ],
+            options={
+                'db_table': 'web_interface_scheduledjob',
+            },
+        ),
+        migrations.CreateModel(
+            name='JobRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('duration_ms', models.FloatField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('running', 'En curso'), ('ok', 'Correcta'), ('error', 'Error'), ('timeout', 'Tiempo agotado'), ('skipped', 'Omitida')], max_length=10)),
+                ('trigger', models.CharField(choices=[('schedule', 'Programada'), ('manual', 'Manual')], default='schedule', max_length=10)),
+                ('rows', models.IntegerField(blank=True, null=True)),
+                ('output', models.TextField(blank=True)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='web_interface.scheduledjob')),
+            ],
+            options={
+                'db_table': 'web_interface_jobrun',
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['job', 'started_at'], name='jobrun_job_started_idx')],
+            },
+        ),
+    ]
@@ -1,5 +1,7 @@
 # web_interface/models.py
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 import logging
 
 class LogEntry(models.Model):
@@ -10,7 +12,8 @@ class LogEntry(models.Model):
         ('CRITICAL', 'Critical'),
     ]
 
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # ← Hora del evento (no de la escritura en lote)
+    timestamp = models.DateTimeField(default=timezone.now)
     level = models.CharField(max_length=10, choices=LEVEL_CHOICES)
     message = models.TextField()
     source = models.CharField(max_length=50, blank=True)
@@ -21,6 +24,124 @@ def __str__(self):
     class Meta:
         verbose_name = "Log Entry"
         ordering = ['-timestamp']
+        indexes = [
+            # ← Paginación por cursor (timestamp, id) y filtros por fecha
+            models.Index(fields=['timestamp', 'id'], name='logentry_timestamp_id_idx'),
+        ]
+
+class LogToken(models.Model):
+    """
+    Índice invertido de palabras de `LogEntry.message` para la búsqueda de logs.
+    Sin ForeignKey: MySQL no admite claves foráneas hacia tablas particionadas.
+    """
+    token = models.CharField(max_length=64)
+    entry_id = models.BigIntegerField()
+    timestamp = models.DateTimeField()  # ← copia de LogEntry.timestamp (archivado por mes)
+
+    class Meta:
+        db_table = 'web_interface_logtoken'
+        indexes = [
+            models.Index(fields=['token', 'entry_id'], name='logtoken_token_entry_idx'),
+            models.Index(fields=['timestamp'], name='logtoken_timestamp_idx'),
+        ]
+
+class LogRollup(models.Model):
+    """Número de logs por hora, nivel, origen y tipo de evento (ver log_rollups)."""
+    hour = models.DateTimeField()
+    level = models.CharField(max_length=10)
+    source = models.CharField(max_length=50, blank=True)
+    event_type = models.CharField(max_length=32)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'web_interface_logrollup'
+        unique_together = ('hour', 'level', 'source', 'event_type')
+        indexes = [
+            models.Index(fields=['source'], name='logrollup_source_idx'),
+        ]
+
+class SlowTrace(models.Model):
+    """Árbol de spans de una actualización del bot que superó TRACE_SLOW_MS (ver tracing)."""
+    trace_id = models.CharField(max_length=32, unique=True)
+    name = models.CharField(max_length=100)
+    started_at = models.DateTimeField()
+    duration_ms = models.FloatField()
+    error = models.BooleanField(default=False)
+    user_id = models.CharField(max_length=50, blank=True)
+    spans = models.JSONField()
+
+    class Meta:
+        db_table = 'web_interface_slowtrace'
+        indexes = [
+            models.Index(fields=['started_at'], name='slowtrace_started_at_idx'),
+        ]
+
+class ADRoster(models.Model):
+    """Última lista conocida de miembros de un grupo AD (ver ad_roster)."""
+    group_dn = models.CharField(max_length=512, unique=True)
+    members = models.JSONField(default=list)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.FloatField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    refreshing_since = models.DateTimeField(null=True, blank=True)  # ← refresco en curso (reclamado por un proceso)
+
+    class Meta:
+        db_table = 'web_interface_adroster'
+
+class ImportedADUser(models.Model):
+    """Marca de los usuarios web importados desde el grupo AD (origen "AD" en la lista)."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='ad_import')
+    group_dn = models.CharField(max_length=512, blank=True)
+    imported_at = models.DateTimeField(default=timezone.now)
+    imported_by = models.CharField(max_length=150, blank=True)
+
+    class Meta:
+        db_table = 'web_interface_importedaduser'
+
+class ScheduledJob(models.Model):
+    """Tarea del planificador en proceso (ver scheduler)."""
+    name = models.CharField(max_length=50, unique=True)
+    schedule = models.CharField(max_length=100)
+    enabled = models.BooleanField(default=False)
+    jitter_seconds = models.PositiveIntegerField(default=0)
+    timeout_seconds = models.PositiveIntegerField(default=3600)
+    next_run_at = models.DateTimeField(null=True, blank=True)
+    running_since = models.DateTimeField(null=True, blank=True)  # ← ejecución en curso (reclamada por un proceso)
+    run_requested = models.BooleanField(default=False)  # ← "Ejecutar ahora" desde la web
+
+    class Meta:
+        db_table = 'web_interface_scheduledjob'
+
+class JobRun(models.Model):
+    """Historial de ejecuciones de las tareas programadas."""
+    STATUS_CHOICES = [
+        ('running', 'En curso'),
+        ('ok', 'Correcta'),
+        ('error', 'Error'),
+        ('timeout', 'Tiempo agotado'),
+        ('skipped', 'Omitida'),
+    ]
+    TRIGGER_CHOICES = [
+        ('schedule', 'Programada'),
+        ('manual', 'Manual'),
+    ]
+
+    job = models.ForeignKey(ScheduledJob, on_delete=models.CASCADE, related_name='runs')
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.FloatField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES, default='schedule')
+    rows = models.IntegerField(null=True, blank=True)  # ← registros procesados según el comando
+    output = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)  # ← host:pid del proceso que la ejecutó
+
+    class Meta:
+        db_table = 'web_interface_jobrun'
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['job', 'started_at'], name='jobrun_job_started_idx'),
+        ]
 
 class AppSetting(models.Model):
     key = models.CharField(max_length=100, unique=True)
@@ -0,0 +1,374 @@
+# web_interface/scheduler.py
+"""
+Planificador de tareas en proceso (sustituye al crontab del usuario web).
+
+Corre en un proceso de larga vida (el supervisor del bot, `manage.py
+run_supervisor`, que sigue en marcha aunque se detenga o reinicie el bot; o
+`manage.py run_scheduler` donde no se use el supervisor) y ejecuta los comandos de JOBS con call_command dentro del mismo
+proceso. Así cada ejecución aprovecha los módulos ya importados, la conexión a
+la base de datos de su hilo y la configuración de AD/SMTP ya cargada en
+env_config, en lugar de arrancar Django desde cero como hacía cron.
+
+- La programación, el estado y la próxima ejecución viven en `ScheduledJob`;
+  cada ejecución queda en `JobRun` (inicio, duración, resultado y filas).
+- next_run_at = siguiente coincidencia de la expresión cron + un retardo
+  aleatorio de hasta jitter_seconds, calculado al reclamar la tarea.
+- Solapamiento: una tarea solo arranca si un UPDATE condicional consigue
+  marcar running_since. Si varios procesos corren el planificador, solo uno la
+  ejecuta; si la anterior sigue en marcha, la ejecución se registra como omitida.
+- Timeout: un hilo de Python no se puede matar. Pasado timeout_seconds la
+  ejecución se marca como 'timeout' y la tarea sigue bloqueada hasta que el hilo
+  termine; un running_since más antiguo que timeout + STALE_GRACE se considera
+  abandonado (el proceso que la reclamó murió) y se libera; sus JobRun que
+  seguían 'running' se cierran como error.
+- Cada tick deja un latido en AppSetting (SCHEDULER_HEARTBEAT) que la página de
+  cron usa para avisar si no hay ningún planificador activo.
+"""
+import io
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from django.core.management import call_command, get_commands, load_command_class
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from . import metrics
+from .models import AppSetting, JobRun, ScheduledJob
+from .utils import log_event
+
+logger = logging.getLogger(__name__)
+
+# ← Tareas disponibles (nombre en la web → comando de gestión)
+JOBS = {
+    'sync_users': {
+        'command': 'sync_ussers',
+        'description': 'Sincroniza usuarios del AD con la base de datos',
+        'schedule': '0 */6 * * *',
+        'timeout': 1800,
+    },
+    'password_expiration': {
+        'command': 'password_expiration',
+        'description': 'Notifica a los usuarios cuya contraseña está próxima a expirar',
+        'schedule': '0 8 * * *',
+        'timeout': 3600,
+    },
+    'archive_logs': {
+        'command': 'archive_logs',
+        'description': 'Archiva los logs antiguos en logs/archive/ y los elimina de la base de datos',
+        'schedule': '0 8 * * *',
+        'timeout': 3600,
+    },
+}
+
+TICK_SECONDS = 15        # ← cada cuánto se revisan las tareas pendientes
+STALE_GRACE = 300        # ← margen tras el timeout para dar por muerta una ejecución ajena
+HEARTBEAT_KEY = 'SCHEDULER_HEARTBEAT'
+HEARTBEAT_TIMEOUT = TICK_SECONDS * 4
+OUTPUT_LIMIT = 4000      # ← caracteres finales de la salida guardados en JobRun
+
+
+# --- Expresiones cron ---
+
+_FIELDS = (
+    # nombre, mínimo, máximo, alias
+    ('minuto', 0, 59, {}),
+    ('hora', 0, 23, {}),
+    ('día', 1, 31, {}),
+    ('mes', 1, 12, {name: i for i, name in enumerate(
+        ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], 1)}),
+    ('día de la semana', 0, 7, {name: i for i, name in enumerate(
+        ['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'])}),
+)
+
+
+def _parse_value(text, field):
+    name, low, high, aliases = field
+    value = aliases.get(text.lower()) if text.isalpha() else None
+    if value is None:
+        if not text.isdigit():
+            raise ValueError(f"Valor no válido en el campo {name}: {text!r}")
+        value = int(text)
+    if not low <= value <= high:
+        raise ValueError(f"El campo {name} debe estar entre {low} y {high}: {text!r}")
+    return value
+
+
+def _parse_field(text, field):
+    name, low, high, _ = field
+    values = set()
+    for part in text.split(','):
+        part, _, step_text = part.partition('/')
+        step = 1
+        if step_text:
+            if not step_text.isdigit() or int(step_text) == 0:
+                raise ValueError(f"Paso no válido en el campo {name}: {step_text!r}")
+            step = int(step_text)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start_text, _, end_text = part.partition('-')
+            start, end = _parse_value(start_text, field), _parse_value(end_text, field)
+            if start > end:
+                raise ValueError(f"Rango invertido en el campo {name}: {part!r}")
+        else:
+            start = _parse_value(part, field)
+            end = high if step_text else start  # ← "5/15" equivale a "5-59/15"
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpression:
+    """Expresión cron de cinco campos (`minuto hora día mes día_semana`)."""
+
+    def __init__(self, expression: str):
+        parts = (expression or '').split()
+        if len(parts) != 5:
+            raise ValueError("La expresión cron debe tener 5 campos: minuto hora día mes día_semana")
+        self.expression = ' '.join(parts)
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_field(part, field) for part, field in zip(parts, _FIELDS)
+        )
+        self.weekdays = {d % 7 for d in weekdays}  # ← 7 también es domingo
+        # ← Como cron: si día y día_semana están restringidos basta con que coincida uno
+        self._any_day = parts[2] == '*'
+        self._any_weekday = parts[4] == '*'
+
+    def _day_matches(self, moment: datetime) -> bool:
+        in_days = moment.day in self.days
+        in_weekdays = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, after: datetime) -> datetime:
+        """Primer instante (hora local, con zona) posterior a `after` que cumple la expresión."""
+        moment = timezone.localtime(after).replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 5)  # ← cubre el 29 de febrero
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = datetime(moment.year + moment.month // 12, moment.month % 12 + 1, 1)
+            elif not self._day_matches(moment):
+                moment = datetime(moment.year, moment.month, moment.day) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return timezone.make_aware(moment)
+        raise ValueError(f"La expresión {self.expression!r} no tiene ninguna fecha válida")
+
+
+def validate_schedule(expression: str) -> str:
+    """Devuelve la expresión normalizada o lanza ValueError con el motivo."""
+    cron = CronExpression(expression)
+    cron.next_after(timezone.now())  # ← descarta fechas imposibles (p. ej. 31 de febrero)
+    return cron.expression
+
+
+def next_run(job: ScheduledJob, after=None):
+    """Siguiente ejecución programada de `job` con su jitter aplicado."""
+    moment = CronExpression(job.schedule).next_after(after or timezone.now())
+    if job.jitter_seconds:
+        moment += timedelta(seconds=random.uniform(0, job.jitter_seconds))
+    return moment
+
+
+# --- Tareas ---
+
+def ensure_jobs():
+    """Crea (deshabilitadas) las tareas de JOBS que aún no existen en la base de datos."""
+    existing = set(ScheduledJob.objects.values_list('name', flat=True))
+    missing = [
+        ScheduledJob(name=name, schedule=spec['schedule'], timeout_seconds=spec['timeout'])
+        for name, spec in JOBS.items() if name not in existing
+    ]
+    if missing:
+        ScheduledJob.objects.bulk_create(missing, ignore_conflicts=True)
+    return ScheduledJob.objects.filter(name__in=JOBS).order_by('name')
+
+
+def request_run(name: str) -> bool:
+    """Pide una ejecución inmediata (la recoge el planificador en el próximo tick)."""
+    return ScheduledJob.objects.filter(name=name).update(run_requested=True) > 0
+
+
+def heartbeat_age():
+    """Segundos desde el último tick de algún planificador, o None si nunca corrió."""
+    try:
+        value = AppSetting.objects.get(key=HEARTBEAT_KEY).value
+        return (timezone.now() - datetime.fromisoformat(value)).total_seconds()
+    except (AppSetting.DoesNotExist, ValueError):
+        return None
+
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _run_command(job_name: str):
+    """Ejecuta el comando de la tarea; devuelve (filas procesadas, salida)."""
+    command_name = JOBS[job_name]['command']
+    command = load_command_class(get_commands()[command_name], command_name)
+    output = io.StringIO()
+    call_command(command, stdout=output, stderr=output)
+    # ← Los comandos dejan en rows_processed cuántos registros trataron
+    return getattr(command, 'rows_processed', None), output.getvalue()
+
+
+class Scheduler:
+    def __init__(self, tick=TICK_SECONDS):
+        self.tick = tick
+        self.worker = _worker_id()
+        self._stop = threading.Event()
+        self._thread = None
+        self._running = {}  # ← nombre → id de JobRun de las tareas en curso en este proceso
+        self._lock = threading.Lock()
+        # ← Hilos persistentes: cada uno conserva su conexión a la base de datos entre ejecuciones
+        self._executor = ThreadPoolExecutor(max_workers=len(JOBS), thread_name_prefix='scheduler-job')
+
+    # --- Ciclo de vida ---
+
+    def start(self):
+        """Arranca el hilo del planificador (idempotente)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='scheduler', daemon=True)
+        self._thread.start()
+        logger.info(f"Planificador de tareas iniciado en {self.worker}")
+
+    def stop(self, timeout=5, wait_jobs=False):
+        """Detiene el bucle; con wait_jobs espera a que terminen las tareas en curso."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._executor.shutdown(wait=wait_jobs, cancel_futures=not wait_jobs)
+
+    def run_forever(self):
+        """Ejecuta el bucle en el hilo actual hasta stop() (para run_scheduler)."""
+        self._loop()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                close_old_connections()
+                self.run_pending()
+            except Exception:
+                logger.exception("Error en el ciclo del planificador")
+            finally:
+                close_old_connections()
+            self._stop.wait(self.tick)
+
+    # --- Tick ---
+
+    def run_pending(self, now=None):
+        """Marca timeouts, lanza las tareas vencidas y deja el latido. Devuelve las lanzadas."""
+        now = now or timezone.now()
+        AppSetting.objects.update_or_create(
+            key=HEARTBEAT_KEY,
+            defaults={'value': now.isoformat(), 'description': f'Último tick del planificador ({self.worker})'},
+        )
+        self._check_timeouts(now)
+
+        started = []
+        for job in ensure_jobs():
+            if job.enabled and job.next_run_at is None and not job.run_requested:
+                # ← Tarea recién habilitada: se programa sin ejecutarla
+                ScheduledJob.objects.filter(pk=job.pk, next_run_at__isnull=True).update(next_run_at=next_run(job, now))
+                continue
+            due = job.enabled and job.next_run_at is not None and job.next_run_at <= now
+            if not (due or job.run_requested):
+                continue
+            if self._claim(job, now):
+                started.append(job.name)
+        return started
+
+    def _check_timeouts(self, now):
+        with self._lock:
+            running = dict(self._running)
+        for name, run_id in running.items():
+            run = JobRun.objects.filter(pk=run_id, status='running').select_related('job').first()
+            if run and run.started_at + timedelta(seconds=run.job.timeout_seconds) <= now:
+                JobRun.objects.filter(pk=run_id, status='running').update(status='timeout')
+                log_event('ERROR', f"La tarea '{name}' superó su tiempo máximo ({run.job.timeout_seconds} s)", 'scheduler')
+
+    def _claim(self, job, now) -> bool:
+        trigger = 'manual' if job.run_requested else 'schedule'
+        stale_before = now - timedelta(seconds=job.timeout_seconds + STALE_GRACE)
+        updates = {'run_requested': False}
+        if job.enabled:
+            updates['next_run_at'] = next_run(job, now)
+
+        with self._lock:
+            local = job.name in self._running
+        free = Q(running_since__isnull=True) if local else Q(running_since__isnull=True) | Q(running_since__lt=stale_before)
+        claimed = ScheduledJob.objects.filter(free, pk=job.pk).update(running_since=now, **updates) == 1
+        if not claimed:
+            # ← Sigue en marcha la ejecución anterior: se avanza la programación y se deja constancia
+            if ScheduledJob.objects.filter(pk=job.pk, next_run_at=job.next_run_at, run_requested=job.run_requested).update(**updates):
+                JobRun.objects.create(
+                    job=job, status='skipped', trigger=trigger, worker=self.worker,
+                    finished_at=now, duration_ms=0, output='La ejecución anterior sigue en curso',
+                )
+            return False
+
+        # ← Con la tarea reclamada, un JobRun aún 'running' es de un proceso que murió sin cerrarlo
+        orphaned = JobRun.objects.filter(job=job, status='running')
+        for worker in orphaned.values_list('worker', flat=True).distinct():
+            log_event('ERROR', f"La tarea '{job.name}' quedó abandonada en {worker or 'otro proceso'}; "
+                               f"se da por fallida", 'scheduler')
+        orphaned.update(status='error', finished_at=now,
+                        output='Abandonada: el proceso que la ejecutaba terminó sin cerrarla')
+
+        run = JobRun.objects.create(job=job, started_at=now, status='running', trigger=trigger, worker=self.worker)
+        with self._lock:
+            self._running[job.name] = run.pk
+        self._executor.submit(self._execute, job.pk, job.name, run.pk)
+        return True
+
+    # --- Ejecución ---
+
+    def _execute(self, job_pk, name, run_id):
+        close_old_connections()
+        started = time.perf_counter()
+        rows, output, status = None, '', 'ok'
+        try:
+            rows, output = _run_command(name)
+        except BaseException as e:  # ← SystemExit de un comando no debe tumbar el hilo
+            status = 'error'
+            output = f"{type(e).__name__}: {e}"
+            logger.exception(f"Error en la tarea '{name}'")
+        seconds = time.perf_counter() - started
+        fields = {
+            'finished_at': timezone.now(),
+            'duration_ms': round(seconds * 1000, 1),
+            'rows': rows,
+            'output': output[-OUTPUT_LIMIT:],
+        }
+        try:
+            # ← Si ya se marcó como timeout se conserva ese resultado
+            if not JobRun.objects.filter(pk=run_id, status='running').update(status=status, **fields):
+                JobRun.objects.filter(pk=run_id).update(**fields)
+                status = 'timeout'
+            ScheduledJob.objects.filter(pk=job_pk).update(running_since=None)
+            metrics.record('tbot_job_seconds', seconds, 'ok' if status == 'ok' else status, job=name)
+            log_event(
+                'INFO' if status == 'ok' else 'ERROR',
+                f"Tarea '{name}': {status} en {fields['duration_ms']} ms"
+                + (f", {rows} filas" if rows is not None else ''),
+                'scheduler'
+            )
+        finally:
+            with self._lock:
+                self._running.pop(name, None)
+            close_old_connections()
+
+
+scheduler = Scheduler()
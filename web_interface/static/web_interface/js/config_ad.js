@@ -38,20 +38,50 @@ $(document).ready(function () {
     // Verificar cambios en cada input
     $('#ad-config-form :input').on('input change', checkChanges);
 
-    // --- Probar conexión ---
+    // --- Probar conexión (diagnóstico por pasos) ---
+    const STEP_BADGES = {
+        ok: '<span class="badge badge-success">OK</span>',
+        error: '<span class="badge badge-danger">Error</span>',
+        skipped: '<span class="badge badge-secondary">Omitido</span>',
+    };
+
+    function renderSteps(steps) {
+        const $tbody = $('#diagnostics-table tbody').empty();
+        (steps || []).forEach(step => {
+            $tbody.append($('<tr>').append(
+                $('<td>').text(step.label),
+                $('<td>').html(STEP_BADGES[step.status] || step.status),
+                $('<td>').text(step.duration_ms == null ? '-' : `${step.duration_ms.toFixed(0)} ms`),
+                $('<td>').text(step.detail || '')
+            ));
+        });
+        $('#diagnostics-table').toggle(!!(steps && steps.length));
+    }
+
     $('#test-connection').on('click', function () {
+        $('#diagnostics-table').hide();
         $('#status-message')
             .removeClass('alert-success alert-danger')
             .text('Probando conexión...')
             .addClass('alert-info')
             .show();
 
-        $.get('?action=test_connection', function (data) {
+        const params = { action: 'test_connection' };
+        if ($('#test-count-users').is(':checked')) {
+            params.count = 1;
+        }
+
+        $.get('', params, function (data) {
             const alertClass = data.success ? 'alert-success' : 'alert-danger';
+            let message = data.message;
+            if (data.user_count) {
+                message += ` Usuarios: ${data.user_count.exact ? '' : 'más de '}${data.user_count.count}.`;
+            }
             $('#status-message')
                 .removeClass('alert-info alert-success alert-danger')
                 .addClass(alertClass)
-                .text(data.message);
+                .text(message);
+            renderSteps(data.steps);
         }).fail(function (jqXHR) {
             $('#status-message')
                 .removeClass('alert-info alert-success')
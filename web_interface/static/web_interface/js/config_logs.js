@@ -0,0 +1,94 @@
+console.log("config_logs.js cargado");
+
+$(document).ready(function () {
+    // --- Activar ítem del sidebar ---
+    const currentPath = window.location.pathname;
+    $('.nav-item a').each(function () {
+        const href = $(this).attr('href') || '';
+        if (href === currentPath || currentPath.startsWith(href.replace(/\/$/, '') + '/')) {
+            $(this).addClass('active');
+            $(this).closest('.has-treeview').addClass('menu-open').find('> a').addClass('active');
+        }
+    });
+
+    function options(values, selected) {
+        return values.map(v => `<option value="${v}" ${v === selected ? 'selected' : ''}>${v}</option>`).join('');
+    }
+
+    function addRow(rule) {
+        rule = rule || { source: '*', level: '*', action: 'db' };
+        const row = $(`
+            <tr>
+                <td><input type="text" class="form-control form-control-sm rule-source"></td>
+                <td><select class="form-control form-control-sm rule-level">${options(LOG_LEVELS, rule.level)}</select></td>
+                <td><select class="form-control form-control-sm rule-action">${options(LOG_POLICY_ACTIONS, rule.action)}</select></td>
+                <td><input type="number" min="1" class="form-control form-control-sm rule-sample" value="${rule.sample_rate || 10}"></td>
+                <td><input type="number" min="0.001" step="any" class="form-control form-control-sm rule-rate" value="${rule.rate || 1}"></td>
+                <td><input type="number" min="1" class="form-control form-control-sm rule-burst" value="${rule.burst || 5}"></td>
+                <td><button type="button" class="btn btn-sm btn-danger remove-rule-btn"><i class="fas fa-trash"></i></button></td>
+            </tr>`);
+        row.find('.rule-source').val(rule.source);
+        $('#rules-body').append(row);
+        toggleFields(row);
+    }
+
+    // --- Mostrar solo los campos de la acción elegida ---
+    function toggleFields(row) {
+        const action = row.find('.rule-action').val();
+        row.find('.rule-sample').prop('disabled', action !== 'sample');
+        row.find('.rule-rate, .rule-burst').prop('disabled', action !== 'rate');
+    }
+
+    function collectRules() {
+        return $('#rules-body tr').map(function () {
+            const row = $(this);
+            const rule = {
+                source: row.find('.rule-source').val().trim() || '*',
+                level: row.find('.rule-level').val(),
+                action: row.find('.rule-action').val(),
+            };
+            if (rule.action === 'sample') rule.sample_rate = parseInt(row.find('.rule-sample').val(), 10);
+            if (rule.action === 'rate') {
+                rule.rate = parseFloat(row.find('.rule-rate').val());
+                rule.burst = parseInt(row.find('.rule-burst').val(), 10);
+            }
+            return rule;
+        }).get();
+    }
+
+    LOG_POLICY_RULES.forEach(addRow);
+
+    $('#add-rule-btn').on('click', function () { addRow(); });
+    $(document).on('click', '.remove-rule-btn', function () { $(this).closest('tr').remove(); });
+    $(document).on('change', '.rule-action', function () { toggleFields($(this).closest('tr')); });
+
+    // --- Guardar política ---
+    $('#save-policy-btn').on('click', function () {
+        $.post('', {
+            'action': 'save_policy',
+            'rules': JSON.stringify(collectRules()),
+            'csrfmiddlewaretoken': getCSRFToken()
+        }, function (data) {
+            if (data.status === 'success') {
+                toastr.success(data.message);
+            } else {
+                toastr.error('Error: ' + (data.message || 'Desconocido'));
+            }
+        }).fail(function (jqXHR) {
+            toastr.error('Error: ' + (jqXHR.responseJSON?.message || 'Verifique la consola'));
+        });
+    });
+
+    // --- Reiniciar contadores ---
+    $('#reset-counters-btn').on('click', function () {
+        $.post('', {
+            'action': 'reset_counters',
+            'csrfmiddlewaretoken': getCSRFToken()
+        }, function (data) {
+            toastr.success(data.message);
+            setTimeout(() => location.reload(), 800);
+        }).fail(function (jqXHR) {
+            toastr.error('Error: ' + (jqXHR.responseJSON?.message || 'Verifique la consola'));
+        });
+    });
+});
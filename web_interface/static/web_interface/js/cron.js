@@ -20,7 +20,7 @@ document.addEventListener('DOMContentLoaded', function () {
     document.querySelectorAll('.edit-cron-btn').forEach(btn => {
         btn.addEventListener('click', function () {
             const jobName = this.dataset.job;
-            fetch(`/services/cron/edit/${jobName}/`)
+            fetch(CRON_URLS.edit.replace('JOB', encodeURIComponent(jobName)))
                 .then(response => response.text())
                 .then(html => {
                     document.querySelector('#edit-cron-modal .modal-body').innerHTML = html;
@@ -41,7 +41,7 @@ document.addEventListener('DOMContentLoaded', function () {
         const jobName = $toggle.dataset.job;
         const isEnabled = $toggle.checked;
 
-        fetch('/services/cron/save/', {
+        fetch(CRON_URLS.save, {
             method: 'POST',
             headers: {
                 'X-CSRFToken': getCSRFToken(),
@@ -57,6 +57,7 @@ document.addEventListener('DOMContentLoaded', function () {
         .then(data => {
             if (data.status === 'success') {
                 toastr.success(data.message);
+                $toggle.closest('tr').querySelector('.cron-schedule').disabled = !isEnabled;
             } else {
                 toastr.error('Error: ' + data.message);
                 // ← Restaurar estado si falla
@@ -70,6 +71,36 @@ document.addEventListener('DOMContentLoaded', function () {
         });
     });
 
+    // ← "Ejecutar ahora": el planificador la recoge en su próxima revisión
+    document.querySelectorAll('.run-cron-btn').forEach(btn => {
+        btn.addEventListener('click', function () {
+            const jobName = this.dataset.job;
+            this.disabled = true;
+            fetch(CRON_URLS.run, {
+                method: 'POST',
+                headers: {
+                    'X-CSRFToken': getCSRFToken(),
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({ job: jobName })
+            })
+            .then(r => r.json())
+            .then(data => {
+                if (data.status === 'success') {
+                    toastr.success(data.message);
+                    setTimeout(() => location.reload(), 3000); // ← Muestra la ejecución en el historial
+                } else {
+                    toastr.error('Error: ' + data.message);
+                    this.disabled = false;
+                }
+            })
+            .catch(() => {
+                toastr.error('Error de conexión.');
+                this.disabled = false;
+            });
+        });
+    });
+
     // ✅ Botones rápidos y guardado
     document.addEventListener('click', function (e) {
         const modal = document.getElementById('edit-cron-modal');
@@ -84,7 +115,9 @@ document.addEventListener('DOMContentLoaded', function () {
         if (e.target.id === 'apply-schedule') {
             const value = scheduleInput.value.trim();
             if (value) {
-                modal.querySelector('input[name="schedule"]').value = value;
+                const jobName = modal.querySelector('#job-name').value;
+                const rowInput = document.querySelector(`.cron-schedule[data-job="${jobName}"]`);
+                if (rowInput) rowInput.value = value;
                 toastr.info('Programación aplicada.');
             }
         }
@@ -94,14 +127,16 @@ document.addEventListener('DOMContentLoaded', function () {
             const jobName = modal.querySelector('#job-name').value;
             const schedule = modal.querySelector('#manual-schedule').value;
             const enabled = modal.querySelector('#enable-job').checked;
+            const jitter_seconds = parseInt(modal.querySelector('#jitter-seconds').value || '0', 10);
+            const timeout_seconds = parseInt(modal.querySelector('#timeout-seconds').value || '0', 10);
 
-            fetch('/services/cron/save/', {
+            fetch(CRON_URLS.save, {
                 method: 'POST',
                 headers: {
                     'X-CSRFToken': getCSRFToken(),
                     'Content-Type': 'application/json'
                 },
-                body: JSON.stringify({ job: jobName, enabled, schedule })
+                body: JSON.stringify({ job: jobName, enabled, schedule, jitter_seconds, timeout_seconds })
             })
             .then(r => r.json())
             .then(data => {
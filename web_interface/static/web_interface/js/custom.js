@@ -25,6 +25,112 @@ $(document).ready(function () {
     // --- Inicializar interruptor de autenticación ---
     $('#enable_ad_admin_auth').prop('checked', typeof AUTH_ENABLED !== 'undefined' ? AUTH_ENABLED : false);
 
+    // --- Tabla de usuarios (búsqueda, orden y paginación en el servidor) ---
+    const userQuery = { q: '', origin: '', status: '', sort: 'username', page: 1 };
+    let searchTimer = null;
+
+    function escapeHtml(text) {
+        return $('<div>').text(text == null ? '' : String(text)).html();
+    }
+
+    function loadUsers() {
+        $.get(USERS_API_URL, userQuery, function (data) {
+            const $tbody = $('#users-body').empty();
+            const p = data.pagination;
+
+            data.users.forEach(user => {
+                const originClass = user.origin === 'AD' ? 'info' : 'primary';
+                $tbody.append(`
+                    <tr>
+                        <td>${escapeHtml(user.username)}</td>
+                        <td>${escapeHtml(user.first_name)} ${escapeHtml(user.last_name)}</td>
+                        <td>${escapeHtml(user.email || '-')}</td>
+                        <td><span class="badge bg-${originClass}">${user.origin}</span></td>
+                        <td>
+                            <button class="btn btn-xs btn-warning disable-user"
+                                    data-username="${escapeHtml(user.username)}"
+                                    data-is-active="${user.is_active}">
+                                <i class="fas fa-${user.is_active ? 'check' : 'times'}"></i>
+                            </button>
+                            ${p.total > 1 ? `
+                            <button class="btn btn-xs btn-danger delete-user"
+                                    data-username="${escapeHtml(user.username)}">
+                                <i class="fas fa-trash"></i>
+                            </button>` : ''}
+                        </td>
+                    </tr>`);
+            });
+            if (data.users.length === 0) {
+                $tbody.append('<tr><td colspan="5" class="text-center">No hay usuarios</td></tr>');
+            }
+
+            const $pagination = $('#users-pagination').empty();
+            const prevDisabled = p.has_previous ? '' : 'disabled';
+            const nextDisabled = p.has_next ? '' : 'disabled';
+            $pagination.append(`<li class="page-item ${prevDisabled}"><a class="page-link" href="#" data-page="1">&laquo;</a></li>`);
+            $pagination.append(`<li class="page-item ${prevDisabled}"><a class="page-link" href="#" data-page="${p.current_page - 1}">&lsaquo;</a></li>`);
+            $pagination.append(`<li class="page-item active"><span class="page-link">Página ${p.current_page} de ${p.num_pages} (${p.total} usuarios)</span></li>`);
+            $pagination.append(`<li class="page-item ${nextDisabled}"><a class="page-link" href="#" data-page="${p.current_page + 1}">&rsaquo;</a></li>`);
+            $pagination.append(`<li class="page-item ${nextDisabled}"><a class="page-link" href="#" data-page="${p.num_pages}">&raquo;</a></li>`);
+        }).fail(function (jqXHR) {
+            toastr.error('Error al cargar los usuarios: ' + (jqXHR.responseJSON?.error || 'Desconocido'));
+            console.error('Error AJAX (users_api):', jqXHR);
+        });
+    }
+
+    $('#user-search').on('input', function () {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => {
+            userQuery.q = $(this).val().trim();
+            userQuery.page = 1;
+            loadUsers();
+        }, 300);
+    });
+
+    $('#user-origin, #user-status').on('change', function () {
+        userQuery[this.id.replace('user-', '')] = $(this).val();
+        userQuery.page = 1;
+        loadUsers();
+    });
+
+    $('th.sortable').on('click', function () {
+        const field = $(this).data('sort');
+        userQuery.sort = userQuery.sort === field ? `-${field}` : field;
+        userQuery.page = 1;
+        $('th.sortable i').attr('class', 'fas fa-sort text-muted');
+        $(this).find('i').attr('class', userQuery.sort.startsWith('-') ? 'fas fa-sort-down' : 'fas fa-sort-up');
+        loadUsers();
+    });
+
+    $('#users-pagination').on('click', 'a.page-link', function (e) {
+        e.preventDefault();
+        if ($(this).parent().hasClass('disabled')) return;
+        userQuery.page = $(this).data('page');
+        loadUsers();
+    });
+
+    if (typeof USERS_API_URL !== 'undefined') {
+        loadUsers();
+    }
+
+    // --- Refrescar la lista del grupo AD (consulta AD en el momento) ---
+    $('#refresh-roster-btn').on('click', function () {
+        const $btn = $(this).prop('disabled', true);
+        $btn.find('i').addClass('fa-spin');
+
+        $.post('', {
+            'action': 'refresh_ad_roster',
+            'csrfmiddlewaretoken': getCSRFToken()
+        }, function (data) {
+            toastr.success(`Grupo AD actualizado: ${data.count} miembros.`);
+            location.reload();
+        }).fail(function (jqXHR) {
+            toastr.error('Error: ' + (jqXHR.responseJSON?.message || 'Desconocido'));
+            console.error('Error AJAX (refresh_ad_roster):', jqXHR);
+            $btn.prop('disabled', false).find('i').removeClass('fa-spin');
+        });
+    });
+
     // --- Botón para mostrar modal de importación ---
     $('#show-import-modal').on('click', function () {
         $('#importModal').modal('show');
@@ -59,6 +165,7 @@ $(document).ready(function () {
                         </tr>`;
                     $tbody.append(row);
                 });
+                $('#ad-users-refreshed').text(`Datos de AD del ${data.refreshed_at}`);
                 $('#step-users').show();
                 $('#confirm-import').show();
             } else {
@@ -110,7 +217,8 @@ $(document).ready(function () {
                 $('#step-loading').html(`
                     <div class="text-center text-success">
                         <i class="fas fa-check-circle" style="font-size: 48px;"></i>
-                        <p>¡Importados: ${data.count} usuarios!</p>
+                        <p>¡Importados: ${data.created} usuarios!</p>
+                        <p class="text-muted">Actualizados: ${data.updated} · Sin cambios: ${data.unchanged} · Descartados: ${data.skipped}</p>
                     </div>
                 `);
                 setTimeout(() => {
@@ -185,7 +293,7 @@ $(document).ready(function () {
             if (data.success) {
                 toastr.success('Usuario eliminado.');
                 $modal.modal('hide');
-                location.reload();
+                loadUsers();
             } else {
                 toastr.error('Error: ' + data.message);
             }
@@ -0,0 +1,35 @@
+// ← Suscripción al flujo de eventos del servidor (SSE) compartida por las páginas
+// Uso: LiveEvents.subscribe({ topics: ['stats'], source: 'telegram_bot' }, { stats: fn, logs: fn, status: fn });
+window.LiveEvents = (function () {
+    const EVENTS_URL = '/events/';
+
+    function subscribe(options, handlers) {
+        if (typeof EventSource === 'undefined') {
+            console.warn('live_events.js: EventSource no disponible en este navegador');
+            return null;
+        }
+
+        const params = new URLSearchParams();
+        if (options.topics) params.set('topics', options.topics.join(','));
+        if (options.source) params.set('source', options.source);
+
+        // ← El navegador reconecta solo y envía Last-Event-ID para no perder eventos
+        const source = new EventSource(EVENTS_URL + '?' + params.toString());
+        Object.keys(handlers).forEach(function (topic) {
+            source.addEventListener(topic, function (event) {
+                try {
+                    handlers[topic](JSON.parse(event.data));
+                } catch (e) {
+                    console.error(`live_events.js: error procesando '${topic}':`, e);
+                }
+            });
+        });
+        source.onerror = function () {
+            console.warn('live_events.js: conexión interrumpida, reintentando...');
+        };
+        $(window).on('beforeunload', function () { source.close(); });
+        return source;
+    }
+
+    return { subscribe: subscribe };
+})();
@@ -15,17 +15,31 @@ $(document).ready(function () {
     let autoRefresh = true;
     let refreshInterval;
 
-    // --- Función para cargar logs ---
-    function loadLogs() {
-        const params = new URLSearchParams({
+    // --- Estado de la paginación por cursor ---
+    // page: { cursor, direction, number } de la página mostrada (cursor null = la más reciente)
+    let page = { cursor: null, direction: "next", number: 1 };
+    let lastPagination = null;
+
+    // --- Filtros actuales (compartidos por la tabla y la exportación) ---
+    function filterParams() {
+        return new URLSearchParams({
             level: $("#filter-level").val(),
             source: $("#filter-source").val(),
             search: $("#search-input").val(),
             from_date: $("#from-date").val(),
             to_date: $("#to-date").val(),
-            page_size: $("#page-size").val(),
-            page: $(".page-item.active").data("page") || 1,
         });
+    }
+
+    // --- Función para cargar logs ---
+    function loadLogs() {
+        const params = filterParams();
+        params.set("page_size", $("#page-size").val());
+        params.set("page", page.number);
+        if (page.cursor) {
+            params.set("cursor", page.cursor);
+            params.set("direction", page.direction);
+        }
 
         $.getJSON(logsUrl + "?" + params, function (data) {
             const tbody = $("#logs-body");
@@ -57,29 +71,27 @@ $(document).ready(function () {
 
             const pagination = $("#pagination");
             pagination.empty();
+            lastPagination = data.pagination;
 
-            if (data.pagination.has_previous) {
-                pagination.append(
-                    `<li class="page-item"><a class="page-link" href="#" data-page="${
-                        data.pagination.current_page - 1
-                    }">&laquo;</a></li>`
-                );
-            }
-
-            for (let i = 1; i <= data.pagination.num_pages; i++) {
-                const active = i === data.pagination.current_page ? "active" : "";
-                pagination.append(
-                    `<li class="page-item ${active}" data-page="${i}"><a class="page-link" href="#">${i}</a></li>`
-                );
-            }
-
-            if (data.pagination.has_next) {
-                pagination.append(
-                    `<li class="page-item"><a class="page-link" href="#" data-page="${
-                        data.pagination.current_page + 1
-                    }">&raquo;</a></li>`
-                );
-            }
+            const p = data.pagination;
+            const prevDisabled = p.has_previous ? "" : "disabled";
+            const nextDisabled = p.has_next ? "" : "disabled";
+            const total = p.total_exact ? p.total : `~${p.total}`;
+
+            pagination.append(
+                `<li class="page-item ${prevDisabled}"><a class="page-link" href="#" data-nav="first">&laquo;</a></li>`
+            );
+            pagination.append(
+                `<li class="page-item ${prevDisabled}"><a class="page-link" href="#" data-nav="prev">&lsaquo;</a></li>`
+            );
+            pagination.append(
+                `<li class="page-item active"><span class="page-link">Página ${p.current_page} de ${
+                    p.total_exact ? "" : "~"
+                }${p.num_pages} (${total} registros)</span></li>`
+            );
+            pagination.append(
+                `<li class="page-item ${nextDisabled}"><a class="page-link" href="#" data-nav="next">&rsaquo;</a></li>`
+            );
         }).fail(function (jqXHR, textStatus, errorThrown) {
             console.error('Error AJAX:', textStatus, errorThrown);
             toastr.error('Error al cargar los logs.');
@@ -102,15 +114,43 @@ $(document).ready(function () {
 
     refreshInterval = setInterval(loadLogs, 30000);
 
-    $("#filter-level, #filter-source, #search-input, #from-date, #to-date, #page-size").change(loadLogs);
+    function resetPage() {
+        page = { cursor: null, direction: "next", number: 1 };
+    }
+
+    $("#filter-level, #filter-source, #search-input, #from-date, #to-date, #page-size").change(function () {
+        resetPage();
+        loadLogs();
+    });
 
-    $(document).on("click", ".page-link", function (e) {
+    $(document).on("click", ".page-link[data-nav]", function (e) {
         e.preventDefault();
-        $(".page-item").removeClass("active");
-        $(this).parent().addClass("active");
+        if ($(this).parent().hasClass("disabled") || !lastPagination) return;
+
+        const nav = $(this).data("nav");
+        if (nav === "first") {
+            resetPage();
+        } else if (nav === "next" && lastPagination.next_cursor) {
+            page = { cursor: lastPagination.next_cursor, direction: "next", number: page.number + 1 };
+        } else if (nav === "prev" && lastPagination.prev_cursor) {
+            page = { cursor: lastPagination.prev_cursor, direction: "prev", number: Math.max(1, page.number - 1) };
+        } else {
+            return;
+        }
         loadLogs();
     });
 
+    // --- Exportación (descarga en streaming con los filtros actuales) ---
+    $(".export-link").click(function (e) {
+        e.preventDefault();
+        const params = filterParams();
+        params.set("format", $(this).data("format"));
+        if ($("#export-gzip").is(":checked")) {
+            params.set("gzip", "1");
+        }
+        window.location.href = LOGS_EXPORT_URL + "?" + params;
+    });
+
     // --- Cargar logs al inicio ---
     loadLogs();
 });
\ No newline at end of file
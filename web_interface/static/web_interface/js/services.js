@@ -11,7 +11,6 @@ $(document).ready(function () {
     let botRunning = false;
     let startTime = null;
     let uptimeInterval = null; // ← ID del intervalo del contador
-    let statusInterval = null; // ← ID del intervalo de estado
     let lastKnownRunning = null;
 
     // ← Control de operación
@@ -169,26 +168,33 @@ $(document).ready(function () {
 
             const data = await response.json();
             if (data.status === 'success') {
-                const wasRunning = botRunning;
-                const oldStartTime = startTime;
+                applyStatus(data.data);
+            }
+        } catch (error) {
+            console.error('Error en getTelegramStatus:', error);
+        }
+    }
 
-                botRunning = data.data.running;
-                startTime = data.data.start_time;
+    // ← Aplicar un estado del bot (de la petición inicial o del flujo de eventos)
+    function applyStatus(status) {
+        if (isProcessing) return;
 
-                handleStatusChange(botRunning, startTime);
+        const wasRunning = botRunning;
+        const oldStartTime = startTime;
 
-                if (wasRunning !== botRunning || startTime !== oldStartTime) {
-                    restoreToggle(botRunning);
-                }
+        botRunning = status.running;
+        startTime = status.start_time;
 
-                if (botRunning && startTime) {
-                    startUptime();
-                } else {
-                    stopUptime();
-                }
-            }
-        } catch (error) {
-            console.error('Error en getTelegramStatus:', error);
+        handleStatusChange(botRunning, startTime);
+
+        if (wasRunning !== botRunning || startTime !== oldStartTime) {
+            restoreToggle(botRunning);
+        }
+
+        if (botRunning && startTime) {
+            startUptime();
+        } else {
+            stopUptime();
         }
     }
 
@@ -296,12 +302,11 @@ $(document).ready(function () {
     // ✅ Inicializar estado al cargar
     getTelegramStatus();
 
-    // ✅ Iniciar actualización automática cada 5 segundos
-    statusInterval = setInterval(getTelegramStatus, 5000);
+    // ✅ Recibir los cambios de estado por el flujo de eventos (sin sondeo)
+    LiveEvents.subscribe({ topics: ['status'] }, { status: applyStatus });
 
     // ✅ Limpieza opcional
     $(window).on('beforeunload', function () {
         clearInterval(uptimeInterval);
-        clearInterval(statusInterval);
     });
 });
\ No newline at end of file
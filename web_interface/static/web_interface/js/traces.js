@@ -0,0 +1,50 @@
+console.log("traces.js cargado");
+
+$(document).ready(function () {
+    // --- Activar ítem del sidebar ---
+    const currentPath = window.location.pathname;
+    $('.nav-item a').each(function () {
+        const href = $(this).attr('href') || '';
+        if (href === currentPath || currentPath.startsWith(href.replace(/\/$/, '') + '/')) {
+            $(this).addClass('active');
+            $(this).closest('.has-treeview').addClass('menu-open').find('> a').addClass('active');
+        }
+    });
+
+    const TRACES = JSON.parse(document.getElementById('traces-data').textContent);
+
+    function escapeHtml(text) {
+        return $('<div>').text(text == null ? '' : String(text)).html();
+    }
+
+    // --- Filas del árbol de spans (en profundidad, con sangría por nivel) ---
+    function spanRows(span, depth, total, rows) {
+        const left = total ? (span.offset_ms / total) * 100 : 0;
+        const width = total ? Math.max((span.duration_ms / total) * 100, 0.5) : 100;
+        const attrs = Object.entries(span.attrs || {}).map(([k, v]) => `${k}=${v}`).join(' ');
+        const barClass = span.error ? 'bg-danger' : (depth === 0 ? 'bg-primary' : 'bg-info');
+        rows.push(`
+            <tr title="${escapeHtml(span.error || attrs)}">
+                <td style="padding-left: ${0.5 + depth * 1.25}rem">
+                    ${escapeHtml(span.name)}
+                    ${span.error ? '<i class="fas fa-exclamation-triangle text-danger"></i>' : ''}
+                </td>
+                <td>${span.offset_ms.toFixed(0)} ms</td>
+                <td>${span.duration_ms.toFixed(0)} ms</td>
+                <td>
+                    <div class="progress progress-sm" style="background: transparent">
+                        <div class="progress-bar ${barClass}" style="margin-left: ${left}%; width: ${width}%"></div>
+                    </div>
+                </td>
+            </tr>`);
+        (span.children || []).forEach(child => spanRows(child, depth + 1, total, rows));
+        return rows;
+    }
+
+    $('.show-trace-btn').click(function () {
+        const trace = TRACES[$(this).data('index')];
+        $('#trace-modal-title').text(`${trace.name} · ${trace.duration_ms.toFixed(0)} ms · ${trace.trace_id}`);
+        $('#trace-spans').html(spanRows(trace.spans, 0, trace.spans.duration_ms, []).join(''));
+        $('#trace-modal').modal('show');
+    });
+});
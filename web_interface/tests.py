@@ -0,0 +1,342 @@
+# web_interface/tests.py
+"""
+Pruebas del planificador (expresiones cron y reclamación de tareas), de la
+paginación por cursor de los logs, del buscador de logs, de la política de
+logs y de la importación de administradores desde AD.
+"""
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from . import log_queries, scheduler as scheduler_module, user_import
+from .log_queries import InvalidCursor, decode_cursor, encode_cursor, estimate_count, keyset_page
+from .log_search import apply_search, index_entries, match_inserted_pks, parse_query
+from .models import ImportedADUser, JobRun, LogEntry, ScheduledJob
+from .scheduler import STALE_GRACE, CronExpression, Scheduler, validate_schedule
+from .user_import import import_ad_admins
+from .utils import LogPolicy, message_template
+
+
+def _local(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+class CronExpressionTests(TestCase):
+    def test_ranges_steps_and_lists(self):
+        cron = CronExpression('*/15 0-6/2 1,15 * *')
+        self.assertEqual(cron.minutes, {0, 15, 30, 45})
+        self.assertEqual(cron.hours, {0, 2, 4, 6})
+        self.assertEqual(cron.days, {1, 15})
+        # ← "5/15" equivale a "5-59/15"
+        self.assertEqual(CronExpression('5/15 * * * *').minutes, {5, 20, 35, 50})
+
+    def test_month_and_weekday_names(self):
+        cron = CronExpression('0 8 * JAN-mar Mon-Fri')
+        self.assertEqual(cron.months, {1, 2, 3})
+        self.assertEqual(cron.weekdays, {1, 2, 3, 4, 5})
+        # ← 7 también es domingo
+        self.assertEqual(CronExpression('0 0 * * 7').weekdays, {0})
+
+    def test_invalid_expressions(self):
+        for expression in ('0 0 * *', '60 * * * *', '5-1 * * * *', '*/0 * * * *', '0 0 * foo *'):
+            with self.subTest(expression=expression), self.assertRaises(ValueError):
+                CronExpression(expression)
+
+    def test_next_after(self):
+        # ← 2026-10-16 es viernes: la siguiente es el lunes a las 8:30
+        cron = CronExpression('30 8 * * mon-fri')
+        self.assertEqual(cron.next_after(_local(2026, 10, 16, 9, 0)), _local(2026, 10, 19, 8, 30))
+        self.assertEqual(cron.next_after(_local(2026, 10, 19, 8, 0)), _local(2026, 10, 19, 8, 30))
+
+    def test_day_of_month_or_day_of_week(self):
+        after = _local(2026, 10, 1, 12, 0)  # ← jueves
+        # ← Ambos restringidos: basta con que coincida uno (viernes 2 antes que el día 13)
+        self.assertEqual(CronExpression('0 0 13 * fri').next_after(after), _local(2026, 10, 2))
+        self.assertEqual(CronExpression('0 0 13 * fri').next_after(_local(2026, 10, 9, 12, 0)), _local(2026, 10, 13))
+        # ← Con uno de los dos en "*" manda el otro
+        self.assertEqual(CronExpression('0 0 13 * *').next_after(after), _local(2026, 10, 13))
+        self.assertEqual(CronExpression('0 0 * * fri').next_after(after), _local(2026, 10, 2))
+
+    def test_29_february(self):
+        cron = CronExpression('0 12 29 feb *')
+        self.assertEqual(cron.next_after(_local(2026, 3, 1)), _local(2028, 2, 29, 12, 0))
+
+    def test_31_february_is_rejected(self):
+        with self.assertRaises(ValueError):
+            CronExpression('0 0 31 2 *').next_after(_local(2026, 1, 1))
+        with self.assertRaises(ValueError):
+            validate_schedule('0 0 31 2 *')
+        self.assertEqual(validate_schedule(' 0  8 * * * '), '0 8 * * *')
+
+
+class _InlineExecutor:
+    """Ejecuta cada tarea en el acto (o la guarda si `defer`) en lugar de en el pool de hilos."""
+
+    def __init__(self, defer=False):
+        self.defer = defer
+        self.pending = []
+
+    def submit(self, fn, *args):
+        if self.defer:
+            self.pending.append((fn, args))
+        else:
+            fn(*args)
+
+    def shutdown(self, **kwargs):
+        pass
+
+
+@mock.patch.object(scheduler_module, 'log_event')
+@mock.patch.object(scheduler_module, 'close_old_connections')
+@mock.patch.object(scheduler_module, '_run_command', return_value=(3, 'hecho'))
+class SchedulerClaimTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.job = ScheduledJob.objects.create(
+            name='sync_users', schedule='0 */6 * * *', enabled=True,
+            timeout_seconds=60, next_run_at=self.now - timedelta(minutes=1),
+        )
+        self.scheduler = Scheduler()
+        self.scheduler._executor = _InlineExecutor()
+
+    def test_due_job_runs_and_is_rescheduled(self, run_command, *_):
+        self.assertEqual(self.scheduler.run_pending(self.now), ['sync_users'])
+
+        run = JobRun.objects.get(job=self.job)
+        self.assertEqual((run.status, run.rows, run.output), ('ok', 3, 'hecho'))
+        self.job.refresh_from_db()
+        self.assertIsNone(self.job.running_since)
+        self.assertGreater(self.job.next_run_at, self.now)
+        # ← Ya no está vencida: el siguiente tick no la repite
+        self.assertEqual(self.scheduler.run_pending(self.now), [])
+        run_command.assert_called_once_with('sync_users')
+
+    def test_running_elsewhere_is_skipped(self, run_command, *_):
+        ScheduledJob.objects.filter(pk=self.job.pk).update(running_since=self.now - timedelta(seconds=10))
+
+        self.assertEqual(self.scheduler.run_pending(self.now), [])
+
+        run = JobRun.objects.get(job=self.job)
+        self.assertEqual(run.status, 'skipped')
+        self.job.refresh_from_db()
+        self.assertGreater(self.job.next_run_at, self.now)
+        run_command.assert_not_called()
+
+    def test_stale_claim_is_reclaimed_and_orphan_closed(self, run_command, *_):
+        stale = self.now - timedelta(seconds=self.job.timeout_seconds + STALE_GRACE + 1)
+        ScheduledJob.objects.filter(pk=self.job.pk).update(running_since=stale)
+        orphan = JobRun.objects.create(job=self.job, started_at=stale, status='running', worker='otro:1')
+
+        self.assertEqual(self.scheduler.run_pending(self.now), ['sync_users'])
+
+        orphan.refresh_from_db()
+        self.assertEqual(orphan.status, 'error')
+        self.assertIn('Abandonada', orphan.output)
+        self.assertEqual(orphan.finished_at, self.now)
+        self.assertEqual(JobRun.objects.filter(job=self.job, status='ok').count(), 1)
+        run_command.assert_called_once()
+
+    def test_manual_request_runs_disabled_job(self, *_):
+        ScheduledJob.objects.filter(pk=self.job.pk).update(enabled=False, next_run_at=None, run_requested=True)
+
+        self.assertEqual(self.scheduler.run_pending(self.now), ['sync_users'])
+
+        self.assertEqual(JobRun.objects.get(job=self.job).trigger, 'manual')
+        self.job.refresh_from_db()
+        self.assertFalse(self.job.run_requested)
+        self.assertIsNone(self.job.next_run_at)
+
+    def test_timeout_then_finish_keeps_timeout(self, *_):
+        self.scheduler._executor = _InlineExecutor(defer=True)
+        self.assertEqual(self.scheduler.run_pending(self.now), ['sync_users'])
+        run = JobRun.objects.get(job=self.job)
+
+        # ← Sin llegar al límite no se toca
+        self.scheduler._check_timeouts(self.now + timedelta(seconds=30))
+        run.refresh_from_db()
+        self.assertEqual(run.status, 'running')
+
+        self.scheduler._check_timeouts(self.now + timedelta(seconds=61))
+        run.refresh_from_db()
+        self.assertEqual(run.status, 'timeout')
+        # ← Mientras el hilo sigue, la tarea sigue reclamada
+        self.job.refresh_from_db()
+        self.assertIsNotNone(self.job.running_since)
+
+        fn, args = self.scheduler._executor.pending.pop()
+        fn(*args)
+
+        run.refresh_from_db()
+        self.assertEqual(run.status, 'timeout')
+        self.assertEqual(run.rows, 3)
+        self.assertIsNotNone(run.finished_at)
+        self.job.refresh_from_db()
+        self.assertIsNone(self.job.running_since)
+        self.assertEqual(self.scheduler._running, {})
+
+
+class KeysetPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        base = timezone.now().replace(microsecond=0)
+        # ← Dos pares con el mismo timestamp: el desempate por id no debe perder ni repetir filas
+        offsets = [0, 1, 1, 2, 3, 3, 4]
+        self.logs = [
+            LogEntry.objects.create(level='INFO', source='test', message=f'log {i}', timestamp=base + timedelta(seconds=s))
+            for i, s in enumerate(offsets)
+        ]
+        self.newest_first = sorted(self.logs, key=lambda log: (log.timestamp, log.pk), reverse=True)
+
+    def _ids(self, rows):
+        return [row.pk for row in rows]
+
+    def test_walks_forward_and_back(self):
+        queryset = LogEntry.objects.all()
+        seen = []
+        rows, has_next, has_previous = keyset_page(queryset, 3)
+        pages = [rows]
+        self.assertEqual((has_next, has_previous), (True, False))
+        while has_next:
+            rows, has_next, has_previous = keyset_page(queryset, 3, encode_cursor(rows[-1]), 'next')
+            self.assertTrue(has_previous)
+            pages.append(rows)
+        for page in pages:
+            seen.extend(self._ids(page))
+        self.assertEqual(seen, self._ids(self.newest_first))
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+
+        # ← Hacia atrás desde la última página se recupera la anterior tal cual
+        rows, has_next, has_previous = keyset_page(queryset, 3, encode_cursor(pages[2][0]), 'prev')
+        self.assertEqual(self._ids(rows), self._ids(pages[1]))
+        self.assertEqual((has_next, has_previous), (True, True))
+        rows, _, has_previous = keyset_page(queryset, 3, encode_cursor(pages[1][0]), 'prev')
+        self.assertEqual(self._ids(rows), self._ids(pages[0]))
+        self.assertFalse(has_previous)
+
+    def test_cursor_round_trip_and_invalid(self):
+        log = self.logs[2]
+        self.assertEqual(decode_cursor(encode_cursor(log)), (log.timestamp, log.pk))
+        for cursor in ('', 'no-es-un-cursor', 'YWJj'):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+    def test_estimate_count_is_capped(self):
+        params = {'source': 'test'}
+        self.assertEqual(estimate_count(LogEntry.objects.all(), params), (7, True))
+        cache.clear()
+        with mock.patch.object(log_queries, 'COUNT_LIMIT', 5):
+            self.assertEqual(estimate_count(LogEntry.objects.all(), params), (5, False))
+
+
+class LogSearchTests(TestCase):
+    def test_parse_query(self):
+        self.assertEqual(
+            parse_query('Conexión LDAP* "sesión  iniciada" "Ldap" x'),
+            [('prefix', 'conexion'), ('prefix', 'ldap'), ('phrase', ['sesion', 'iniciada']), ('word', 'ldap')],
+        )
+        self.assertEqual(parse_query('a ! ""'), [])
+        self.assertEqual(len(parse_query(' '.join(f'palabra{i}' for i in range(20)))), 8)
+
+    def test_apply_search_uses_index(self):
+        entries = [
+            LogEntry.objects.create(level='INFO', source='bot', message='Sesión iniciada por juan'),
+            LogEntry.objects.create(level='ERROR', source='ad', message='Conexión LDAP rechazada'),
+            LogEntry.objects.create(level='INFO', source='bot', message='Iniciada la sesión de ana'),
+        ]
+        index_entries(entries)
+
+        def search(text):
+            return sorted(apply_search(LogEntry.objects.all(), text).values_list('message', flat=True))
+
+        self.assertEqual(search('conex'), ['Conexión LDAP rechazada'])
+        self.assertEqual(search('sesion inic'), ['Iniciada la sesión de ana', 'Sesión iniciada por juan'])
+        self.assertEqual(search('"sesión iniciada"'), ['Sesión iniciada por juan'])
+        self.assertEqual(search('"ldap"'), ['Conexión LDAP rechazada'])
+        self.assertEqual(search('"lda"'), [])
+
+    def test_match_inserted_pks_with_duplicates_and_gaps(self):
+        timestamp = timezone.now()
+        other = LogEntry.objects.create(level='INFO', source='web', message='de otro proceso', timestamp=timestamp)
+        rows = [
+            LogEntry.objects.create(level='INFO', source='bot', message='repetido', timestamp=timestamp)
+            for _ in range(2)
+        ]
+        entries = [LogEntry(level='INFO', source='bot', message='repetido', timestamp=timestamp) for _ in range(2)]
+        entries.append(LogEntry(level='INFO', source='bot', message='sin fila', timestamp=timestamp))
+
+        match_inserted_pks(entries, other.pk)
+
+        self.assertEqual([entry.pk for entry in entries], [rows[0].pk, rows[1].pk, None])
+
+
+class LogPolicyTests(TestCase):
+    def test_no_rules_stores_everything(self):
+        policy = LogPolicy()
+        self.assertEqual(policy.decide('DEBUG', 'detalle', 'bot'), 'db')
+        self.assertEqual(policy.counters, {'bot|DEBUG': {'db': 1}})
+
+    def test_most_specific_rule_wins(self):
+        policy = LogPolicy([
+            {'source': '*', 'level': '*', 'action': 'file'},
+            {'source': '*', 'level': 'ERROR', 'action': 'db'},
+            {'source': 'bot', 'action': 'drop'},
+            {'source': 'bot', 'level': 'CRITICAL', 'action': 'db'},
+        ])
+        self.assertEqual(policy.decide('INFO', 'x', 'web'), 'file')
+        self.assertEqual(policy.decide('ERROR', 'x', 'web'), 'db')
+        self.assertEqual(policy.decide('ERROR', 'x', 'bot'), 'drop')
+        self.assertEqual(policy.decide('CRITICAL', 'x', 'bot'), 'db')
+
+    def test_sample_keeps_one_in_n(self):
+        policy = LogPolicy([{'source': 'bot', 'level': 'INFO', 'action': 'sample', 'sample_rate': 3}])
+        decisions = [policy.decide('INFO', f'mensaje {i}', 'bot') for i in range(7)]
+        self.assertEqual(decisions, ['db', 'file', 'file', 'db', 'file', 'file', 'db'])
+        self.assertEqual(policy.counters['bot|INFO'], {'db': 3, 'sampled_out': 4})
+
+    def test_rate_limits_per_template(self):
+        policy = LogPolicy([{'source': 'bot', 'action': 'rate', 'rate': 0.001, 'burst': 2}])
+        decisions = [policy.decide('INFO', f'Email recibido: user{i}@example.com', 'bot') for i in range(4)]
+        self.assertEqual(decisions, ['db', 'db', 'file', 'file'])
+        # ← Otra plantilla tiene su propio cubo
+        self.assertEqual(policy.decide('INFO', 'Otro mensaje', 'bot'), 'db')
+        self.assertEqual(policy.counters['bot|INFO']['rate_limited'], 2)
+
+    def test_message_template(self):
+        self.assertEqual(message_template("Email recibido: a.b@x.cu (intento 3) 'hola'"),
+                         'Email recibido: <email> (intento <n>) <str>')
+
+    def test_validate_rejects_bad_rules(self):
+        for rules in ({'action': 'db'}, ['db'], [{'action': 'borrar'}]):
+            with self.subTest(rules=rules), self.assertRaises(ValueError):
+                LogPolicy.validate(rules)
+        self.assertEqual(
+            LogPolicy.validate([{'level': 'info', 'action': 'sample'}]),
+            [{'source': '*', 'level': 'INFO', 'action': 'sample', 'sample_rate': 10}],
+        )
+
+
+@mock.patch.object(user_import, 'log_event')
+class ImportADAdminsTests(TestCase):
+    def test_existing_user_matches_case_insensitively(self, _):
+        existing = User.objects.create_user('JPerez', email='viejo@example.com')
+
+        result = import_ad_admins([
+            {'username': 'jperez', 'first_name': 'Juan', 'email': 'jperez@example.com'},
+            {'username': 'JPEREZ', 'first_name': 'Otro'},
+            {'username': 'amaria', 'first_name': 'Ana'},
+        ], imported_by='admin')
+
+        self.assertEqual((result['created'], result['updated'], result['skipped']), (1, 1, 1))
+        self.assertEqual(sorted(User.objects.values_list('username', flat=True)), ['JPerez', 'amaria'])
+        existing.refresh_from_db()
+        self.assertEqual((existing.email, existing.is_superuser), ('jperez@example.com', True))
+        self.assertEqual(ImportedADUser.objects.count(), 2)
+
+        # ← Repetir la importación no cambia nada
+        again = import_ad_admins([{'username': 'JPEREZ', 'first_name': 'Juan', 'email': 'jperez@example.com'}], 'admin')
+        self.assertEqual(again['unchanged'], 1)
+        self.assertEqual(User.objects.count(), 2)
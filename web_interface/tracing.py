@@ -0,0 +1,160 @@
+# web_interface/tracing.py
+"""
+Trazas ligeras por actualización de Telegram.
+
+Cada handler del bot abre una traza (`trace`) y cada llamada medida con
+`metrics.timer`/`metrics.timed` (AD, base de datos, SMTP) añade un span hijo, de
+modo que el árbol muestra en qué se fue el tiempo. El span actual viaja en un
+ContextVar, así que sobrevive a `await` y a `sync_to_async` (que copia el
+contexto al hilo).
+
+Las trazas que superan TRACE_SLOW_MS se guardan completas en `SlowTrace` desde
+un hilo aparte; el resto se descarta al terminar. Sin traza activa, `span` no
+hace nada.
+"""
+import contextvars
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+
+from .env_config import env_config
+
+logger = logging.getLogger(__name__)
+
+MAX_SPANS = 500  # ← por traza, para acotar la memoria de bucles largos
+
+_current = contextvars.ContextVar('tbot_span', default=None)
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-traces')
+
+
+def slow_ms() -> float:
+    """Umbral de traza lenta (TRACE_SLOW_MS); se relee de .env sin reiniciar."""
+    return float(env_config.get_int('TRACE_SLOW_MS', 2000))
+
+
+def keep_count() -> int:
+    """Trazas lentas conservadas en la DB (TRACE_KEEP)."""
+    return env_config.get_int('TRACE_KEEP', 500)
+
+
+class Span:
+    __slots__ = ('name', 'attrs', 'start', 'end', 'children', 'error', 'root')
+
+    def __init__(self, name, attrs, root=None):
+        self.name = name
+        self.attrs = {k: v for k, v in attrs.items() if v is not None}
+        self.start = time.perf_counter()
+        self.end = None
+        self.children = []
+        self.error = None
+        self.root = root or self
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+    def to_dict(self, origin: float) -> dict:
+        return {
+            'name': self.name,
+            'offset_ms': round((self.start - origin) * 1000, 2),
+            'duration_ms': round(self.duration_ms, 2),
+            'attrs': self.attrs,
+            'error': self.error,
+            'children': [child.to_dict(origin) for child in self.children],
+        }
+
+
+class Trace(Span):
+    __slots__ = ('trace_id', 'started_at', 'span_count')
+
+    def __init__(self, name, attrs):
+        super().__init__(name, attrs)
+        self.trace_id = uuid.uuid4().hex
+        self.started_at = datetime.now(dt_timezone.utc)
+        self.span_count = 1
+
+
+def current_trace_id():
+    span = _current.get()
+    return span.root.trace_id if span is not None else None
+
+
+@contextmanager
+def trace(name, **attrs):
+    """Abre la traza raíz (una por actualización de Telegram)."""
+    root = Trace(name, attrs)
+    token = _current.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.error = f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        root.end = time.perf_counter()
+        _current.reset(token)
+        _finish(root)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Span hijo del actual; no hace nada fuera de una traza."""
+    parent = _current.get()
+    if parent is None or parent.root.span_count >= MAX_SPANS:
+        yield None
+        return
+    child = Span(name, attrs, root=parent.root)
+    parent.root.span_count += 1
+    parent.children.append(child)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        child.end = time.perf_counter()
+        _current.reset(token)
+
+
+# --- Trazas lentas ---
+
+def _finish(root: Trace) -> None:
+    duration = root.duration_ms
+    if duration < slow_ms():
+        return
+    logger.warning(f"Traza lenta {root.trace_id} ({root.name}): {duration:.0f} ms")
+    try:
+        _writer.submit(_store, root)
+    except RuntimeError:
+        pass  # ← el intérprete se está cerrando
+
+
+def _store(root: Trace) -> None:
+    from django.db import close_old_connections
+    from .models import SlowTrace
+
+    close_old_connections()
+    try:
+        SlowTrace.objects.create(
+            trace_id=root.trace_id,
+            name=root.name[:100],
+            started_at=root.started_at,
+            duration_ms=round(root.duration_ms, 2),
+            error=bool(root.error or _has_error(root)),
+            user_id=str(root.attrs.get('user_id', ''))[:50],
+            spans=root.to_dict(root.start),
+        )
+        # ← Conservar solo las TRACE_KEEP más recientes
+        keep = keep_count()
+        cutoff = list(SlowTrace.objects.order_by('-id').values_list('id', flat=True)[keep:keep + 1])
+        if cutoff:
+            SlowTrace.objects.filter(id__lte=cutoff[0]).delete()
+    except Exception as e:
+        logger.warning(f"No se pudo guardar la traza {root.trace_id}: {e}")
+
+
+def _has_error(span: Span) -> bool:
+    return bool(span.error) or any(_has_error(child) for child in span.children)
@@ -11,21 +11,25 @@
     path('dashboard/', views.dashboard_view, name='dashboard'),
     path('logout/', views.logout_view, name='logout'),
     path('logs/', views.logs_view, name='logs'),
+    path('logs/export/', views.logs_export, name='logs_export'),
+    path('traces/', views.traces_view, name='traces'),
     
     # Configuración
     path('config/telegram/', views.config_telegram_view, name='config_telegram'),
     path('monitor/telegram/', views.monitor_telegram_view, name='monitor_telegram'),
     path('config/email/', views.config_email_view, name='config_email'),
-    path('config/cron/', views.dashboard_view, name='config_cron'),
     path('config/todus/', views.dashboard_view, name='config_todus'),
     path('config/ad/', views.config_ad_view, name='config_ad'),  # ← Añade esta línea
+    path('config/logs/', views.config_logs_view, name='config_logs'),
     path('users/', views.users_view, name='users'),  # ← Vista de usuarios
+    path('users/api/', views.users_api, name='users_api'),
     
     # servicios_telegram
     path('services/', views.services_view, name='services'),
     path('services/telegram/start/', views.telegram_start, name='telegram_start'),
     path('services/telegram/stop/', views.telegram_stop, name='telegram_stop'),
     path('services/telegram/status/', views.telegram_status, name='telegram_status'),
+    path('services/telegram/restart/', views.telegram_restart, name='telegram_restart'),
     path('services/telegram/toggle/', views.toggle_telegram, name='toggle_telegram'),
     path('services/telegram/set_auto_start/', views.set_auto_start_linux, name='set_auto_start_linux'),
     path('services/telegram/auto_start/enable/', views.set_auto_start_enable, name='set_auto_start_enable'),
@@ -34,6 +38,9 @@
     # Rutas Dashboard
     path('dashboard/', views.dashboard_view, name='dashboard'),
     path('dashboard/stats/', views.get_stats, name='get_status'),
+    path('dashboard/activity/', views.get_activity, name='get_activity'),
+    path('events/', views.events_stream, name='events'),
+    path('metrics', views.metrics_view, name='metrics'),
     
     # Notificaciones
     path('notid/email/', views.config_email_view, name='notif_email'),
@@ -43,4 +50,5 @@
     path('config/cron/', views.cron_view, name='cron_view'),
     path('config/cron/edit/<str:job>/', views.edit_cron_job, name='edit_cron_job'),
     path('config/cron/save/', views.save_cron_job, name='save_cron_job'),
+    path('config/cron/run/', views.run_cron_job, name='run_cron_job'),
 ]
\ No newline at end of file
@@ -0,0 +1,123 @@
+# web_interface/user_import.py
+"""
+Importación en bloque de administradores desde el grupo AD.
+
+Los usuarios existentes se leen en una sola consulta y los cambios se aplican
+con bulk_create/bulk_update dentro de una transacción: o se importa todo el lote
+o nada. Se devuelve el resultado por usuario y se registra un único evento de
+auditoría con el resumen.
+"""
+import logging
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from .models import ImportedADUser
+from .utils import log_event
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+UPDATE_FIELDS = ['first_name', 'last_name', 'email', 'is_staff', 'is_superuser']
+BATCH_SIZE = 500
+
+
+def _by_username(usernames):
+    """Usuarios cuyo username coincide sin distinguir mayúsculas (la intercalación puede distinguirlas)."""
+    return User.objects.annotate(username_lower=Lower('username')).filter(
+        username_lower__in=[username.lower() for username in usernames]
+    )
+
+
+def _normalize(selected_users):
+    """Limpia la selección del modal; devuelve (válidos, resultados de los descartados)."""
+    valid, results, seen = [], [], set()
+    for user_data in selected_users:
+        if not isinstance(user_data, dict):
+            continue
+        username = (user_data.get('username') or '').strip()
+        if not username:
+            continue
+        if username.lower() in seen:
+            results.append({'username': username, 'result': 'skipped', 'message': 'Duplicado en la selección'})
+            continue
+        if len(username) > 150:
+            results.append({'username': username, 'result': 'error', 'message': 'Nombre de usuario demasiado largo'})
+            continue
+        seen.add(username.lower())
+        valid.append({
+            'username': username,
+            'first_name': (user_data.get('first_name') or '')[:150],
+            'last_name': (user_data.get('last_name') or '')[:150],
+            'email': (user_data.get('email') or '')[:254],
+        })
+    return valid, results
+
+
+def import_ad_admins(selected_users, imported_by: str, group_dn: str = '') -> dict:
+    """
+    Crea o actualiza como superusuarios los usuarios seleccionados del grupo AD.
+    Devuelve {'created', 'updated', 'unchanged', 'results': [{'username', 'result', ...}]}.
+    """
+    valid, results = _normalize(selected_users)
+
+    with transaction.atomic():
+        existing = {}
+        # ← Si ya hay varios que solo difieren en mayúsculas, se actualiza el más antiguo
+        for user in _by_username(u['username'] for u in valid).order_by('id'):
+            existing.setdefault(user.username.lower(), user)
+        to_create, to_update = [], []
+
+        for data in valid:
+            user = existing.get(data['username'].lower())
+            if user is None:
+                user = User(username=data['username'], is_active=True, password=make_password(None))
+                for field in ('first_name', 'last_name', 'email'):
+                    setattr(user, field, data[field])
+                user.is_staff = user.is_superuser = True
+                to_create.append(user)
+                results.append({'username': user.username, 'result': 'created'})
+                continue
+
+            changes = {field: data[field] for field in ('first_name', 'last_name', 'email')}
+            changes.update(is_staff=True, is_superuser=True)
+            if all(getattr(user, field) == value for field, value in changes.items()):
+                results.append({'username': user.username, 'result': 'unchanged'})
+            else:
+                for field, value in changes.items():
+                    setattr(user, field, value)
+                to_update.append(user)
+                results.append({'username': user.username, 'result': 'updated'})
+
+        User.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+        User.objects.bulk_update(to_update, UPDATE_FIELDS, batch_size=BATCH_SIZE)
+
+        # ← MySQL no devuelve los ids de bulk_create: se leen de nuevo para la marca de importación
+        user_ids = [user.pk for user in existing.values()]
+        user_ids += list(User.objects.filter(username__in=[user.username for user in to_create]).values_list('id', flat=True))
+        ImportedADUser.objects.bulk_create(
+            [ImportedADUser(user_id=user_id, group_dn=group_dn or '', imported_by=imported_by) for user_id in user_ids],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,  # ← los ya marcados conservan su fecha de importación
+        )
+
+    counts = Counter(r['result'] for r in results)
+    summary = {
+        'created': counts['created'],
+        'updated': counts['updated'],
+        'unchanged': counts['unchanged'],
+        'skipped': counts['skipped'] + counts['error'],
+    }
+    created_names = [r['username'] for r in results if r['result'] == 'created']
+    log_event(
+        'INFO',
+        f"Importación del grupo AD por '{imported_by}': {summary['created']} creados, "
+        f"{summary['updated']} actualizados, {summary['unchanged']} sin cambios, {summary['skipped']} descartados."
+        + (f" Nuevos: {', '.join(created_names[:20])}{'…' if len(created_names) > 20 else ''}" if created_names else ''),
+        'users_view'
+    )
+    return {**summary, 'results': results}
@@ -0,0 +1,106 @@
+# web_interface/user_queries.py
+"""
+Consultas de la lista de usuarios web (página de usuarios).
+
+El origen ("AD" o "Local") se calcula en la base de datos con una anotación:
+es AD si el email pertenece a AD_DOMAIN, si el usuario se importó del grupo
+(`ImportedADUser`) o si figura en la última lista cacheada del grupo
+(`ad_roster`). Así la búsqueda, el orden y el filtro por origen se resuelven en
+la misma consulta paginada, sin recorrer los usuarios en Python.
+"""
+from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from django.db.models import Case, Q, Value, When
+from django.db.models.functions import Lower
+
+from .env_config import env_config
+from .log_queries import get_page_size
+
+User = get_user_model()
+
+# ← Columnas por las que se puede ordenar (nombre en la API → campo)
+SORT_FIELDS = {
+    'username': 'username',
+    'name': 'first_name',
+    'email': 'email',
+    'origin': 'origin',
+    'is_active': 'is_active',
+    'last_login': 'last_login',
+    'date_joined': 'date_joined',
+}
+DEFAULT_SORT = 'username'
+
+
+def origin_condition(ad_usernames=()) -> Q:
+    """Condición SQL de usuario con origen AD."""
+    condition = Q(ad_import__isnull=False)
+    ad_domain = env_config.get('AD_DOMAIN', '').strip().lower()
+    if ad_domain:
+        condition |= Q(email__iendswith=f'@{ad_domain}')
+    if ad_usernames:
+        condition |= Q(username_lower__in=[u.lower() for u in ad_usernames]) & ~Q(username='admin')
+    return condition
+
+
+def annotate_users(queryset=None, ad_usernames=()):
+    users = User.objects.all() if queryset is None else queryset
+    return users.annotate(username_lower=Lower('username')).annotate(
+        origin=Case(
+            When(origin_condition(ad_usernames), then=Value('AD')),
+            default=Value('Local'),
+        )
+    )
+
+
+def filter_users(params, ad_usernames=()):
+    """Aplica búsqueda (`q`), filtros (`origin`, `status`) y orden (`sort`, `-campo` descendente)."""
+    users = annotate_users(ad_usernames=ad_usernames)
+
+    q = (params.get('q') or '').strip()
+    if q:
+        users = users.filter(
+            Q(username__icontains=q) | Q(first_name__icontains=q)
+            | Q(last_name__icontains=q) | Q(email__icontains=q)
+        )
+    origin = params.get('origin')
+    if origin in ('AD', 'Local'):
+        users = users.filter(origin=origin)
+    status = params.get('status')
+    if status == 'active':
+        users = users.filter(is_active=True)
+    elif status == 'inactive':
+        users = users.filter(is_active=False)
+
+    sort = params.get('sort') or DEFAULT_SORT
+    descending = sort.startswith('-')
+    field = SORT_FIELDS.get(sort.lstrip('-'))
+    if field is None:
+        raise ValueError(f"Orden no soportado: {sort}")
+    order = f"-{field}" if descending else field
+    # ← El id desempata para que la paginación por OFFSET sea estable
+    return users.order_by(order, '-id' if descending else 'id')
+
+
+def user_page(params, ad_usernames=()) -> dict:
+    users = filter_users(params, ad_usernames).values(
+        'id', 'username', 'first_name', 'last_name', 'email', 'is_active', 'last_login', 'origin'
+    )
+    paginator = Paginator(users, get_page_size(params.get('page_size')))
+    page = paginator.get_page(params.get('page'))
+    return {
+        'users': [
+            {
+                **user,
+                'last_login': user['last_login'].isoformat() if user['last_login'] else None,
+            }
+            for user in page
+        ],
+        'pagination': {
+            'current_page': page.number,
+            'num_pages': paginator.num_pages,
+            'total': paginator.count,
+            'page_size': paginator.per_page,
+            'has_next': page.has_next(),
+            'has_previous': page.has_previous(),
+        },
+    }
@@ -1,37 +1,437 @@
+import atexit
+import json
 import logging
-from datetime import datetime
-from pathlib import Path
+import queue
+import re
+import sys
+import threading
+import time
 import os
-from dotenv import load_dotenv, set_key, get_key
+from collections import Counter
+from django.utils import timezone
 
+from . import metrics
+from .env_config import env_config
+from .logging_setup import logging_stats
 
+
+# ← Fichero y consola se configuran en logging_setup (LOGGING en settings.py)
 logger = logging.getLogger(__name__)
 
-# Asegúrate de que el directorio logs/ exista
-LOG_DIR = Path(__file__).resolve().parent.parent / "logs"
-LOG_FILE = LOG_DIR / "app.log"
+# ← Parámetros del buffer de logs hacia la base de datos
+LOG_SINK_FLUSH_INTERVAL = int(os.getenv('LOG_SINK_FLUSH_INTERVAL_MS', 500)) / 1000
+LOG_SINK_BATCH_SIZE = int(os.getenv('LOG_SINK_BATCH_SIZE', 200))
+LOG_SINK_MAX_QUEUE = int(os.getenv('LOG_SINK_MAX_QUEUE', 10000))
+LOG_SINK_RETRY_AFTER = 30  # segundos sin intentar la DB tras un fallo
+
+
+class LogSink:
+    """
+    Acumula entradas de log y las guarda con `bulk_create` desde un hilo propio,
+    cada LOG_SINK_FLUSH_INTERVAL segundos o al llegar a LOG_SINK_BATCH_SIZE entradas.
+    Los eventos que la política deja solo en fichero o descarta no pasan por la
+    cola (una ráfaga de ruido la llenaría y desplazaría a los errores): `count()`
+    los suma a un contador por clave de resumen que este mismo hilo vuelca en los
+    resúmenes por hora (log_rollups). Si la base de datos no está disponible, las
+    entradas quedan solo en el fichero y se cuentan en `dropped`.
+    """
+
+    def __init__(self, flush_interval=LOG_SINK_FLUSH_INTERVAL, batch_size=LOG_SINK_BATCH_SIZE,
+                 max_queue=LOG_SINK_MAX_QUEUE):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._counts_lock = threading.Lock()
+        self._suppressed = Counter()  # ← (hora, nivel, origen, tipo) → eventos no guardados
+        self.db_disabled_until = 0.0
+        self.written = 0
+        self.dropped = 0
+        self.db_failures = 0
+
+    def _ensure_started(self):
+        # ← Arranque perezoso; también tras un fork (p. ej. workers de gunicorn)
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='log-sink', daemon=True)
+            self._thread.start()
+
+    def put(self, level, message, source):
+        if time.monotonic() < self.db_disabled_until:
+            self.dropped += 1
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((level, message, source, timezone.now()))
+        except queue.Full:
+            self.dropped += 1
+
+    def count(self, level, message, source):
+        """Cuenta en los resúmenes un evento que no se guarda en la base de datos."""
+        from web_interface.log_rollups import classify, hour_bucket
+        key = (hour_bucket(timezone.now()), level, source or '', classify(level, message))
+        with self._counts_lock:
+            self._suppressed[key] += 1
+
+    def _take_counts(self):
+        with self._counts_lock:
+            counts, self._suppressed = self._suppressed, Counter()
+        return counts
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        """Guarda todo lo pendiente. Devuelve el número de entradas escritas."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._drain()
+                suppressed = self._take_counts()
+                if not batch and not suppressed:
+                    break
+                written += self._write(batch, suppressed)
+        return written
+
+    def _write(self, batch, suppressed=None):
+        if time.monotonic() < self.db_disabled_until:
+            self.dropped += len(batch)
+            return 0
+        try:
+            # ← Importación diferida (evita el ciclo)
+            from django.db import close_old_connections, transaction
+            from web_interface.models import LogEntry
+            from web_interface.log_search import assign_bulk_pks, index_entries
+            from web_interface.log_rollups import aggregate, apply_counts
+            close_old_connections()
+            entries = [
+                LogEntry(level=level, message=message, source=source, timestamp=ts)
+                for level, message, source, ts in batch
+            ]
+            # ← Los resúmenes cuentan también los eventos que la política no guarda
+            counts = aggregate(entries)
+            if suppressed:
+                counts.update(suppressed)
+            with transaction.atomic():
+                if entries:
+                    LogEntry.objects.bulk_create(entries)
+                    # ← Índice de palabras para la búsqueda de logs
+                    assign_bulk_pks(entries)
+                    index_entries(entries)
+                # ← Resúmenes por hora para el panel
+                apply_counts(counts)
+            self.written += len(entries)
+            return len(entries)
+        except Exception as e:
+            self.db_failures += 1
+            self.dropped += len(batch)
+            self.db_disabled_until = time.monotonic() + LOG_SINK_RETRY_AFTER
+            logger.error(
+                f"[DB] No se pudieron guardar {len(batch)} logs ({self.dropped} descartados en total): {e}",
+                extra={'source': 'log_system'}
+            )
+            return 0
+
+    def _run(self):
+        while not self._stop.is_set():
+            # ← La política y los contadores se sincronizan desde este hilo, nunca desde log_event
+            log_policy.maybe_refresh()
+            # ← Esperar al intervalo o a que se acumule un lote completo
+            deadline = time.monotonic() + self.flush_interval
+            while self._queue.qsize() < self.batch_size and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._stop.wait(min(remaining, 0.05))
+            self.flush()
+        self.flush()
+        log_policy.persist_counters()
 
-os.makedirs(LOG_DIR, exist_ok=True)
+    def close(self, timeout=5):
+        """Detiene el hilo y guarda lo pendiente (se llama al salir del proceso)."""
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'db_failures': self.db_failures,
+        }
+
+
+# ← Política de logs: qué eventos llegan a la base de datos
+LOG_POLICY_KEY = 'log_policy'
+LOG_POLICY_COUNTERS_KEY = 'log_policy_counters'
+LOG_POLICY_REFRESH = 15        # segundos entre lecturas de la política
+LOG_POLICY_PERSIST = 60        # segundos entre guardados de los contadores
+LOG_POLICY_MAX_TEMPLATES = 2000
+
+# db: archivo + DB | file: solo archivo | sample: 1 de cada N a la DB |
+# rate: token bucket por plantilla de mensaje | drop: se descarta
+LOG_POLICY_ACTIONS = ('db', 'file', 'sample', 'rate', 'drop')
+
+# ← Sin política guardada no hay reglas: todos los eventos van a la base de datos
+DEFAULT_LOG_POLICY = []
+
+_TEMPLATE_PATTERNS = [
+    (re.compile(r'[\w.+-]+@[\w-]+(\.[\w-]+)+'), '<email>'),
+    (re.compile(r"(\{.*\}|\[.*\])", re.DOTALL), '<data>'),
+    (re.compile(r"'[^']*'|\"[^\"]*\""), '<str>'),
+    (re.compile(r'\d+'), '<n>'),
+]
+
+
+def message_template(message: str) -> str:
+    """Reduce un mensaje a su plantilla ('Email recibido: a@b.cu' → 'Email recibido: <email>')."""
+    template = str(message)[:200]
+    for pattern, replacement in _TEMPLATE_PATTERNS:
+        template = pattern.sub(replacement, template)
+    return template[:120]
+
+
+def _process_role() -> str:
+    """Nombre del proceso para separar contadores (p. ej. 'run_bot', 'runserver')."""
+    role = os.getenv('LOG_PROCESS_ROLE')
+    if role:
+        return role
+    if len(sys.argv) > 1 and os.path.basename(sys.argv[0]) == 'manage.py':
+        return sys.argv[1]
+    return os.path.basename(sys.argv[0] or 'python')
+
+
+class LogPolicy:
+    """
+    Decide por (source, level) el destino de cada evento de `log_event`.
+    Las reglas se guardan como JSON en AppSetting ('log_policy'); la regla más
+    específica gana: (source, level) > (source, *) > (*, level) > (*, *).
+    Los eventos suprimidos se cuentan y los contadores se guardan periódicamente
+    en AppSetting ('log_policy_counters:<proceso>') para verlos desde la web.
+    """
+
+    def __init__(self, rules=None):
+        self._lock = threading.Lock()
+        self._rules = {}
+        self._buckets = {}
+        self._sample_counts = {}
+        self.counters = {}
+        self.loaded_at = 0.0
+        self.persisted_at = time.monotonic()
+        self.role = _process_role()
+        self.set_rules(DEFAULT_LOG_POLICY if rules is None else rules)
+
+    @staticmethod
+    def validate(rules) -> list:
+        """Normaliza la lista de reglas; lanza ValueError si alguna no es válida."""
+        if not isinstance(rules, list):
+            raise ValueError("La política debe ser una lista de reglas")
+        clean = []
+        for rule in rules:
+            if not isinstance(rule, dict):
+                raise ValueError("Cada regla debe ser un objeto")
+            action = rule.get('action', 'db')
+            if action not in LOG_POLICY_ACTIONS:
+                raise ValueError(f"Acción no válida: {action}")
+            item = {
+                'source': (rule.get('source') or '*').strip(),
+                'level': (rule.get('level') or '*').strip().upper(),
+                'action': action,
+            }
+            if action == 'sample':
+                item['sample_rate'] = max(1, int(rule.get('sample_rate') or 10))
+            if action == 'rate':
+                item['rate'] = max(0.001, float(rule.get('rate') or 1))
+                item['burst'] = max(1, int(rule.get('burst') or 5))
+            clean.append(item)
+        return clean
+
+    def set_rules(self, rules):
+        rules = self.validate(rules)
+        with self._lock:
+            self._rules = {(r['source'], r['level']): r for r in rules}
+            self._buckets.clear()
+            self._sample_counts.clear()
+
+    @property
+    def rules(self) -> list:
+        return list(self._rules.values())
+
+    def rule_for(self, source: str, level: str):
+        rules = self._rules
+        for key in ((source, level), (source, '*'), ('*', level), ('*', '*')):
+            rule = rules.get(key)
+            if rule is not None:
+                return rule
+        return None
+
+    def _count(self, source, level, outcome):
+        key = f"{source}|{level}"
+        with self._lock:
+            bucket = self.counters.setdefault(key, {})
+            bucket[outcome] = bucket.get(outcome, 0) + 1
+
+    def _take_token(self, rule, source, level, message) -> bool:
+        key = (source, level, message_template(message))
+        now = time.monotonic()
+        with self._lock:
+            if len(self._buckets) > LOG_POLICY_MAX_TEMPLATES:
+                self._buckets.clear()
+            tokens, updated = self._buckets.get(key, (float(rule['burst']), now))
+            tokens = min(float(rule['burst']), tokens + (now - updated) * rule['rate'])
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+    def decide(self, level: str, message: str, source: str) -> str:
+        """Devuelve 'db', 'file' o 'drop' para este evento y actualiza los contadores."""
+        rule = self.rule_for(source, level)
+        action = rule['action'] if rule else 'db'
+
+        if action == 'sample':
+            key = (source, level)
+            with self._lock:
+                count = self._sample_counts.get(key, 0)
+                self._sample_counts[key] = count + 1
+            if count % rule['sample_rate'] == 0:
+                action = 'db'
+            else:
+                self._count(source, level, 'sampled_out')
+                return 'file'
+        elif action == 'rate':
+            if self._take_token(rule, source, level, message):
+                action = 'db'
+            else:
+                self._count(source, level, 'rate_limited')
+                return 'file'
+        elif action == 'file':
+            self._count(source, level, 'file_only')
+            return 'file'
+        elif action == 'drop':
+            self._count(source, level, 'dropped')
+            return 'drop'
+
+        self._count(source, level, 'db')
+        return 'db'
+
+    # --- Sincronización con AppSetting (desde el hilo del log sink) ---
+
+    def load(self):
+        from web_interface.models import AppSetting
+        setting = AppSetting.objects.filter(key=LOG_POLICY_KEY).first()
+        self.set_rules(json.loads(setting.value) if setting else DEFAULT_LOG_POLICY)
+        self.loaded_at = time.monotonic()
+
+    def save(self, rules):
+        """Valida y guarda las reglas (lo usa la vista de configuración)."""
+        from web_interface.models import AppSetting
+        rules = self.validate(rules)
+        AppSetting.objects.update_or_create(
+            key=LOG_POLICY_KEY,
+            defaults={'value': json.dumps(rules), 'description': 'Política de logs por origen y nivel'}
+        )
+        self.set_rules(rules)
+        self.loaded_at = time.monotonic()
+        return rules
+
+    def persist_counters(self):
+        from web_interface.models import AppSetting
+        with self._lock:
+            counters = {key: dict(value) for key, value in self.counters.items()}
+        self.persisted_at = time.monotonic()
+        if not counters:
+            return
+        try:
+            AppSetting.objects.update_or_create(
+                key=f"{LOG_POLICY_COUNTERS_KEY}:{self.role}",
+                defaults={
+                    'value': json.dumps({'updated': timezone.now().isoformat(), 'counters': counters}),
+                    'description': 'Contadores de la política de logs',
+                }
+            )
+        except Exception as e:
+            logger.debug(f"No se pudieron guardar los contadores de logs: {e}", extra={'source': 'log_system'})
+
+    def maybe_refresh(self):
+        now = time.monotonic()
+        if now - self.loaded_at >= LOG_POLICY_REFRESH:
+            try:
+                self.load()
+            except Exception as e:
+                # ← Sin DB (o política inválida): se mantiene la política actual
+                self.loaded_at = now
+                logger.debug(f"No se pudo leer la política de logs: {e}", extra={'source': 'log_system'})
+        if now - self.persisted_at >= LOG_POLICY_PERSIST:
+            self.persist_counters()
+
+    def reset_counters(self):
+        with self._lock:
+            self.counters.clear()
+
+
+def get_log_policy_counters() -> dict:
+    """Contadores guardados por cada proceso: {proceso: {'updated', 'counters'}}."""
+    from web_interface.models import AppSetting
+    result = {}
+    prefix = f"{LOG_POLICY_COUNTERS_KEY}:"
+    for setting in AppSetting.objects.filter(key__startswith=prefix):
+        try:
+            result[setting.key[len(prefix):]] = json.loads(setting.value)
+        except ValueError:
+            continue
+    return result
+
+
+log_sink = LogSink()
+log_policy = LogPolicy()
+atexit.register(log_sink.close)
+
+# ← Profundidad de las colas de logs (se leen en cada scrape de /metrics)
+metrics.gauge('tbot_log_sink_queue_depth', lambda: log_sink.stats()['queued'])
+metrics.gauge('tbot_log_sink_dropped', lambda: log_sink.dropped)
+metrics.gauge('tbot_logging_queue_depth', lambda: logging_stats()['queued'])
+metrics.gauge('tbot_logging_dropped', lambda: logging_stats()['dropped'])
+metrics.gauge('tbot_config_version', lambda: env_config.version)
 
-# Configurar logging a archivo
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s | %(levelname)-8s | %(source)s | %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE, encoding='utf-8'),
-        logging.StreamHandler()  # También muestra en consola
-    ]
-)
 
 def log_event(level: str, message: str, source: str):
     """
     Registra un evento en archivo y en la base de datos.
+    La escritura en base de datos se hace en lote desde un hilo en segundo plano.
 
     Args:
         level (str): Nivel del log ('INFO', 'WARNING', 'ERROR', 'CRITICAL')
         message (str): Mensaje descriptivo
         source (str): Módulo origen ('bot_handler', 'email_service', etc.)
     """
+    # 0. Política por origen y nivel (el hilo del sink la mantiene actualizada)
+    log_sink._ensure_started()
+    destination = log_policy.decide(level, message, source)
+    if destination == 'db':
+        log_sink.put(level, message, source)
+    else:
+        # ← No ocupa sitio en la cola: solo suma en los resúmenes por hora
+        log_sink.count(level, message, source)
+    if destination == 'drop':
+        return
+
     # 1. Log en archivo y consola
     extra = {'source': source}
     if level == 'INFO':
@@ -47,31 +447,10 @@ def log_event(level: str, message: str, source: str):
     elif level == 'DEBUG':
         logger.debug(message, extra=extra)
 
-    # 2. Log en base de datos (solo si Django está listo)
-    try:
-        # ← Importación diferida (evita el ciclo)
-        from web_interface.models import LogEntry
-        LogEntry.objects.create(
-            level=level,
-            message=message,
-            source=source
-        )
-    except Exception as e:
-        # ← Mostrar el error real
-        logger.error(f"[DB] No se pudo guardar log: {e}", extra={'source': 'log_system'})
-        
-
 
 def set_key_in_env(key, value):
     """
     Guarda una clave-valor en el archivo .env
     """
-    env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
-    # Asegurarse de que el archivo exista
-    if not os.path.exists(env_path):
-        open(env_path, 'a').close()
-    # Escribir la clave
-    success, key = set_key(env_path, key, value)
-    # Forzar recarga
-    load_dotenv(env_path, override=True)
-    return success
\ No newline at end of file
+    env_config.set(**{key: value})
+    return True
\ No newline at end of file
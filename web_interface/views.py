@@ -1,49 +1,60 @@
 import os
+import hmac
 import json
 import logging
-import requests
-import threading
-import psutil
-import asyncio
-import subprocess
 import sys
-import re
 import time
-from datetime import datetime
+from datetime import timedelta
 from django.shortcuts import render, redirect
-from django.http import JsonResponse
+from django.utils import timezone
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.core.paginator import Paginator
-from pathlib import Path
-from collections import OrderedDict
-from dotenv import dotenv_values, load_dotenv, set_key
-from decouple import AutoConfig, config as decouple_config
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+from asgiref.sync import sync_to_async
+import httpx
 
 # Importaciones desde ad_connector
+from ad_connector.ad_diagnostics import run_diagnostics
 from ad_connector.ad_operations import (
     get_ad_config,
-    fetch_ad_users,
-    check_group_membership,
     get_ad_group_config,
     is_ad_admin_group_enabled,
-    fetch_ad_users_for_import,
-    get_users_in_ad_group,
 )
 
-from telegram_bot.handlers import run_bot
-
-# ← Variable global para controlar el hilo
-telegram_bot_thread = None
-bot_running = False
+from telegram_bot.message_catalog import catalog as message_catalog
+# ← Estado del bot compartido con el proceso run_bot (escritura atómica + latido)
+from telegram_bot.bot_status import get_status, update_status
+# ← El bot corre en su propio proceso; la web le da órdenes a través del supervisor
+from telegram_bot.supervisor import SupervisorUnavailable, asend_command
 
 # Importaciones locales
-from .models import LogEntry, AppSetting
-from .utils import log_event
+from .models import LogEntry, AppSetting, SlowTrace, JobRun
+from .utils import (
+    log_event, log_policy, get_log_policy_counters, LOG_POLICY_ACTIONS, LOG_POLICY_COUNTERS_KEY
+)
+from .live_events import hub as live_hub, TOPICS as LIVE_TOPICS
+from . import metrics
+from . import tracing
+from .metrics_sampler import sampler as metrics_sampler
+from .log_rollups import activity as log_activity, get_facets as get_log_facets
+from .log_queries import (
+    filter_logs, keyset_page, estimate_count, encode_cursor, get_page_size,
+    num_pages, InvalidCursor, DEFAULT_PAGE_SIZE
+)
+from .log_export import aexport_stream, EXPORT_FORMATS
+from .env_config import env_config
+from .async_support import Busy, http_client, run_blocking
+from . import ad_roster
+from .user_queries import user_page
+from .user_import import import_ad_admins
+from .scheduler import (
+    JOBS, ensure_jobs, heartbeat_age, next_run, request_run, validate_schedule,
+    HEARTBEAT_TIMEOUT as SCHEDULER_HEARTBEAT_TIMEOUT
+)
 
 
 # ← Ruta absoluta al proyecto
@@ -51,97 +62,34 @@
 
 logger = logging.getLogger(__name__)
 
-# ← Ruta al archivo de estado
-STATUS_FILE = Path(__file__).parent.parent / 'telegram_bot' / 'services_status.json'
-
-
-# ← Definir el evento global ANTES de cualquier función que lo use
-stop_bot_event = threading.Event()
-
-# ← Variable global para el hilo del bot
-bot_thread = None
 
 
-# ← Comando base
-PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-MANAGE_PY = f'{sys.executable} {os.path.join(PROJECT_DIR, "manage.py")}'
-
-# ← Tareas disponibles
-CRON_JOBS = {
-    'sync_users': {
-        'command': f'{MANAGE_PY} sync_users',
-        'description': 'Sincroniza usuarios del AD con la base de datos'
-    },
-    'password_expiration': {
-        'command': f'{MANAGE_PY} password_expiration',
-        'description': 'Envía alertas de vencimiento de contraseñas'
+# ← Tareas programadas: las ejecuta el planificador del servicio del bot (ver scheduler)
+def _job_context(job):
+    spec = JOBS[job.name]
+    return {
+        'name': job.name,
+        'description': spec['description'],
+        'command': f"manage.py {spec['command']}",
+        'schedule': job.schedule,
+        'enabled': job.enabled,
+        'jitter_seconds': job.jitter_seconds,
+        'timeout_seconds': job.timeout_seconds,
+        'next_run_at': job.next_run_at,
+        'running_since': job.running_since,
+        'run_requested': job.run_requested,
+        'last_run': job.runs.exclude(status='skipped').first(),
     }
-}
-
-
-def get_crontab():
-    """Lee el crontab del usuario actual."""
-    try:
-        result = os.popen('crontab -l 2>/dev/null').read()
-        lines = result.strip().split('\n') if result.strip() else []
-        jobs = []
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-            parts = line.split()
-            if len(parts) < 6:
-                continue
-            for job_name, job in CRON_JOBS.items():
-                if job['command'] in line:
-                    jobs.append({
-                        'name': job_name,
-                        'schedule': ' '.join(parts[:5]),
-                        'command': job['command'],
-                        'enabled': True
-                    })
-                    break
-        return jobs
-    except Exception as e:
-        print(f"Error leyendo crontab: {e}")
-        return []
-
-def save_crontab(jobs):
-    """Guarda las tareas en el crontab."""
-    try:
-        lines = []
-        for job in jobs:
-            if job['enabled']:
-                lines.append(f"{job['schedule']} {job['command']}")
-        cron_content = '\n'.join(lines) + '\n'
-        with open('/tmp/my_cron', 'w') as f:
-            f.write(cron_content)
-        os.system('crontab /tmp/my_cron')
-        os.remove('/tmp/my_cron')
-        return True
-    except Exception as e:
-        print(f"Error guardando crontab: {e}")
-        return False
 
 @login_required
 def cron_view(request):
     """Vista para gestionar tareas programadas."""
-    crontab_jobs = get_crontab()
-    jobs_dict = {job['name']: job for job in crontab_jobs}
-
-    # ← Añadir tareas que no están en crontab
-    for job_name in CRON_JOBS:
-        if job_name not in jobs_dict:
-            default_schedule = '0 */6 * * *' if job_name == 'sync_users' else '0 8 * * *'
-            jobs_dict[job_name] = {
-                'name': job_name,
-                'schedule': default_schedule,
-                'command': CRON_JOBS[job_name]['command'],
-                'enabled': False
-            }
-
+    heartbeat = heartbeat_age()
     return render(request, 'web_interface/cron.html', {
-        'jobs': jobs_dict,
+        'jobs': [_job_context(job) for job in ensure_jobs()],
+        'runs': JobRun.objects.select_related('job')[:50],
+        'scheduler_alive': heartbeat is not None and heartbeat < SCHEDULER_HEARTBEAT_TIMEOUT,
+        'scheduler_heartbeat': heartbeat,
         'current_page': 'cron'  # ← Para activar el sidebar
     })
 
@@ -152,122 +100,83 @@ def edit_cron_job(request, job):
     if request.method != 'GET':
         return JsonResponse({'status': 'error', 'message': 'Método no permitido'}, status=405)
 
-    if job not in CRON_JOBS:
+    if job not in JOBS:
         return JsonResponse({'status': 'error', 'message': 'Tarea no válida'}, status=400)
 
-    jobs = get_crontab()
-    current_job = next((j for j in jobs if j['name'] == job), None)
-
-    if not current_job:
-        current_job = {
-            'name': job,
-            'schedule': '0 */6 * * *' if job == 'sync_users' else '0 8 * * *',
-            'command': CRON_JOBS[job]['command'],
-            'enabled': False
-        }
-
-    return render(request, 'web_interface/partials/cron_edit_modal.html', {
-        'job': current_job
+    current_job = ensure_jobs().get(name=job)
+    return render(request, 'web_interface/cron_edit_modal.html', {
+        'job': _job_context(current_job)
     })
 
 @csrf_exempt
 @login_required
 def save_cron_job(request):
-    """Guarda o actualiza una tarea."""
+    """Guarda la programación de una tarea y recalcula su próxima ejecución."""
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'Método no permitido'}, status=405)
 
     try:
         data = json.loads(request.body)
         job_name = data.get('job')
-        enabled = data.get('enabled', False)
-        schedule = data.get('schedule', '')
-
-        if job_name not in CRON_JOBS:
+        if job_name not in JOBS:
             return JsonResponse({'status': 'error', 'message': 'Tarea no válida'}, status=400)
 
-        if enabled and not re.match(r'^(\*|[0-5]?\d)\s+(\*|[01]?\d|2[0-3])\s+(\*|[12]?\d|3[01])\s+(\*|[1-9]|1[0-2])\s+(\*|[0-6])$', schedule):
-            return JsonResponse({'status': 'error', 'message': 'Formato de cron inválido'}, status=400)
-
-        jobs = get_crontab()
-        job_found = False
-        for job in jobs:
-            if job['name'] == job_name:
-                job['enabled'] = enabled
-                if enabled:
-                    job['schedule'] = schedule
-                job_found = True
-                break
-
-        if not job_found and enabled:
-            jobs.append({
-                'name': job_name,
-                'schedule': schedule,
-                'command': CRON_JOBS[job_name]['command'],
-                'enabled': True
-            })
-
-        if save_crontab(jobs):
+        job = ensure_jobs().get(name=job_name)
+        try:
+            job.schedule = validate_schedule(data.get('schedule') or job.schedule)
+            job.jitter_seconds = int(data.get('jitter_seconds', job.jitter_seconds))
+            job.timeout_seconds = int(data.get('timeout_seconds', job.timeout_seconds))
+        except (TypeError, ValueError) as e:
+            return JsonResponse({'status': 'error', 'message': f'Programación inválida: {e}'}, status=400)
+        if not 0 <= job.jitter_seconds <= 3600 or not 10 <= job.timeout_seconds <= 86400:
             return JsonResponse({
-                'status': 'success',
-                'message': f'Tarea {"habilitada" if enabled else "deshabilitada"} correctamente.'
-            })
-        else:
-            return JsonResponse({'status': 'error', 'message': 'No se pudo guardar el crontab.'}, status=500)
-
+                'status': 'error',
+                'message': 'El jitter debe estar entre 0 y 3600 s y el tiempo máximo entre 10 y 86400 s'
+            }, status=400)
+
+        job.enabled = bool(data.get('enabled', False))
+        job.next_run_at = next_run(job) if job.enabled else None
+        job.save(update_fields=['schedule', 'jitter_seconds', 'timeout_seconds', 'enabled', 'next_run_at'])
+
+        log_event(
+            'INFO',
+            f"Tarea '{job_name}' {'habilitada' if job.enabled else 'deshabilitada'} por "
+            f"{request.user.username} ({job.schedule})",
+            'cron_view'
+        )
+        message = f'Tarea {"habilitada" if job.enabled else "deshabilitada"} correctamente.'
+        if job.enabled:
+            message += f' Próxima ejecución: {timezone.localtime(job.next_run_at):%d/%m/%Y %H:%M}'
+        return JsonResponse({'status': 'success', 'message': message})
+
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'error', 'message': 'JSON inválido'}, status=400)
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
-def get_status():
-    if STATUS_FILE.exists():
-        try:
-            with open(STATUS_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return {
-                    "telegram_running": data.get("telegram_running", False),
-                    "telegram_start_time": data.get("telegram_start_time"),
-                    "telegram_auto_start": data.get("telegram_auto_start", False)
-                }
-        except json.JSONDecodeError as e:
-            logger.error(f"Error al leer {STATUS_FILE}: {e}")
-    return {
-        "telegram_running": False,
-        "telegram_start_time": None,
-        "telegram_auto_start": False
-    }
-
-
-def update_status(telegram_running=None, telegram_start_time=None, telegram_auto_start=None):
-    """Actualiza el estado del bot en services_status.json"""
+@login_required
+@require_http_methods(["POST"])
+def run_cron_job(request):
+    """Pide al planificador una ejecución inmediata de la tarea."""
     try:
-        status = get_status()
-        if telegram_running is not None:
-            status['telegram_running'] = telegram_running
-        if telegram_start_time is not None:
-            status['telegram_start_time'] = telegram_start_time
-        if telegram_auto_start is not None:
-            status['telegram_auto_start'] = telegram_auto_start
-
-        # ← Asegurar que el directorio exista
-        STATUS_FILE.parent.mkdir(parents=True, exist_ok=True)
-
-        with open(STATUS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(status, f, ensure_ascii=False, indent=4)
-
-        return True
-    except Exception as e:
-        logger.error(f"Error al actualizar estado: {e}")
-        return False
+        job_name = json.loads(request.body).get('job')
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'error', 'message': 'JSON inválido'}, status=400)
+    if job_name not in JOBS:
+        return JsonResponse({'status': 'error', 'message': 'Tarea no válida'}, status=400)
 
-# ← Importar run_bot_sync desde handlers.py
-try:
-    from telegram_bot.handlers import run_bot_sync
-    RUN_BOT_AVAILABLE = True
-except Exception as e:
-    logger.exception("No se pudo importar run_bot_sync")
-    RUN_BOT_AVAILABLE = False
-    run_bot_sync = None
+    ensure_jobs()
+    request_run(job_name)
+    log_event('INFO', f"Ejecución manual de '{job_name}' solicitada por {request.user.username}", 'cron_view')
 
+    heartbeat = heartbeat_age()
+    if heartbeat is None or heartbeat >= SCHEDULER_HEARTBEAT_TIMEOUT:
+        return JsonResponse({
+            'status': 'success',
+            'message': 'Ejecución solicitada, pero el planificador no está activo: '
+                       'se lanzará cuando arranque el supervisor del bot o run_scheduler.'
+        })
+    return JsonResponse({'status': 'success', 'message': f'Ejecución de {job_name} solicitada.'})
 
 
 @csrf_exempt
@@ -278,20 +187,23 @@ def set_auto_start_enable(request):
         try:
             # ← Crear o actualizar el servicio systemd
             service_content = """[Unit]
-Description=TBot Telegram Bot
+Description=TBot Telegram Bot (supervisor)
 After=network.target
 
 [Service]
 Type=simple
 User=www-data
 WorkingDirectory={project_dir}
-ExecStart={python_path} manage.py run_bot
+ExecStart={python_path} manage.py run_supervisor --start
+# ← Solo el supervisor recibe SIGTERM: él detiene el bot de forma ordenada
+KillMode=mixed
+TimeoutStopSec=30
 Restart=always
 RestartSec=10
 
 [Install]
 WantedBy=multi-user.target""".format(
-                project_dir=settings.BASE_DIR,
+                project_dir=PROJECT_DIR,
                 python_path=sys.executable  # ← Usa el mismo Python que Django
             )
 
@@ -347,69 +259,63 @@ def set_auto_start_disable(request):
             }, status=500)
     return JsonResponse({'status': 'error', 'message': 'Método no permitido'}, status=405)
 
-@require_http_methods(["POST"])
-@csrf_exempt
-@login_required
-def telegram_start(request):
-    status = get_status()
-    if status["telegram_running"]:
-        return JsonResponse({'status': 'error', 'message': 'El bot ya está en ejecución.'}, status=400)
-
-    token = os.getenv('TELEGRAM_BOT_TOKEN')
-    if not token:
-        return JsonResponse({'status': 'error', 'message': 'Falta el token del bot en .env'}, status=500)
+BOT_ACTION_EVENTS = {
+    'start': 'iniciado',
+    'stop': 'detenido',
+    'restart': 'reiniciado',
+}
 
-    if not RUN_BOT_AVAILABLE:
-        return JsonResponse({'status': 'error', 'message': 'No se puede iniciar el bot: módulo no disponible.'}, status=500)
 
-    def run_bot_safe():
-        try:
-            # ← Ejecutar run_bot_sync en este hilo
-            run_bot_sync(token, stop_event=stop_bot_event)
-        except Exception as e:
-            logger.exception(f"Error en run_bot: {str(e)}")
-        finally:
-            # ← Resetear el evento
-            stop_bot_event.clear()
-            # ← Actualizar estado
-            update_status(telegram_running=False, telegram_start_time=None)
-            global bot_thread
-            bot_thread = None
-
-    # ← Actualizar estado: iniciando
-    current_time = time.time()
-    update_status(
-        telegram_running=True,
-        telegram_start_time=current_time,
-        telegram_auto_start=status["telegram_auto_start"]
+async def _bot_command(request, action):
+    """Envía la orden al supervisor del bot (`manage.py run_supervisor`) y traduce su respuesta."""
+    try:
+        reply = await asend_command(action)
+    except SupervisorUnavailable as e:
+        logger.warning(f"[{action}] {e}")
+        return JsonResponse({
+            'status': 'error',
+            'message': 'El supervisor del bot no está en marcha. Inícielo con "manage.py run_supervisor" '
+                       'o active el inicio automático.',
+        }, status=503)
+    if not reply['ok']:
+        return JsonResponse({'status': 'error', 'message': reply['message'], 'data': reply['state']}, status=400)
+    user = await request.auser()
+    await sync_to_async(log_event)(
+        'INFO', f"Bot de Telegram {BOT_ACTION_EVENTS[action]} desde la interfaz web por {user.username}.", 'services'
     )
+    return JsonResponse({'status': 'success', 'message': reply['message'], 'data': reply['state']})
 
-    global bot_thread
-    bot_thread = threading.Thread(target=run_bot_safe, daemon=True)
-    bot_thread.start()
-
-    logger.info("Bot de Telegram iniciado desde la API.")
-    return JsonResponse({'status': 'success', 'message': 'Bot de Telegram iniciado.'})
 
 @require_http_methods(["POST"])
 @csrf_exempt
 @login_required
-def telegram_stop(request):
-    status = get_status()
-    if not status["telegram_running"]:
-        return JsonResponse({'status': 'error', 'message': 'El bot ya está detenido.'}, status=400)
+async def telegram_start(request):
+    return await _bot_command(request, 'start')
 
-    # ← Activar el evento para detener el bot
-    global stop_bot_event
-    stop_bot_event.set()
+@require_http_methods(["POST"])
+@csrf_exempt
+@login_required
+async def telegram_stop(request):
+    return await _bot_command(request, 'stop')
 
-    logger.info("Señal de detención enviada al bot de Telegram.")
-    return JsonResponse({'status': 'success', 'message': 'Señal de detención enviada. El bot se detendrá pronto.'})
+@require_http_methods(["POST"])
+@csrf_exempt
+@login_required
+async def telegram_restart(request):
+    return await _bot_command(request, 'restart')
 
 @require_http_methods(["GET"])
 @login_required
-def telegram_status(request):
-    status = get_status()
+async def telegram_status(request):
+    # ← get_status lee el fichero de estado bajo flock y env_config.version revisa .env: fuera del bucle
+    status, current_config_version = await sync_to_async(
+        lambda: (get_status(), env_config.version), thread_sensitive=False
+    )()
+    try:
+        # ← Salud que informa el supervisor: pid, reinicios, latido y métricas del proceso del bot
+        supervisor = (await asend_command('status', timeout=2))['state']
+    except SupervisorUnavailable:
+        supervisor = None
     uptime = None
     if status["telegram_running"] and status["telegram_start_time"]:
         uptime_seconds = time.time() - status["telegram_start_time"]
@@ -424,38 +330,15 @@ def telegram_status(request):
             'running': status["telegram_running"],
             'start_time': status["telegram_start_time"],
             'auto_start': status["telegram_auto_start"],
-            'uptime': uptime
+            'uptime': uptime,
+            # ← Si difieren, el bot aún no ha recogido el último cambio de .env
+            'config_version': status["config_version"],
+            'current_config_version': current_config_version,
+            'supervisor': supervisor,
         }
     })
 
-# ← Función para guardar el JSON manteniendo el orden original
-def save_messages_with_order(messages_file, updated_messages, original_order):
-    """
-    Guarda el JSON manteniendo el orden original de las claves.
-    """
-    ordered_data = OrderedDict()
-
-    # ← Recorrer el orden original y reconstruir el JSON
-    for key in original_order:
-        if key in updated_messages:
-            ordered_data[key] = updated_messages[key]
-        else:
-            # ← Si la clave no fue modificada, intentar mantenerla
-            pass
-
-    # ← Asegurar que todas las claves del orden original estén presentes
-    with open(messages_file, 'r', encoding='utf-8') as f:
-        original_data = json.load(f, object_pairs_hook=OrderedDict)
-
-    for key in original_order:
-        if key in original_data:
-            ordered_data[key] = updated_messages.get(key, original_data[key])
 
-    # ← Escribir con indentación
-    with open(messages_file, 'w', encoding='utf-8') as f:
-        json.dump(ordered_data, f, ensure_ascii=False, indent=4)
-        
-        
 # --- VISTAS DE AUTENTICACIÓN ---
 
 def login_view(request):
@@ -483,46 +366,87 @@ def dashboard_view(request):
     })
 
 @login_required
-def get_stats(request):
-    """Devuelve métricas del sistema en formato JSON."""
+async def get_stats(request):
+    """
+    Devuelve la última muestra de métricas del sistema en formato JSON (sin esperar).
+    Con `?history=<segundos>` añade las muestras de ese intervalo para los gráficos.
+    """
     try:
-        # ← CPU
-        cpu_percent = psutil.cpu_percent(interval=1)
-
-        # ← RAM
-        ram = psutil.virtual_memory()
-        ram_percent = ram.percent
-        ram_used_gb = ram.used / (1024**3)
-        ram_total_gb = ram.total / (1024**3)
-
-        # ← Red (LAN)
-        net = psutil.net_io_counters()
-        net_bytes_sent = net.bytes_sent
-        net_bytes_recv = net.bytes_recv
-        time.sleep(1)
-        net = psutil.net_io_counters()
-        upload_speed = (net.bytes_sent - net_bytes_sent) / 1.0
-        download_speed = (net.bytes_recv - net_bytes_recv) / 1.0
-
-        def format_speed(bps):
-            if bps < 1024:
-                return f"{bps:.1f} B/s"
-            elif bps < 1024**2:
-                return f"{bps / 1024:.1f} KB/s"
-            else:
-                return f"{bps / (1024**2):.1f} MB/s"
-
-        return JsonResponse({
-            'cpu_percent': round(cpu_percent, 1),
-            'ram_percent': round(ram_percent, 1),
-            'ram_used': round(ram_used_gb, 2),
-            'ram_total': round(ram_total_gb, 2),
-            'download_speed': format_speed(download_speed),
-            'upload_speed': format_speed(upload_speed)
-        })
+        sample = metrics_sampler.latest()
+        if sample is None:
+            # ← Primera petición del proceso: el hilo aún no tiene muestras (psutil recorre procesos)
+            sample = await run_blocking(metrics_sampler.sample)
+
+        data = dict(sample)
+        history = request.GET.get('history')
+        if history:
+            seconds = min(max(int(history), 0), 3600)
+            data['history'] = metrics_sampler.history(seconds)
+        return JsonResponse(data)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetro history inválido'}, status=400)
+    except Busy as e:
+        return JsonResponse({'error': str(e)}, status=503)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
-    
+
+
+@login_required
+def get_activity(request):
+    """Actividad por día y tipo de evento (desde los resúmenes por hora) para el panel."""
+    try:
+        days = min(max(int(request.GET.get('days', 7)), 1), 366)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetro days inválido'}, status=400)
+    return JsonResponse(log_activity(days))
+
+
+@login_required
+async def events_stream(request):
+    """Server-Sent Events: logs nuevos, cambios de estado del bot y estadísticas del sistema."""
+    topics = [t for t in request.GET.get('topics', ','.join(LIVE_TOPICS)).split(',') if t in LIVE_TOPICS]
+    source = request.GET.get('source') or None
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        last_event_id = None
+
+    response = StreamingHttpResponse(
+        live_hub.astream(topics or LIVE_TOPICS, source=source, last_event_id=last_event_id),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # ← nginx: no acumular la respuesta
+    return response
+
+
+# ← Cabeceras que pone un proxy inverso: con ellas REMOTE_ADDR es el proxy, no el cliente
+PROXY_HEADERS = ('HTTP_X_FORWARDED_FOR', 'HTTP_X_REAL_IP', 'HTTP_FORWARDED')
+
+
+def _metrics_allowed(request) -> bool:
+    """Token de METRICS_TOKEN, usuario staff o (solo sin proxy delante) una IP de METRICS_ALLOWED_IPS."""
+    token = env_config.get('METRICS_TOKEN')
+    auth = request.headers.get('Authorization', '')
+    if token and auth.startswith('Bearer ') and hmac.compare_digest(auth[len('Bearer '):].strip(), token):
+        return True
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    # ← Detrás de nginx todas las peticiones llegan desde 127.0.0.1: la lista solo vale sin proxy
+    allowed = env_config.get_list('METRICS_ALLOWED_IPS')
+    return (
+        bool(allowed)
+        and not any(header in request.META for header in PROXY_HEADERS)
+        and request.META.get('REMOTE_ADDR') in allowed
+    )
+
+
+def metrics_view(request):
+    """Métricas de este proceso en formato Prometheus (ver _metrics_allowed)."""
+    if not _metrics_allowed(request):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 
 @login_required
 def logout_view(request):
@@ -535,33 +459,35 @@ def logout_view(request):
 # --- VISTA DE CONFIGURACIÓN DE AD ---
 
 @login_required
-def config_ad_view(request):
-    env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
-    config = dotenv_values(env_path)
-
+async def config_ad_view(request):
     if request.GET.get('action') == 'test_connection':
+        # ← Diagnóstico por pasos (sin descargar el directorio completo), fuera del bucle de eventos
         try:
-            users = fetch_ad_users(retries=1)
-            return JsonResponse({
-                'success': True,
-                'message': f'Conexión exitosa. {len(users)} usuarios obtenidos.'
-            })
+            result = await run_blocking(run_diagnostics, count_users=request.GET.get('count') in ('1', 'true', 'on'))
+        except Busy as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=503)
         except Exception as e:
-            return JsonResponse({
-                'success': False,
-                'message': f'Error de conexión: {str(e)}'
-            })
+            logger.exception("Error en el diagnóstico de AD")
+            return JsonResponse({'success': False, 'message': f'Error de conexión: {str(e)}'})
+        failed = next((step for step in result['steps'] if step['status'] == 'error'), None)
+        result['message'] = (
+            f"Conexión exitosa ({result['total_ms']:.0f} ms)." if failed is None
+            else f"Falló el paso '{failed['label']}': {failed['detail']}"
+        )
+        return JsonResponse(result)
+
+    return await sync_to_async(_config_ad_page)(request)
+
+
+def _config_ad_page(request):
+    config = env_config.snapshot()
 
     if request.method == 'POST':
         keys_to_update = [
             'AD_SERVER', 'AD_PORT', 'AD_USE_SSL', 'AD_USER', 'AD_SEARCH_BASE',
             'AD_DOMAIN', 'AD_PASSWORD_POLICY_DAYS', 'SESSION_DURATION'
         ]
-        for key in keys_to_update:
-            value = request.POST.get(key)
-            if value is not None:
-                set_key(env_path, key, value)
-        config = dotenv_values(env_path)
+        env_config.set(**{key: request.POST[key] for key in keys_to_update if key in request.POST})
         log_event('INFO', 'Configuración de AD actualizada desde la interfaz web.', 'config_ad')
         return JsonResponse({'status': 'success', 'message': 'Configuración guardada.'})
 
@@ -580,8 +506,7 @@ def users_view(request):
     if request.method == 'POST':
         logger.info(f"POST  {request.POST}")
 
-    env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
-    config = dotenv_values(env_path)
+    config = env_config.snapshot()
 
     # --- POST: Acciones
     if request.method == 'POST':
@@ -596,7 +521,8 @@ def users_view(request):
             logger.info(f"Guardando configuración: AD_GROUP={ad_group_val}, enable_ad_admin_auth={enable_auth}")
 
             if ad_group_val:
-                set_key(env_path, 'AD_GROUP', ad_group_val)
+                env_config.set(AD_GROUP=ad_group_val)
+                ad_roster.refresh_async(ad_group_val)  # ← precargar la lista del grupo nuevo
 
             # Guardar en base de datos
             try:
@@ -615,42 +541,34 @@ def users_view(request):
         
         elif request.POST.get('action') == 'import_ad_admins':
             try:
-                selected_users = json.loads(request.POST.get('users'))
-                imported = 0
-
-                for user_data in selected_users:
-                    username = user_data.get('username')
-                    if not username:
-                        continue
-
-                    user, created = User.objects.get_or_create(username=username)
-                    if not created and not user.username:
-                        user.username = username
-
-                    if created or not user.has_usable_password():
-                        user.set_unusable_password()
-
-                    user.first_name = user_data.get('first_name', '')
-                    user.last_name = user_data.get('last_name', '')
-                    user.email = user_data.get('email', '')
-                    user.is_staff = True
-                    user.is_superuser = True
-                    user.save()
-
-                    if created:
-                        imported += 1
-                        # ← Log: Usuario AD importado
-                        log_event(
-                            'INFO',
-                            f"Usuario '{username}' importado del grupo AD por '{request.user.username}'.",
-                            'users_view'
-                        )
-
-                return JsonResponse({'success': True, 'count': imported})
+                selected_users = json.loads(request.POST.get('users') or '[]')
+                if not isinstance(selected_users, list):
+                    raise ValueError("Se esperaba una lista de usuarios")
+            except ValueError as e:
+                return JsonResponse({'success': False, 'message': f"Selección inválida: {e}"}, status=400)
+            try:
+                result = import_ad_admins(
+                    selected_users,
+                    imported_by=request.user.username,
+                    group_dn=get_ad_group_config() or '',
+                )
+                return JsonResponse({'success': True, 'count': result['created'], **result})
             except Exception as e:
                 logger.exception("Error en import_ad_admins")
                 return JsonResponse({'success': False, 'message': str(e)}, status=500)
 
+        elif action == 'refresh_ad_roster':
+            try:
+                roster = ad_roster.refresh()
+            except ad_roster.RosterError as e:
+                return JsonResponse({'success': False, 'message': f"No se pudo consultar AD: {e}"}, status=502)
+            log_event('INFO', f"Lista del grupo AD refrescada por '{request.user.username}' "
+                              f"({len(roster.members)} miembros).", 'users_view')
+            return JsonResponse({
+                'success': True,
+                'count': len(roster.members),
+                'refreshed_at': timezone.localtime(roster.refreshed_at).strftime('%Y-%m-%d %H:%M:%S'),
+            })
 
         elif action == 'toggle_user':
             try:
@@ -706,98 +624,82 @@ def users_view(request):
     # --- GET AJAX: Obtener usuarios del grupo AD ---
     if request.GET.get('action') == 'fetch_ad_admins':
         try:
-            raw_users = get_users_in_ad_group()
+            roster = ad_roster.get_roster()
+            if roster['refreshed_at'] is None:
+                return JsonResponse({'success': False, 'message': roster['error'] or 'Sin datos del grupo AD.'}, status=502)
             admins = []
 
-            for user in raw_users:
-                username = user.get('username')
-                if not username:
-                    continue
+            for user in roster['members']:
+                username = user['username']
                 admins.append({
                     'username': username,
-                    'name': f"{user.get('first_name', '')} {user.get('last_name', '')}".strip() or username,
-                    'first_name': user.get('first_name', ''),
-                    'last_name': user.get('last_name', ''),
-                    'email': user.get('email', '')
+                    'name': f"{user['first_name']} {user['last_name']}".strip() or username,
+                    'first_name': user['first_name'],
+                    'last_name': user['last_name'],
+                    'email': user['email']
                 })
 
             logger.info(f"Usuarios del grupo AD encontrados: {len(admins)}")
-            return JsonResponse({'success': True, 'users': admins})
+            return JsonResponse({
+                'success': True,
+                'users': admins,
+                'refreshed_at': timezone.localtime(roster['refreshed_at']).strftime('%Y-%m-%d %H:%M:%S'),
+            })
         except Exception as e:
             logger.exception("Error en fetch_ad_admins")
             return JsonResponse({'success': False, 'message': str(e)}, status=500)
 
-    # --- Vista normal: Preparar datos ---
-    django_users = []
-    ad_domain = os.getenv('AD_DOMAIN', '').lower()
-    raw_ad_users = get_users_in_ad_group()
-    ad_usernames = {u['username'].lower() for u in raw_ad_users if 'username' in u}
-
-    for user in User.objects.all().order_by('username'):
-        email_domain = user.email.split('@')[-1].lower() if '@' in user.email else ''
-        if email_domain == ad_domain:
-            origin = 'AD'
-        elif user.username.lower() in ad_usernames and user.username != 'admin':
-            origin = 'AD'
-        else:
-            origin = 'Local'
-
-        origin_class = 'info' if origin == 'AD' else 'primary'
-        status_icon = 'check' if user.is_active else 'times'
-
-        django_users.append({
-            'id': user.id,
-            'username': user.username,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'email': user.email,
-            'origin': origin,
-            'origin_class': origin_class,
-            'status_icon': status_icon,
-            'is_active': user.is_active
-        })
-
+    # --- Vista normal: la tabla se carga por páginas desde users_api ---
+    # ← Última lista conocida del grupo; si está caducada se refresca en segundo plano
+    roster = ad_roster.get_roster()
     ad_group = get_ad_group_config()
     auth_enabled = is_ad_admin_group_enabled()  # ← Lee de DB
 
     return render(request, 'web_interface/users.html', {
-        'django_users': django_users,
         'ad_group': ad_group,
         'auth_enabled': auth_enabled,
         'config': config,
+        'roster': roster,
     })
 
+@login_required
+def users_api(request):
+    """Página de usuarios web en JSON: búsqueda `q`, filtros `origin`/`status`, orden `sort`, `page`."""
+    try:
+        roster = ad_roster.get_roster()
+        data = user_page(request.GET, ad_usernames=[u['username'] for u in roster['members']])
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception:
+        logger.exception("Error en users_api")
+        return JsonResponse({'error': 'Error interno'}, status=500)
+    return JsonResponse(data)
+
 # --- VISTA DE LOGS ---
 
 @login_required
 def logs_view(request):
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         try:
-            logs = LogEntry.objects.all().order_by('-timestamp')
-
-            # Filtros
-            level = request.GET.get('level')
-            source = request.GET.get('source')
-            search = request.GET.get('search')
-            from_date = request.GET.get('from_date')
-            to_date = request.GET.get('to_date')
-
-            if level:
-                logs = logs.filter(level=level)
-            if source:
-                logs = logs.filter(source__icontains=source)
-            if search:
-                logs = logs.filter(message__icontains=search)
-            if from_date:
-                logs = logs.filter(timestamp__date__gte=from_date)
-            if to_date:
-                logs = logs.filter(timestamp__date__lte=to_date)
-
-            # Paginación
-            page_size = int(request.GET.get('page_size', 25))
-            paginator = Paginator(logs, page_size)
-            page_number = request.GET.get('page')
-            page_obj = paginator.get_page(page_number)
+            logs = filter_logs(request.GET)
+
+            # Paginación por cursor sobre (timestamp, id)
+            page_size = get_page_size(request.GET.get('page_size', DEFAULT_PAGE_SIZE))
+            cursor = request.GET.get('cursor')
+            direction = request.GET.get('direction', 'next')
+            try:
+                current_page = max(1, int(request.GET.get('page', 1)))
+            except ValueError:
+                current_page = 1
+            if not cursor:
+                current_page = 1
+
+            try:
+                page, has_next, has_previous = keyset_page(logs, page_size, cursor, direction)
+            except InvalidCursor:
+                return JsonResponse({'error': 'Cursor inválido'}, status=400)
+
+            total, exact = estimate_count(logs, request.GET)
 
             # Serializar datos
             data = {
@@ -807,35 +709,143 @@ def logs_view(request):
                         'level': log.level,
                         'message': log.message,
                         'source': log.source,
-                    } for log in page_obj
+                    } for log in page
                 ],
                 'pagination': {
-                    'has_next': page_obj.has_next(),
-                    'has_previous': page_obj.has_previous(),
-                    'num_pages': paginator.num_pages,
-                    'current_page': page_obj.number,
-                    'total': paginator.count,
+                    'has_next': has_next,
+                    'has_previous': has_previous,
+                    'num_pages': num_pages(total, page_size),
+                    'current_page': current_page,
+                    'total': total,
+                    'total_exact': exact,
+                    'page_size': page_size,
+                    'next_cursor': encode_cursor(page[-1]) if page and has_next else None,
+                    'prev_cursor': encode_cursor(page[0]) if page and has_previous else None,
                 }
             }
             return JsonResponse(data)
+        except ValueError:
+            return JsonResponse({'error': 'Parámetros de filtro inválidos'}, status=400)
         except Exception as e:
             logger.exception("Error en logs_view AJAX")
             return JsonResponse({'error': 'Error interno'}, status=500)
 
-    # Solicitud normal
+    # Solicitud normal (los orígenes salen de los resúmenes, no de LogEntry)
     levels = LogEntry.LEVEL_CHOICES
-    sources = LogEntry.objects.values_list('source', flat=True).distinct()
+    sources = get_log_facets()['sources']
     return render(request, 'web_interface/logs.html', {
         'levels': levels,
-        'sources': list(sources),
+        'sources': sources,
     })
 
-    # Solicitud normal
-    levels = LogEntry.LEVEL_CHOICES
-    sources = LogEntry.objects.values_list('source', flat=True).distinct()
-    return render(request, 'web_interface/logs.html', {
-        'levels': levels,
-        'sources': list(sources),
+
+@login_required
+async def logs_export(request):
+    """Descarga los logs filtrados (mismos filtros que la tabla) como CSV o JSONL."""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return JsonResponse({'error': 'Formato no soportado'}, status=400)
+    compress = request.GET.get('gzip') in ('1', 'true', 'on')
+    try:
+        logs = filter_logs(request.GET)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros de filtro inválidos'}, status=400)
+
+    content_type, extension = EXPORT_FORMATS[fmt]
+    filename = f"logs-{time.strftime('%Y%m%d-%H%M%S')}.{extension}"
+    if compress:
+        content_type = 'application/gzip'
+        filename += '.gz'
+
+    filters = {k: v for k, v in request.GET.items() if k in ('level', 'source', 'search', 'from_date', 'to_date') and v}
+    user = await request.auser()
+    await sync_to_async(log_event)(
+        'INFO', f"Exportación de logs ({filename}) por {user.username}. Filtros: {filters or 'ninguno'}", 'logs'
+    )
+
+    # ← Generador async: un tramo de filas en memoria cada vez también bajo ASGI
+    response = StreamingHttpResponse(aexport_stream(logs, fmt, compress), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# --- VISTA DE TRAZAS LENTAS ---
+
+@login_required
+def traces_view(request):
+    """Trazas más lentas de los últimos días (árbol de spans por actualización del bot)."""
+    try:
+        days = min(max(int(request.GET.get('days', 7)), 1), 90)
+    except ValueError:
+        days = 7
+    since = timezone.now() - timedelta(days=days)
+    traces = list(
+        SlowTrace.objects.filter(started_at__gte=since)
+        .order_by('-duration_ms')
+        .values('trace_id', 'name', 'started_at', 'duration_ms', 'error', 'user_id', 'spans')[:50]
+    )
+    for t in traces:
+        t['started_at'] = timezone.localtime(t['started_at']).strftime('%Y-%m-%d %H:%M:%S')
+    return render(request, 'web_interface/traces.html', {
+        'traces': traces,
+        'days': days,
+        'slow_ms': int(tracing.slow_ms()),
+    })
+
+
+# --- VISTA DE POLÍTICA DE LOGS ---
+
+@login_required
+def config_logs_view(request):
+    if request.method == 'POST':
+        action = request.POST.get('action')
+
+        if action == 'save_policy':
+            try:
+                rules = json.loads(request.POST.get('rules', '[]'))
+                rules = log_policy.save(rules)
+                log_event('INFO', f'Política de logs actualizada ({len(rules)} reglas).', 'config_logs')
+                return JsonResponse({'status': 'success', 'message': 'Política guardada.', 'rules': rules})
+            except ValueError as e:
+                return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+            except Exception as e:
+                logger.exception("Error al guardar la política de logs")
+                return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
+        elif action == 'reset_counters':
+            AppSetting.objects.filter(key__startswith=f"{LOG_POLICY_COUNTERS_KEY}:").delete()
+            log_policy.reset_counters()
+            return JsonResponse({'status': 'success', 'message': 'Contadores reiniciados.'})
+
+        return JsonResponse({'status': 'error', 'message': 'Acción no válida'}, status=400)
+
+    try:
+        log_policy.load()
+    except Exception as e:
+        logger.warning(f"No se pudo leer la política de logs: {e}")
+
+    counters = []
+    for role, data in get_log_policy_counters().items():
+        for key, values in data.get('counters', {}).items():
+            source, _, level = key.partition('|')
+            counters.append({
+                'process': role,
+                'updated': data.get('updated', ''),
+                'source': source,
+                'level': level,
+                'db': values.get('db', 0),
+                'file_only': values.get('file_only', 0),
+                'sampled_out': values.get('sampled_out', 0),
+                'rate_limited': values.get('rate_limited', 0),
+                'dropped': values.get('dropped', 0),
+            })
+    counters.sort(key=lambda c: (c['process'], c['source'], c['level']))
+
+    return render(request, 'web_interface/config_logs.html', {
+        'rules': log_policy.rules,
+        'actions': LOG_POLICY_ACTIONS,
+        'levels': [code for code, _ in LogEntry.LEVEL_CHOICES] + ['DEBUG', 'EXCEPTION'],
+        'counters': counters,
     })
 
 
@@ -843,8 +853,7 @@ def logs_view(request):
     
 @login_required
 def config_email_view(request):
-    env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
-    config = dotenv_values(env_path)
+    config = env_config.snapshot()
 
     email_keys = [
         'EMAIL_HOST',
@@ -897,17 +906,8 @@ def config_email_view(request):
 
         elif action == 'save_config':
             try:
-                if not os.path.exists(env_path):
-                    open(env_path, 'w').close()
-
-                # ← Usar set_key de python-dotenv
-                for key in email_keys:
-                    value = request.POST.get(key)
-                    if value is not None:
-                        set_key(env_path, key, value)
-
-                # ← Recargar variables de entorno
-                load_dotenv(env_path, override=True)
+                # ← Escribe .env y sube la versión; el bot lo recoge sin reiniciar
+                env_config.set(**{key: request.POST[key] for key in email_keys if key in request.POST})
 
                 log_event('INFO', 'Configuración de correo actualizada desde la interfaz web.', 'config_email')
                 return JsonResponse({'status': 'success', 'message': 'Configuración guardada.'})
@@ -928,91 +928,53 @@ def config_email_view(request):
     })
     
 # --- VISTA DE CONFIGURACION TELEGRAM ---
+async def _test_telegram_token(token):
+    """Comprueba el token con getMe usando el cliente HTTP compartido."""
+    base_url = env_config.get('TELEGRAM_API_BASE_URL', 'https://api.telegram.org/bot')
+    try:
+        response = await http_client().get(f"{base_url}{token}/getMe")
+        data = response.json()
+    except httpx.TimeoutException:
+        return JsonResponse({'status': 'error', 'message': '❌ Telegram no respondió a tiempo.'})
+    except (httpx.HTTPError, ValueError) as e:
+        return JsonResponse({'status': 'error', 'message': f'❌ Error de conexión: {str(e)}'})
+
+    if data.get('ok'):
+        user = data['result']
+        return JsonResponse({
+            'status': 'success',
+            'message': f'✅ Token válido. Bot: @{user["username"]} ({user["first_name"]})'
+        })
+    return JsonResponse({'status': 'error', 'message': f'❌ Token inválido: {data.get("description", "Desconocido")}'})
+
+
 @login_required
-def config_telegram_view(request):
-    env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
-    
+async def config_telegram_view(request):
+    # --- Acción: Verificar Token (sin ocupar un hilo mientras responde Telegram) ---
+    if request.method == 'POST' and request.POST.get('action') == 'test_token':
+        token = request.POST.get('TELEGRAM_BOT_TOKEN')
+        if not token:
+            return JsonResponse({'status': 'error', 'message': 'Token requerido.'})
+        return await _test_telegram_token(token)
+
+    return await sync_to_async(_config_telegram_page)(request)
+
+
+def _config_telegram_page(request):
     # --- 1. Leer el token de Telegram ---
-    config = dotenv_values(env_path)
-    telegram_token = config.get('TELEGRAM_BOT_TOKEN', '')
-
-    # --- 2. Leer los mensajes del bot ---
-    messages_file = Path(__file__).parent.parent / 'telegram_bot' / 'messages.json'
-    messages = {}
-    if messages_file.exists():
-        with open(messages_file, 'r', encoding='utf-8') as f:
-            try:
-                messages = json.load(f, object_pairs_hook=OrderedDict)
-            except json.JSONDecodeError as e:
-                logger.error(f"Error al leer messages.json: {e}")
-                messages = {}
-
-    # --- 3. Leer las etiquetas de los mensajes ---
-    labels_file = Path(__file__).parent.parent / 'telegram_bot' / 'message_labels.json'
-    labels = {}  # ← Definido aquí
-    if labels_file.exists():
-        with open(labels_file, 'r', encoding='utf-8') as f:
-            try:
-                labels = json.load(f)
-            except json.JSONDecodeError as e:
-                logger.error(f"Error al leer message_labels.json: {e}")
-                labels = {}
-
-    # ← Procesar mensajes para agrupar por secciones
-    processed_messages = []
-    current_section = {"title": "Mensajes Generales", "fields": []}
-
-    for key, value in messages.items():
-        if key.startswith('_comment_'):
-            # ← Guardar la sección anterior si tiene campos
-            if current_section["fields"]:
-                processed_messages.append(current_section)
-            # ← Crear nueva sección
-            current_section = {
-                "title": value,
-                "fields": []
-            }
-        else:
-            current_section["fields"].append({
-                "key": key,
-                "value": value,
-                "label": labels.get(key, key)  # ← Ahora `labels` está definida
-            })
+    telegram_token = env_config.get('TELEGRAM_BOT_TOKEN', '')
 
-    # ← Agregar la última sección
-    if current_section["fields"] or not processed_messages:
-        processed_messages.append(current_section)
+    # --- 2. Mensajes del bot agrupados por secciones (catálogo en caché) ---
+    processed_messages = message_catalog.sections()
 
     if request.method == 'POST':
         action = request.POST.get('action')
 
-        # --- Acción: Verificar Token ---
-        if action == 'test_token':
-            token = request.POST.get('TELEGRAM_BOT_TOKEN')
-            if not token:
-                return JsonResponse({'status': 'error', 'message': 'Token requerido.'})
-
-            try:
-                response = requests.get(f"https://api.telegram.org/bot{token}/getMe")
-                data = response.json()
-                if data.get('ok'):
-                    user = data['result']
-                    return JsonResponse({
-                        'status': 'success',
-                        'message': f'✅ Token válido. Bot: @{user["username"]} ({user["first_name"]})'
-                    })
-                else:
-                    return JsonResponse({'status': 'error', 'message': f'❌ Token inválido: {data.get("description", "Desconocido")}'})
-            except Exception as e:
-                return JsonResponse({'status': 'error', 'message': f'❌ Error de conexión: {str(e)}'})
-
         # --- Acción: Guardar Configuración ---
-        elif action == 'save_config':
+        if action == 'save_config':
             try:
                 # ← Guardar el token
                 new_token = request.POST.get('TELEGRAM_BOT_TOKEN')
-                if new_token:
-                    set_key(env_path, 'TELEGRAM_BOT_TOKEN', new_token)
 
                 # ← Guardar los mensajes
                 updated_messages = {}
@@ -1023,24 +985,14 @@ def config_telegram_view(request):
                         if value is not None:
                             updated_messages[key] = value
 
-                # ← Leer el orden original del archivo
-                with open(messages_file, 'r', encoding='utf-8') as f:
-                    original_data = json.load(f, object_pairs_hook=OrderedDict)
-
-                # ← Crear nuevo OrderedDict con el mismo orden
-                ordered_data = OrderedDict()
-                for key, value in original_data.items():
-                    if key.startswith('_comment_'):
-                        ordered_data[key] = value
-                    else:
-                        ordered_data[key] = updated_messages.get(key, value)
-
-                # ← Escribir con el orden preservado
-                with open(messages_file, 'w', encoding='utf-8') as f:
-                    json.dump(ordered_data, f, ensure_ascii=False, indent=4)
+                # ← Validar plantillas y escribir de forma atómica preservando el orden
+                errors = message_catalog.save(updated_messages)
+                if errors:
+                    detail = '; '.join(f'{key}: {error}' for key, error in errors.items())
+                    return JsonResponse({'status': 'error', 'message': f'Plantillas inválidas: {detail}'}, status=400)
 
-                # ← Recargar variables de entorno
-                load_dotenv(env_path, override=True)
+                if new_token:
+                    env_config.set(TELEGRAM_BOT_TOKEN=new_token)
 
                 log_event('INFO', 'Configuración de Telegram actualizada desde la interfaz web.', 'config_telegram')
                 return JsonResponse({'status': 'success', 'message': 'Configuración guardada.'})
@@ -1078,93 +1030,30 @@ def services_view(request):
 
 
 def get_bot_status():
-    """Devuelve el estado del bot de Telegram."""
-    try:
-        # ← Intenta leer el archivo de estado
-        status_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'telegram_bot_status.json')
-        if os.path.exists(status_file):
-            with open(status_file, 'r') as f:
-                status = json.load(f)
-                # ← Asegurarse de que todas las claves existan
-                return {
-                    "running": status.get("running", False),
-                    "start_time": status.get("start_time", None),
-                    "auto_start": status.get("auto_start", False)  # ← Añadido
-                }
-        else:
-            # ← Si no existe el archivo, estado por defecto
-            return {
-                "running": False,
-                "start_time": None,
-                "auto_start": False
-            }
-    except Exception as e:
-        logger.exception("Error al leer el estado del bot")
-        return {
-            "running": False,
-            "start_time": None,
-            "auto_start": False
-        }
+    """Devuelve el estado del bot de Telegram (mismo origen que get_status)."""
+    status = get_status()
+    return {
+        "running": status["telegram_running"],
+        "start_time": status["telegram_start_time"],
+        "auto_start": status["telegram_auto_start"]
+    }
+
 
-    
-    
 @csrf_exempt
 @login_required
-def toggle_telegram(request):
+async def toggle_telegram(request):
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'Método no permitido.'}, status=405)
 
     try:
         data = json.loads(request.body)
-        action = data.get('action')
-        logger.info(f"[toggle_telegram] Acción recibida: {action}")
-
-        if action == 'start':
-            status = get_status()
-            if status["telegram_running"]:
-                return JsonResponse({'status': 'error', 'message': 'El bot ya está en ejecución.'})
-
-            token = os.getenv('TELEGRAM_BOT_TOKEN')
-            if not token:
-                return JsonResponse({'status': 'error', 'message': 'Falta el token del bot en .env'})
-
-            def run_bot_safe():
-                try:
-                    asyncio.set_event_loop(asyncio.new_event_loop())
-                    run_bot(token)
-                except Exception as e:
-                    logger.exception(f"Error en run_bot: {str(e)}")
-                    log_event('CRITICAL', f'Error en run_bot: {str(e)}', 'services')
-                finally:
-                    # ← Solo marcar como detenido si el hilo termina
-                    update_status(telegram_running=False, telegram_start_time=None)
-
-            # ✅ SOLO EL BACKEND ESCRIBE EL start_time
-            current_time = time.time()
-            update_status(
-                telegram_running=True,
-                telegram_start_time=current_time,
-                telegram_auto_start=status["telegram_auto_start"]
-            )
-
-            thread = threading.Thread(target=run_bot_safe, daemon=True)
-            thread.start()
-
-            log_event('INFO', 'Bot de Telegram iniciado desde la interfaz web.', 'services')
-            return JsonResponse({'status': 'success', 'message': 'Bot de Telegram iniciado.'})
-
-        elif action == 'stop':
-            # ✅ SOLO EL BACKEND ACTUALIZA EL ESTADO
-            update_status(telegram_running=False, telegram_start_time=None)
-            log_event('INFO', 'Bot de Telegram detenido desde la interfaz web.', 'services')
-            return JsonResponse({'status': 'success', 'message': 'Bot de Telegram detenido.'})
-
-        else:
-            return JsonResponse({'status': 'error', 'message': 'Acción inválida.'})
-        return JsonResponse({'status': 'success', 'message': 'Acción realizada.'})
-    except Exception as e:
-        logger.exception("Error en toggle_telegram")
-        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'JSON inválido.'}, status=400)
+    action = data.get('action')
+    logger.info(f"[toggle_telegram] Acción recibida: {action}")
+    if action not in ('start', 'stop', 'restart'):
+        return JsonResponse({'status': 'error', 'message': 'Acción inválida.'}, status=400)
+    return await _bot_command(request, action)
 
 @csrf_exempt
 @login_required
@@ -1182,14 +1071,17 @@ def set_auto_start_linux(request):
                 # ← Crear servicio systemd
                 service_content = f"""
 [Unit]
-Description=TBot Telegram Bot
+Description=TBot Telegram Bot (supervisor)
 After=network.target
 
 [Service]
 Type=simple
 User={os.getlogin()}
 WorkingDirectory={project_path}
-ExecStart={python_path} manage.py run_bot
+ExecStart={python_path} manage.py run_supervisor --start
+# ← Solo el supervisor recibe SIGTERM: él detiene el bot de forma ordenada
+KillMode=mixed
+TimeoutStopSec=30
 Restart=always
 
 [Install]
@@ -1203,14 +1095,14 @@ def set_auto_start_linux(request):
                 os.system('sudo systemctl enable tbot_telegram.service')
                 os.system('sudo systemctl start tbot_telegram.service')
 
-                set_bot_status(get_bot_status()["running"], auto_start=True)
+                update_status(telegram_auto_start=True)
                 return JsonResponse({'status': 'success', 'message': 'Servicio configurado para iniciar con el sistema.'})
 
             else:
                 # ← Deshabilitar servicio
                 os.system('sudo systemctl stop tbot_telegram.service')
                 os.system('sudo systemctl disable tbot_telegram.service')
-                set_bot_status(get_bot_status()["running"], auto_start=False)
+                update_status(telegram_auto_start=False)
                 return JsonResponse({'status': 'success', 'message': 'Inicio automático desactivado.'})
 
         except Exception as e: